@@ -1,66 +1,51 @@
-import multiprocessing
-import os
-from typing import Any, Dict
+import asyncio
+import base64
+import io
+import time
+from typing import Annotated, Any, Dict
 
+import numpy as np
 import orjson
-from fastapi import APIRouter, Body, Request
+from fastapi import APIRouter, Body, HTTPException, Query, Request, Response
+from fastapi.responses import RedirectResponse, StreamingResponse
+from PIL import Image
 from pydantic import BaseModel, Field
 
 # from backend.api.rcswebapi import refresh_rcs_api
 from util.config import cfg, r
-from util.xml2json import safe_lxml_parse
 
 # 导入异常日志数据库
 from .exception_log import ExceptionLogDB
 
-# 配置multiprocessing使用spawn方式启动子进程，使子进程独立于父进程
-try:
-    multiprocessing.set_start_method("spawn")
-except RuntimeError:
-    pass  # 如果已经设置过则跳过
+from util.road_graph import RoadGraph, fleet_eta
+from util.sites import Site, sites
+from util.spatial_index import CellIndex, check_finite, robots_within
 
-from util.rcms_api import RcmsApi
-from util.zeromq import Map_info_update
+# 默认现场的RcmsApi实例（导入时只做懒加载，启动事件中再完整加载）
+rapi = sites.default.api
 
-# 创建RcmsApi实例
-rapi = RcmsApi()
-rapi.build_from_cache()
+# 默认现场的进程内ZeroMQ接入服务，复用rapi已加载的缓存
+ingest_service = sites.default.ingest
 
-# 工具函数：获取Redis实例和rdstag
-def get_redis_and_rdstag():
-    """获取rdstag"""
-    rdstag = cfg.get("rcms.host").split("://")[1].replace(":", "-")
-    return rdstag
 
-
-# 工具函数：检查进程是否存在
-def is_process_running(pid):
-    """检查进程是否正在运行"""
+def get_site(site: str | None = None) -> Site:
+    """按名称取现场，site 为空时为默认现场，不存在时返回404"""
     try:
-        os.kill(pid, 0)  # 检查进程是否存在而不发送信号
-        return True
-    except OSError:
-        return False
-
+        return sites.get(site)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
-# 全局变量用于跟踪ZeroMQ进程状态
-zeromq_process_started = False
-current_zeromq_process = None  # 保存当前的进程引用
 
-
-# 全局函数，用于在子进程中启动Map_info_update
-def start_map_update_process():
-    from util.rcms_api import RcmsApi
-
-    fresh_rapi = RcmsApi()
-    fresh_rapi.build_from_cache()
-    Map_info_update(fresh_rapi, show_count=False)
+# 工具函数：获取Redis实例和rdstag
+def get_redis_and_rdstag(site: str | None = None):
+    """获取rdstag"""
+    return get_site(site).rdstag
 
 
 # 工具函数：获取程序信息
-def get_program_info():
+def get_program_info(site: str | None = None):
     """从Redis获取程序信息"""
-    rdstag = get_redis_and_rdstag()
+    rdstag = get_redis_and_rdstag(site)
     program_info_key = f"{rdstag}:program_info"
     existing_info = r.get(program_info_key)
 
@@ -77,195 +62,117 @@ def get_program_info():
     return r, program_info_key, None, None
 
 
-# 工具函数：检查并清理僵尸进程信息
-def check_and_clean_zombie_process():
-    """检查并清理僵尸进程信息，返回进程是否正在运行"""
-    r, program_info_key, info_data, existing_pid = get_program_info()
-
-    if info_data and existing_pid:
-        if is_process_running(existing_pid):
-            return True, info_data, existing_pid, r, program_info_key
-        else:
-            # 进程不存在，僵尸进程信息已被清理
-            r.delete(program_info_key)
-            return False, None, None, r, program_info_key
+def ensure_zeromq_started(site: str | None = None):
+    """确保ZeroMQ接入服务已启动"""
+    return get_site(site).ingest.start()
 
-    return False, None, None, r, program_info_key
 
+def ensure_zeromq_stopped(site: str | None = None):
+    """确保ZeroMQ接入服务已停止，服务在其他worker/命令行进程时把命令发给该进程"""
+    return get_site(site).ingest.command("stop")
 
-# 全局函数来管理ZeroMQ进程
-def ensure_zeromq_started():
-    """确保ZeroMQ进程已启动"""
-    global zeromq_process_started, current_zeromq_process
 
-    # 检查当前是否有正在运行的进程引用
-    if current_zeromq_process and current_zeromq_process.is_alive():
-        return {
-            "message": "ZeroMQ Map Update进程已存在",
-            "pid": current_zeromq_process.pid,
-            "info": {"pid": current_zeromq_process.pid},
-        }
-
-    # 启动新进程 - 使用spawn方式确保子进程独立
-    process = multiprocessing.Process(
-        target=start_map_update_process,
-        args=(),
-        daemon=True,  # 守护进程，主进程退出时子进程也会退出，但子进程不会影响主进程
-    )
-
-    # 启动进程
-    process.start()
-    current_zeromq_process = process
-    zeromq_process_started = True
-    # print(f"ZeroMQ Map Update进程已启动，PID: {process.pid}")
-    return {"message": "ZeroMQ Map Update进程已启动", "pid": process.pid}
-
-
-def ensure_zeromq_stopped():
-    """确保ZeroMQ进程已停止"""
-    global zeromq_process_started, current_zeromq_process
-
-    # 检查当前进程引用
-    if current_zeromq_process:
-        if current_zeromq_process.is_alive():
-            # 直接终止进程
-            try:
-                current_zeromq_process.terminate()  # 使用terminate方法而不是os.kill
-                current_zeromq_process.join(timeout=5)  # 等待进程结束，最多等待5秒
-
-                # 如果进程仍然存活，则强制终止
-                if current_zeromq_process.is_alive():
-                    current_zeromq_process.kill()  # 强制终止
-                    current_zeromq_process.join()
-
-                # 清理Redis中的程序信息
-                rdstag = get_redis_and_rdstag()
-                program_info_key = f"{rdstag}:program_info"
-                _, _, _, pid = get_program_info()
-                if pid:
-                    try:
-                        if os.name == "nt":
-                            import ctypes
-
-                            PROCESS_TERMINATE = 1
-                            handle = ctypes.windll.kernel32.OpenProcess(
-                                PROCESS_TERMINATE, False, pid
-                            )
-                            if handle:
-                                ctypes.windll.kernel32.TerminateProcess(handle, 1)
-                                ctypes.windll.kernel32.CloseHandle(handle)
-                        else:
-                            os.kill(pid, 9)
-                    except Exception:
-                        pass
-                r.delete(program_info_key)
-
-                zeromq_process_started = False
-                current_zeromq_process = None
-
-                return {
-                    "message": "ZeroMQ Map Update进程已停止",
-                    "pid": current_zeromq_process.pid
-                    if current_zeromq_process
-                    else None,
-                }
-            except Exception as e:
-                # 进程可能已经不存在
-                rdstag = get_redis_and_rdstag()
-                program_info_key = f"{rdstag}:program_info"
-                r.delete(program_info_key)
-                current_zeromq_process = None
-                zeromq_process_started = False
-                return {
-                    "message": f"进程停止时出现异常: {str(e)}",
-                    "pid": current_zeromq_process.pid
-                    if current_zeromq_process
-                    else None,
-                }
-        else:
-            # 进程已死亡，清理引用
-            current_zeromq_process = None
-
-    # 清理Redis中的程序信息
-    rdstag = get_redis_and_rdstag()
-    program_info_key = f"{rdstag}:program_info"
-    _, _, _, pid = get_program_info()
-    if pid:
-        try:
-            if os.name == "nt":
-                import ctypes
-
-                PROCESS_TERMINATE = 1
-                handle = ctypes.windll.kernel32.OpenProcess(
-                    PROCESS_TERMINATE, False, pid
-                )
-                if handle:
-                    ctypes.windll.kernel32.TerminateProcess(handle, 1)
-                    ctypes.windll.kernel32.CloseHandle(handle)
-            else:
-                os.kill(pid, 9)
-        except Exception:
-            pass
-    r.delete(program_info_key)
-    print("ZeroMQ Map Update进程已停止")
-    zeromq_process_started = False
-    return {"message": "未找到正在运行的ZeroMQ Map Update进程", "pid": None}
-
-
-def check_and_manage_zeromq_process(has_active_websocket=False, timeout=False):
-    """检查并管理ZeroMQ进程状态"""
-    phas = False
-    if r.exists(get_redis_and_rdstag() + ":program_info"):
-        phas = True
-    # 如果有WebSocket连接，确保ZeroMQ进程已启动
+def check_and_manage_zeromq_process(has_active_websocket=False, timeout=False, site=None):
+    """检查并管理ZeroMQ接入服务状态（会等待其他进程执行停止命令，在线程中调用）"""
+    ingest = get_site(site).ingest
+    info = ingest.owner_info()
+    phas = ingest.running or info is not None
+    # 如果有WebSocket连接，确保ZeroMQ接入服务已启动
     if has_active_websocket:
         if phas:
             return {"message": "ZeroMQ进程已在运行"}
         else:
             if cfg.get("zmq_auto"):
-                print("检测到活跃的WebSocket连接，启动ZeroMQ进程")
-                return ensure_zeromq_started()
+                print("检测到活跃的WebSocket连接，启动ZeroMQ接入服务")
+                return ensure_zeromq_started(site)
             else:
                 return {"message": "ZeroMQ自动启停管理已禁用"}
     else:
-        # 如果没有WebSocket连接，停止进程
-        if phas and timeout:
-            return ensure_zeromq_stopped()
+        # 如果没有WebSocket连接，停止接入服务（可能运行在其他worker中）；命令行运行的实例不自动停止
+        if timeout and (ingest.running or (info and info.get("auto_stop"))):
+            return ensure_zeromq_stopped(site)
 
     return {"message": "ZeroMQ进程状态正常"}
 
 
+# 各现场的点位空间索引，内存中的 mapdata 重新赋值或加载后自动重建
+_cell_index: dict[str, dict] = {}
+
+
+def get_cell_index(site: str | None = None) -> CellIndex:
+    s = get_site(site)
+    key = s.api.dataset_version("mapdata")
+    cached = _cell_index.get(s.name)
+    if not cached or cached["key"] != key:
+        cached = _cell_index[s.name] = {"key": key, "index": CellIndex(s.api.mapdata)}
+    return cached["index"]
+
+
+# 各现场的路网，线路数据或点位重新赋值或加载后自动重建
+_road_graph: dict[str, dict] = {}
+
+
+def get_road_graph(site: str | None = None) -> RoadGraph:
+    s = get_site(site)
+    cells = get_cell_index(site)
+    key = (s.api.dataset_version("maplinedata"), _cell_index[s.name]["key"])
+    cached = _road_graph.get(s.name)
+    if not cached or cached["key"] != key:
+        cached = _road_graph[s.name] = {
+            "key": key,
+            "graph": RoadGraph.from_line_data(s.api.maplinedata, cells),
+        }
+    return cached["graph"]
+
+
+def read_robot_positions(site: str | None = None) -> dict:
+    """读取全部机器人状态（只用于坐标查询）"""
+    robots = {}
+    for robot_id, status_json in r.hgetall(get_redis_and_rdstag(site) + ":ROBOT_STATUS").items():
+        try:
+            robots[robot_id.decode("utf-8")] = orjson.loads(status_json)
+        except orjson.JSONDecodeError:
+            continue
+    return robots
+
+
 rcms_router = APIRouter(
     prefix="/rcms",
     tags=["rcms"],
 )
 
 
+@rcms_router.get("/sites")
+def list_sites_api():
+    """已配置的现场列表，其他接口通过 ?site=名称 或 /api/sites/{名称}/... 指定现场"""
+    return {"default": sites.default.name, "sites": [s.info() for s in sites]}
+
+
 @rcms_router.delete("/remove_agv_status")
-def remove_agv_status(robot_id: str):
+def remove_agv_status(robot_id: str, site: str | None = None):
     """删除AGV的过期状态redis记录"""
     if not robot_id:
         return {"message": "AGV ID不能为空", "success": False}
-    num_deleted = r.hdel(get_redis_and_rdstag() + ":ROBOT_STATUS", robot_id)
+    num_deleted = r.hdel(get_redis_and_rdstag(site) + ":ROBOT_STATUS", robot_id)
     return {"message": f"AGV状态已删除，共删除 {num_deleted} 条记录", "success": True}
 
 
 @rcms_router.get("/get_agv_path")
-def get_agv_path(robot_id: str):
+def get_agv_path(robot_id: str, site: str | None = None):
     """获取指定AGV的路径"""
     if not robot_id:
         return {"message": "AGV ID不能为空", "success": False}
-    path = r.hget(get_redis_and_rdstag() + ":ROBOT_PATH", robot_id)
+    path = r.hget(get_redis_and_rdstag(site) + ":ROBOT_PATH", robot_id)
     if not path:
         return {"message": "AGV路径不存在", "success": False}
     return {"path": orjson.loads(path), "success": True, "message": "AGV路径获取成功"}
 
 
 @rcms_router.get("/get_valid_robot_num")
-def get_valid_robot_num():
+def get_valid_robot_num(site: str | None = None):
     """获取有效AGV数量"""
     try:
-        valid_robot = r.get(get_redis_and_rdstag() + ":VALID_ROBOT_NUM")
+        valid_robot = r.get(get_redis_and_rdstag(site) + ":VALID_ROBOT_NUM")
         if not valid_robot:
             return {"message": "AGV有效数量不存在", "success": False}
         valid_robot = orjson.loads(valid_robot)
@@ -280,10 +187,10 @@ def get_valid_robot_num():
 
 
 @rcms_router.get("/get_charge_info")
-def get_charge_info_api():
+def get_charge_info_api(site: str | None = None):
     """获取AGV充电信息"""
     try:
-        data = r.get(get_redis_and_rdstag() + ":CHARGE_INFO")
+        data = r.get(get_redis_and_rdstag(site) + ":CHARGE_INFO")
         if not data:
             return {"message": "AGV充电信息不存在", "success": False}
         data = orjson.loads(data)
@@ -295,10 +202,10 @@ def get_charge_info_api():
     }
 
 @rcms_router.get("/get_block_cell_info")
-def get_block_cell_info_api():
+def get_block_cell_info_api(site: str | None = None):
     """获取封锁区域信息"""
     try:
-        data = r.get(get_redis_and_rdstag() + ":BLOCK_CELL")
+        data = r.get(get_redis_and_rdstag(site) + ":BLOCK_CELL")
         if not data:
             return {"message": "封锁区域信息不存在", "success": False}
         data = orjson.loads(data)
@@ -309,12 +216,11 @@ def get_block_cell_info_api():
         "success": True,
     }
 @rcms_router.get("/find_remove_agv")
-def find_remove_agv_api():
+async def find_remove_agv_api(site: str | None = None):
     """查找排除AGV列表以及原因"""
     try:
-        
-        map_code = rapi.maplist[0].get("code", "")
-        retmsg = rapi.find_remove_agv(map_code)
+        map_code = get_site(site).api.maplist[0].get("code", "")
+        retmsg = await get_site(site).api.afind_remove_agv(map_code)
     except Exception as e:
         return {"message": str(e), "errors": [str(e)], "success": False}
     if not retmsg:
@@ -323,9 +229,9 @@ def find_remove_agv_api():
         return {"message": "排除AGV列表获取成功", "data": retmsg, "success": True}
 
 @rcms_router.get("/build_from_cache")
-def build_rcms_from_cache_api():
+def build_rcms_from_cache_api(site: str | None = None):
     try:
-        retmsg = rapi.build_from_cache()
+        retmsg = get_site(site).api.build_from_cache()
     except Exception as e:
         return {"message": "error", "errors": [str(e)]}
     if retmsg:
@@ -335,19 +241,19 @@ def build_rcms_from_cache_api():
 
 
 @rcms_router.get("/build_from_raw")
-def build_rcms_from_raw_api(request: Request):
+async def build_rcms_from_raw_api(request: Request, site: str | None = None):
     try:
-        rapi.fake = request.query_params.get("fake", default=False) == "true"
-        rapi.build_from_raw()
+        get_site(site).api.fake = request.query_params.get("fake", default=False) == "true"
+        await get_site(site).api.abuild_from_raw()
     except Exception as e:
         return {"message": "error", "errors": [str(e)]}
     retmsg = []
     for i in [
-        rapi.rcsdata,
-        rapi.maplist,
-        rapi.devicelist,
-        rapi.displaytype,
-        rapi.alarmtype,
+        get_site(site).api.rcsdata,
+        get_site(site).api.maplist,
+        get_site(site).api.devicelist,
+        get_site(site).api.displaytype,
+        get_site(site).api.alarmtype,
     ]:
         if not i:
             retmsg.append(f"数据为空: {i}")
@@ -359,33 +265,472 @@ def build_rcms_from_raw_api(request: Request):
 
 # 获取共享地图数据
 @rcms_router.get("/sharemapdata")
-def get_sharemapdata_api():
-    if isinstance(rapi.sharemapdata, str):
-        return safe_lxml_parse(xml_string=rapi.sharemapdata)
-    return rapi.sharemapdata
+def get_sharemapdata_api(
+    request: Request,
+    site: str | None = None,
+    fmt: str = Query("raw", alias="format", pattern="^(raw|compact)$"),
+    tolerance: float = Query(0.0, ge=0),
+):
+    """
+    共享地图数据，按共享地图版本预先序列化，带ETag，未变化时返回304
+
+    - format=raw: 与原接口相同的 safe_lxml_parse 结构
+    - format=compact: 紧凑矢量格式（量化整数坐标、差值编码、颜色调色板），
+      tolerance 为多边形化简容差(mm)，按配置 map.vector_tolerances 取档
+    """
+    api = get_site(site).api
+    cached = api.share_map_json() if fmt == "raw" else api.share_map_vector(tolerance)
+    if cached is None:
+        raise HTTPException(status_code=404, detail="共享地图数据不存在")
+    etag, data = cached
+    # URL不含版本，浏览器每次用ETag验证
+    headers = {"Cache-Control": "no-cache", "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type="application/json", headers=headers)
+
+
+def get_map_tiler(site: str | None = None):
+    tiler = get_site(site).api.map_tiler()
+    if tiler is None:
+        raise HTTPException(status_code=404, detail="共享地图数据不存在")
+    return tiler
+
+
+@rcms_router.get("/map/tiles/info")
+def get_map_tiles_info_api(site: str | None = None):
+    """地图瓦片信息：版本(共享地图内容哈希)、缩放级别、坐标范围、瓦片URL模板"""
+    tiler = get_map_tiler(site)
+    query = f"?site={site}" if site else ""
+    return {
+        **tiler.info(),
+        "url": f"/api/rcms/map/tiles/{tiler.version[:16]}/{{z}}/{{x}}/{{y}}.png{query}",
+        "success": True,
+    }
+
+
+@rcms_router.get("/map/tiles/{version}/{z}/{x}/{y}.png")
+def get_map_tile_api(version: str, z: int, x: int, y: int, request: Request, site: str | None = None):
+    """
+    XYZ地图瓦片，首次请求时渲染并缓存到磁盘
+    URL中包含地图版本，内容不会变化，可长期缓存；版本过期时重定向到当前版本
+    """
+    tiler = get_map_tiler(site)
+    current = tiler.version[:16]
+    if version != current:
+        query = f"?site={site}" if site else ""
+        return RedirectResponse(f"/api/rcms/map/tiles/{current}/{z}/{x}/{y}.png{query}")
+    etag = f'"{current}-{z}-{x}-{y}"'
+    headers = {"Cache-Control": "public, max-age=31536000, immutable", "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    data = tiler.get(z, x, y)
+    if data is None:
+        raise HTTPException(status_code=404, detail=f"瓦片超出范围: {z}/{x}/{y}")
+    return Response(content=data, media_type="image/png", headers=headers)
+
+
+def get_fleet_overlay(site: str | None = None, paths: bool = True):
+    try:
+        overlay = get_site(site).api.fleet_overlay(paths)
+    except FileNotFoundError:
+        overlay = None
+    if overlay is None:
+        raise HTTPException(status_code=404, detail="地图图片不存在")
+    return overlay
+
+
+def refresh_fleet_overlay(overlay, site: str | None = None, max_age: float = 0.0):
+    from backend.api.websocket import read_robot_status
+
+    rdstag = get_redis_and_rdstag(site)
+    overlay.refresh(lambda: read_robot_status(rdstag), max_age)
+
+
+@rcms_router.get("/map/live.png")
+def get_map_live_png_api(paths: bool = True, site: str | None = None):
+    """地图实时快照：地图图片上叠加机器人图标、编号和路径"""
+    overlay = get_fleet_overlay(site, paths)
+    refresh_fleet_overlay(overlay, site)
+    return Response(
+        content=overlay.encode("PNG"),
+        media_type="image/png",
+        headers={"Cache-Control": "no-store"},
+    )
+
+
+@rcms_router.get("/map/live.mjpeg")
+async def get_map_live_mjpeg_api(
+    request: Request, fps: float | None = None, paths: bool = True, site: str | None = None
+):
+    """
+    地图实时MJPEG流，可直接用于 <img src>，适合大屏和不支持前端地图的旧浏览器
+    多个客户端共享同一叠加图，机器人状态未变化时复用上一帧的编码结果
+    """
+    overlay = await asyncio.to_thread(get_fleet_overlay, site, paths)
+    max_fps = cfg.get("map.live_max_fps") or 10
+    fps = min(max(fps or cfg.get("map.live_fps") or 2, 0.1), max_fps)
+    quality = cfg.get("map.live_jpeg_quality") or 80
+    interval = 1 / fps
+
+    async def frames():
+        while not await request.is_disconnected():
+            start = asyncio.get_running_loop().time()
+            # 按最高帧率刷新，同一帧内其他客户端直接使用结果
+            await asyncio.to_thread(refresh_fleet_overlay, overlay, site, 1 / max_fps)
+            data = await asyncio.to_thread(overlay.encode, "JPEG", quality)
+            yield (
+                b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                + str(len(data)).encode()
+                + b"\r\n\r\n"
+                + data
+                + b"\r\n"
+            )
+            await asyncio.sleep(max(interval - (asyncio.get_running_loop().time() - start), 0))
+
+    return StreamingResponse(
+        frames(),
+        media_type="multipart/x-mixed-replace; boundary=frame",
+        # 不经过 GZip 中间件，JPEG 已压缩且压缩会缓冲流
+        headers={
+            "Cache-Control": "no-store",
+            "X-Accel-Buffering": "no",
+            "Content-Encoding": "identity",
+        },
+    )
+
+
+@rcms_router.get("/map/live/stats")
+def get_map_live_stats_api(paths: bool = True, site: str | None = None):
+    """实时叠加图统计：帧数、有变化的帧数、累计重绘像素"""
+    overlay = get_fleet_overlay(site, paths)
+    return {"size": overlay.size, "robots": len(overlay.drawn), **overlay.stats, "success": True}
+
+
+def get_fleet_heatmap(site: str | None = None):
+    s = get_site(site)
+    heatmap = s.api.fleet_heatmap()
+    if heatmap is None:
+        raise HTTPException(status_code=404, detail="共享地图数据不存在")
+    # 接入服务不在本进程运行时，读取其定期保存的热力图文件
+    if not s.ingest.running:
+        heatmap.sync(s.ingest.heatmap_path)
+    return heatmap
+
+
+def heatmap_grid(heatmap, layer: str, mode: str, hour: int | None):
+    if mode == "hour" and hour is None:
+        hour = time.localtime().tm_hour
+    return heatmap.grid(layer, mode, hour), hour
+
+
+# 热力图接口共用的查询参数
+HeatmapLayer = Annotated[str, Query(pattern="^(occupancy|block)$", description="occupancy 机器人停留 / block 封锁")]
+HeatmapMode = Annotated[str, Query(pattern="^(decayed|total|hour)$", description="decayed 衰减累计 / total 全部 / hour 指定小时")]
+HeatmapHour = Annotated[int | None, Query(ge=0, le=23, description="mode=hour 时的小时，默认当前小时")]
+
+
+@rcms_router.get("/heatmap")
+def get_heatmap_api(
+    layer: HeatmapLayer = "occupancy",
+    mode: HeatmapMode = "decayed",
+    hour: HeatmapHour = None,
+    fmt: str = Query("json", alias="format", pattern="^(json|npy)$"),
+    site: str | None = None,
+):
+    """
+    占用/拥堵热力图网格，行号对应 y 从小到大，数值单位为秒
+
+    - format=json: 按最大值归一化到 0-255 的 uint8 数组，base64编码
+    - format=npy: float32 原始数值，numpy.load 直接读取
+    """
+    heatmap = get_fleet_heatmap(site)
+    grid, hour = heatmap_grid(heatmap, layer, mode, hour)
+    if fmt == "npy":
+        buf = io.BytesIO()
+        np.save(buf, grid)
+        return Response(
+            content=buf.getvalue(),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="heatmap_{layer}_{mode}.npy"'},
+        )
+    peak = float(grid.max()) if grid.size else 0.0
+    level = (grid / peak * 255).round().astype(np.uint8) if peak > 0 else np.zeros(grid.shape, np.uint8)
+    return {
+        **heatmap.info(),
+        "layer": layer,
+        "mode": mode,
+        "hour": hour if mode == "hour" else None,
+        "max": peak,
+        "encoding": "uint8-base64",
+        "data": base64.b64encode(level.tobytes()).decode("ascii"),
+        "success": True,
+    }
+
+
+@rcms_router.get("/heatmap.png")
+def get_heatmap_png_api(
+    layer: HeatmapLayer = "occupancy",
+    mode: HeatmapMode = "decayed",
+    hour: HeatmapHour = None,
+    base: bool = True,
+    site: str | None = None,
+):
+    """热力图叠加层，尺寸与地图图片一致；base=false 时返回透明背景PNG，可叠加到前端地图"""
+    heatmap = get_fleet_heatmap(site)
+    # 与实时叠加图共用已加载的地图底图，按共享地图版本缓存，不必每次检查和读取图片文件
+    map_image = get_fleet_overlay(site).base
+    grid, _ = heatmap_grid(heatmap, layer, mode, hour)
+    layer_image = heatmap.render(grid, *map_image.size)
+    if base:
+        layer_image = Image.alpha_composite(map_image.convert("RGBA"), layer_image)
+    buf = io.BytesIO()
+    layer_image.save(buf, format="PNG")
+    return Response(content=buf.getvalue(), media_type="image/png", headers={"Cache-Control": "no-store"})
+
+
+@rcms_router.get("/heatmap/hotspots")
+def get_heatmap_hotspots_api(
+    layer: HeatmapLayer = "occupancy",
+    mode: HeatmapMode = "decayed",
+    hour: HeatmapHour = None,
+    top: int = Query(10, ge=1, le=200),
+    site: str | None = None,
+):
+    """热点格子：数值最大的格子中心坐标及最近的地图点位"""
+    heatmap = get_fleet_heatmap(site)
+    grid, hour = heatmap_grid(heatmap, layer, mode, hour)
+    index = get_cell_index(site)
+    data = heatmap.hotspots(grid, top)
+    for spot in data:
+        cell = index.nearest(spot["x"], spot["y"], heatmap.cell_size)
+        spot["cell"] = cell["code"] if cell else None
+    return {"layer": layer, "mode": mode, "hour": hour if mode == "hour" else None, "data": data, "success": True}
+
+
+@rcms_router.post("/heatmap/reset")
+def reset_heatmap_api(site: str | None = None):
+    """清空热力图累计数据：接入服务运行时由其所在进程清空，否则直接清空保存的热力图文件"""
+    s = get_site(site)
+    if s.ingest.running or s.ingest.owner_info():
+        return s.ingest.command("heatmap_reset")
+    heatmap = get_fleet_heatmap(site)
+    heatmap.reset()
+    heatmap.save(s.ingest.heatmap_path)
+    return {"message": "热力图已清空", "success": True}
+
+
+@rcms_router.get("/cache_manifest")
+def get_cache_manifest_api(site: str | None = None):
+    """RCMS缓存清单：各数据集内容哈希、派生产物输入、最近变更记录"""
+    get_site(site).api.manifest.reload()
+    return get_site(site).api.manifest.data
+
+
+@rcms_router.get("/datasets")
+def get_datasets_api(site: str | None = None):
+    """RCMS数据集加载状态：是否已加载、加载耗时、缓存文件大小、空闲时间、进程内存"""
+    return get_site(site).api.dataset_stats()
+
+
+@rcms_router.post("/release_datasets")
+def release_datasets_api(names: list[str] | None = Body(None), idle_seconds: float = 0, site: str | None = None):
+    """释放数据集内存，下次访问时从缓存重新加载"""
+    released = get_site(site).api.release(names, idle_seconds=idle_seconds)
+    return {"message": f"已释放 {len(released)} 个数据集", "released": released}
+
+
+@rcms_router.get("/spatial/nearest")
+def spatial_nearest_api(x: float, y: float, max_distance: float | None = None, site: str | None = None):
+    """坐标 -> 最近点位"""
+    try:
+        cell = get_cell_index(site).nearest(x, y, max_distance)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if not cell:
+        return {"message": "范围内没有点位", "success": False}
+    return {"data": cell, "success": True}
+
+
+@rcms_router.get("/spatial/cell/{code}")
+def spatial_cell_api(code: str, site: str | None = None):
+    """点位编码 -> 坐标"""
+    cell = get_cell_index(site).resolve(code)
+    if not cell:
+        return {"message": f"点位不存在: {code}", "success": False}
+    return {"data": cell, "success": True}
+
+
+@rcms_router.get("/spatial/cells")
+def spatial_cells_api(
+    x: float | None = None,
+    y: float | None = None,
+    radius: float | None = None,
+    x1: float | None = None,
+    y1: float | None = None,
+    x2: float | None = None,
+    y2: float | None = None,
+    site: str | None = None,
+):
+    """半径(x, y, radius)或矩形(x1, y1, x2, y2)范围内的点位"""
+    index = get_cell_index(site)
+    try:
+        if None not in (x1, y1, x2, y2):
+            data = index.within_box(x1, y1, x2, y2)
+        elif None not in (x, y, radius):
+            data = index.within_radius(x, y, radius)
+        else:
+            return {"message": "需要提供 x,y,radius 或 x1,y1,x2,y2", "success": False}
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"data": data, "count": len(data), "success": True}
+
+
+@rcms_router.get("/spatial/robots")
+def spatial_robots_api(
+    x: float | None = None,
+    y: float | None = None,
+    radius: float | None = None,
+    x1: float | None = None,
+    y1: float | None = None,
+    x2: float | None = None,
+    y2: float | None = None,
+    site: str | None = None,
+):
+    """半径(x, y, radius)或矩形(x1, y1, x2, y2)范围内的机器人"""
+    robots = read_robot_positions(site)
+    try:
+        if None not in (x1, y1, x2, y2):
+            data = robots_within(robots, 0, 0, box=(x1, y1, x2, y2))
+        elif None not in (x, y, radius):
+            data = robots_within(robots, x, y, radius=radius)
+        else:
+            return {"message": "需要提供 x,y,radius 或 x1,y1,x2,y2", "success": False}
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"data": data, "count": len(data), "success": True}
+
+
+@rcms_router.get("/spatial/robot_cells")
+def spatial_robot_cells_api(max_distance: float | None = None, site: str | None = None):
+    """所有机器人当前坐标对应的最近点位"""
+    try:
+        check_finite(max_distance)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    index = get_cell_index(site)
+    data = {}
+    for robot_id, status in read_robot_positions(site).items():
+        pos = status.get("position") or {}
+        # 坐标缺失或非有限数值的机器人跳过
+        try:
+            data[robot_id] = index.nearest(float(pos.get("x")), float(pos.get("y")), max_distance)
+        except (TypeError, ValueError):
+            continue
+    return {"data": data, "success": True}
+
+
+@rcms_router.get("/road/info")
+def road_info_api(site: str | None = None):
+    """路网规模"""
+    graph = get_road_graph(site)
+    return {
+        "nodes": graph.node_count,
+        "edges": graph.edge_count,
+        "success": graph.node_count > 0,
+        "message": "" if graph.node_count else "没有线路数据，请先执行 build raw",
+    }
+
+
+@rcms_router.get("/road/shortest_path")
+def road_shortest_path_api(source: str, target: str, site: str | None = None):
+    """两个点位之间的最短路径"""
+    result = get_road_graph(site).shortest_path(source, target)
+    if not result:
+        return {"message": f"{source} 到 {target} 不可达", "success": False}
+    length, path = result
+    return {"length": length, "path": path, "success": True}
+
+
+@rcms_router.get("/road/eta")
+def road_eta_api(robot_id: str | None = None, target: str | None = None, site: str | None = None):
+    """
+    机器人沿当前路径的剩余距离与预计到达时间
+    指定 target 点位时按路网最短路径计算到该点位的距离
+    """
+    from backend.api.websocket import read_robot_status
+
+    robots = read_robot_status(get_redis_and_rdstag(site))
+    if robot_id is not None:
+        if robot_id not in robots:
+            return {"message": f"AGV {robot_id} 状态不存在", "success": False}
+        robots = {robot_id: robots[robot_id]}
+    speed = cfg.get("road.default_speed") or 1000
+    if target is None:
+        return {"data": fleet_eta(robots, speed), "success": True}
+
+    index, graph = get_cell_index(site), get_road_graph(site)
+    data = {}
+    for rid, status in robots.items():
+        pos = status.get("position") or {}
+        try:
+            cell = index.nearest(float(pos.get("x")), float(pos.get("y")))
+        except (TypeError, ValueError):
+            continue
+        result = graph.shortest_path(cell["code"], target) if cell else None
+        if not result:
+            data[rid] = None
+            continue
+        remaining = result[0] + cell["distance"]
+        data[rid] = {"remaining": round(remaining, 1), "eta": round(remaining / speed, 1), "from": cell["code"]}
+    return {"data": data, "success": True}
 
 
 @rcms_router.get("/maplist")
-def get_maplist_api():
-    return rapi.maplist
+def get_maplist_api(site: str | None = None):
+    return get_site(site).api.maplist
 
 
 @rcms_router.post("/start_zeromq_map_update")
-def start_zeromq_map_update(map_index: int = 0, interval: float = 0.01):
-    """启动ZeroMQ Map Info Update进程"""
-    return ensure_zeromq_started()
+def start_zeromq_map_update(map_index: int = 0, interval: float = 0.01, site: str | None = None):
+    """启动ZeroMQ接入服务"""
+    return ensure_zeromq_started(site)
 
 
 @rcms_router.post("/stop_zeromq_map_update")
-def stop_zeromq_map_update(map_index: int = 0):
-    """停止ZeroMQ Map Info Update进程"""
-    return ensure_zeromq_stopped()
+def stop_zeromq_map_update(map_index: int = 0, site: str | None = None):
+    """停止ZeroMQ接入服务"""
+    return ensure_zeromq_stopped(site)
+
+
+@rcms_router.post("/restart_zeromq_map_update")
+def restart_zeromq_map_update(site: str | None = None):
+    """热重启ZeroMQ接入服务（保留已解析的RCMS缓存）"""
+    return get_site(site).ingest.command("restart")
+
+
+@rcms_router.post("/pause_zeromq_map_update")
+def pause_zeromq_map_update(site: str | None = None):
+    """暂停ZeroMQ接入服务，订阅连接保持"""
+    return get_site(site).ingest.command("pause")
+
+
+@rcms_router.post("/resume_zeromq_map_update")
+def resume_zeromq_map_update(site: str | None = None):
+    """恢复ZeroMQ接入服务"""
+    return get_site(site).ingest.command("resume")
+
+
+@rcms_router.get("/zeromq_health")
+def get_zeromq_health(site: str | None = None):
+    """ZeroMQ接入服务健康检查"""
+    return get_site(site).ingest.health()
 
 
 @rcms_router.get("/zeromq_program_info")
-def get_zeromq_program_info():
+def get_zeromq_program_info(site: str | None = None):
     """获取ZeroMQ程序信息"""
-    _, _, info_data, _ = get_program_info()
+    _, _, info_data, _ = get_program_info(site)
 
     if info_data:
         return {
@@ -393,9 +738,10 @@ def get_zeromq_program_info():
             "info": info_data,
             "zmq_auto": cfg.get("zmq_auto"),
             "zmq_auto_kill_timedelta": cfg.get("zmq_auto_kill_timedelta"),
+            "health": get_site(site).ingest.health(),
         }
     else:
-        return {"message": "未找到程序信息", "info": None}
+        return {"message": "未找到程序信息", "info": None, "health": get_site(site).ingest.health()}
 
 
 # 创建异常日志数据库实例
@@ -1,17 +1,27 @@
+import json
+import time
 from functools import wraps
+from typing import Literal
 
-from fastapi import APIRouter, Body
+from fastapi import APIRouter, Body, HTTPException
+from fastapi.responses import StreamingResponse
 
 from util.config import cfg
-from util.rcs_web_api import RcsWebApi
+from util.rcs_web_api import BULK_OPS, RcsWebApi
+from util.sites import sites
 
 rcs_web_router = APIRouter(
     prefix="/rcs_web",
     tags=["rcs_web"],
 )
 
-# 创建RcsWebApi实例
-rcs_api = RcsWebApi()
+
+def get_rcs_api(site: str | None = None) -> RcsWebApi:
+    """现场的RcsWebApi长连接客户端，site 为空时为默认现场，不存在时返回404"""
+    try:
+        return sites.get(site).web
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
 
 def handle_rcs_exception():
@@ -20,6 +30,8 @@ def handle_rcs_exception():
         async def wrapper(*args, **kwargs):
             try:
                 return await func(*args, **kwargs)
+            except HTTPException:
+                raise
             except Exception as e:
                 error_str = str(e).strip()
                 error_msg = error_str if error_str else repr(e)
@@ -50,6 +62,7 @@ async def find_tasks_detail_api(
     sdateTo: str = Body(None, description="开始时间"),
     edateTo: str = Body(None, description="结束时间"),
     limit: int = Body(20, description="每页数量"),
+    site: str | None = None,
 ):
     if cfg.get("test"):
         return {
@@ -123,26 +136,25 @@ async def find_tasks_detail_api(
             "count": 1,
         }
 
-    async with rcs_api:
-        result = await rcs_api.find_tasks_detail(
-            robotCode=robotCode,
-            taskTyp=taskTyp,
-            taskStatus=taskStatus,
-            carrierId=carrierId,
-            podCode=podCode,
-            ctnrCode=ctnrCode,
-            tranTaskNum=tranTaskNum,
-            wbCode=wbCode,
-            uname=uname,
-            dstMapCode=dstMapCode,
-            groupNum=groupNum,
-            liftCode=liftCode,
-            srcEqName=srcEqName,
-            desEqName=desEqName,
-            sdateTo=sdateTo,
-            edateTo=edateTo,
-            limit=limit,
-        )
+    result = await get_rcs_api(site).find_tasks_detail(
+        robotCode=robotCode,
+        taskTyp=taskTyp,
+        taskStatus=taskStatus,
+        carrierId=carrierId,
+        podCode=podCode,
+        ctnrCode=ctnrCode,
+        tranTaskNum=tranTaskNum,
+        wbCode=wbCode,
+        uname=uname,
+        dstMapCode=dstMapCode,
+        groupNum=groupNum,
+        liftCode=liftCode,
+        srcEqName=srcEqName,
+        desEqName=desEqName,
+        sdateTo=sdateTo,
+        edateTo=edateTo,
+        limit=limit,
+    )
     return result
 
 
@@ -152,6 +164,7 @@ async def find_sub_tasks_detail_api(
     trans_task_num: str = Body("", description="任务编号"),
     search_year: int = Body(2020, description="搜索年份"),
     show_his_data: str = Body("false", description="是否显示历史数据"),
+    site: str | None = None,
 ):
     if cfg.get("test"):
         return {
@@ -291,24 +304,24 @@ async def find_sub_tasks_detail_api(
             "success": True,
         }
 
-    async with rcs_api:
-        result = await rcs_api.find_sub_tasks_detail(
-            trans_task_num=trans_task_num,
-            search_year=search_year,
-            show_his_data=show_his_data,
-        )
+    result = await get_rcs_api(site).find_sub_tasks_detail(
+        trans_task_num=trans_task_num,
+        search_year=search_year,
+        show_his_data=show_his_data,
+    )
     return result
 
 
 @rcs_web_router.post("/stopagv")
 @handle_rcs_exception()
 async def stopagv(
-    agvcode=Body("", description="agv编号"), stop=Body(False, description="是否stop")
+    agvcode=Body("", description="agv编号"),
+    stop=Body(False, description="是否stop"),
+    site: str | None = None,
 ):
-    async with rcs_api:
-        result = await rcs_api.stopResumeOffline(
-            agvCodes=agvcode, flag="stop" if stop else "resume"
-        )
+    result = await get_rcs_api(site).stopResumeOffline(
+        agvCodes=agvcode, flag="stop" if stop else "resume"
+    )
     return result
 
 
@@ -319,14 +332,14 @@ async def get_agv_status_api(
     robot_count: str = "-1",
     robots: str = "",
     map_short_name: str = "",
+    site: str | None = None,
 ):
-    async with rcs_api:
-        result = await rcs_api.get_agv_status(
-            client_code=client_code,
-            robot_count=robot_count,
-            robots=robots,
-            map_short_name=map_short_name,
-        )
+    result = await get_rcs_api(site).get_agv_status(
+        client_code=client_code,
+        robot_count=robot_count,
+        robots=robots,
+        map_short_name=map_short_name,
+    )
     return result
 
 
@@ -336,23 +349,24 @@ async def login_api(
     username: str = Body(..., embed=False),
     password: str = Body(..., embed=False),
     pwd_safe_level: str = Body("3", embed=False),
+    site: str | None = None,
 ):
-    async with rcs_api:
-        result = await rcs_api.login(
-            username=username, password=password, pwd_safe_level=pwd_safe_level
-        )
+    result = await get_rcs_api(site).login(
+        username=username, password=password, pwd_safe_level=pwd_safe_level
+    )
     return result
 
 
 @rcs_web_router.get("/login2")
 @handle_rcs_exception()
-async def login_api2():
-    async with rcs_api:
-        result = await rcs_api.login(
-            username=cfg.get("rcms.username"),
-            password=cfg.get("rcms.password"),
-            pwd_safe_level="3",
-        )
+async def login_api2(site: str | None = None):
+    # 使用该现场配置的账号（未配置时为 rcms.username/password）
+    api = get_rcs_api(site)
+    result = await api.login(
+        username=api.username,
+        password=api.password,
+        pwd_safe_level="3",
+    )
     return result
 
 
@@ -362,9 +376,9 @@ async def check_is_rolling_api(
     trans_task_nums: str = Body(
         "", embed=True, description="传输任务编号，多个任务号用逗号分隔"
     ),
+    site: str | None = None,
 ):
-    async with rcs_api:
-        result = await rcs_api.check_is_rolling(trans_task_nums=trans_task_nums)
+    result = await get_rcs_api(site).check_is_rolling(trans_task_nums=trans_task_nums)
     return result
 
 
@@ -374,11 +388,11 @@ async def check_starting_trans_tasks_api(
     trans_task_nums: str = Body(
         "", embed=True, description="传输任务编号，多个任务号用逗号分隔"
     ),
+    site: str | None = None,
 ):
-    async with rcs_api:
-        result = await rcs_api.check_starting_trans_tasks(
-            trans_task_nums=trans_task_nums
-        )
+    result = await get_rcs_api(site).check_starting_trans_tasks(
+        trans_task_nums=trans_task_nums
+    )
     return result
 
 
@@ -388,9 +402,9 @@ async def check_soft_cancel_api(
     trans_task_nums: str = Body(
         "", embed=True, description="传输任务编号，多个任务号用逗号分隔"
     ),
+    site: str | None = None,
 ):
-    async with rcs_api:
-        result = await rcs_api.check_soft_cancel(trans_task_nums=trans_task_nums)
+    result = await get_rcs_api(site).check_soft_cancel(trans_task_nums=trans_task_nums)
     return result
 
 
@@ -402,13 +416,13 @@ async def cancel_trans_tasks_api(
     ),
     cancel_type: str = Body("0", embed=True, description="取消类型"),
     toStationTaskCodes: str = Body("2", embed=True, description="回区域"),
+    site: str | None = None,
 ):
-    async with rcs_api:
-        result = await rcs_api.cancel_trans_tasks(
-            trans_task_nums=trans_task_nums,
-            cancel_type=cancel_type,
-            toStationTaskCodes=toStationTaskCodes,
-        )
+    result = await get_rcs_api(site).cancel_trans_tasks(
+        trans_task_nums=trans_task_nums,
+        cancel_type=cancel_type,
+        toStationTaskCodes=toStationTaskCodes,
+    )
     return result
 
 
@@ -416,9 +430,9 @@ async def cancel_trans_tasks_api(
 @handle_rcs_exception()
 async def fCancelTask(
     taskCode: str = Body("", embed=True, description="任务编号"),
+    site: str | None = None,
 ):
-    async with rcs_api:
-        result = await rcs_api.forceCancelTask(trans_task_nums=taskCode)
+    result = await get_rcs_api(site).forceCancelTask(trans_task_nums=taskCode)
     return result
 
 
@@ -426,9 +440,9 @@ async def fCancelTask(
 @handle_rcs_exception()
 async def resume_action(
     agvid: str = Body("", embed=True, description="agv编号"),
+    site: str | None = None,
 ):
-    async with rcs_api:
-        result = await rcs_api.resumeAction(agvcode=agvid)
+    result = await get_rcs_api(site).resumeAction(agvcode=agvid)
     return result
 
 
@@ -436,13 +450,73 @@ async def resume_action(
 @handle_rcs_exception()
 async def freeagv_action(
     agvcode: str = Body("", embed=True, description="agv编号"),
+    site: str | None = None,
 ):
-    async with rcs_api:
-        result = await rcs_api.freeagv(agvcode=agvcode)
+    result = await get_rcs_api(site).freeagv(agvcode=agvcode)
     return result
 
 
 
+@rcs_web_router.post("/bulk/{op}")
+async def bulk_action(
+    op: str,
+    items: list[str] = Body(..., embed=True, description="任务号或AGV编号列表"),
+    cancel_type: str = Body("0", embed=True, description="取消类型(cancel_trans_tasks)"),
+    toStationTaskCodes: str = Body("2", embed=True, description="回区域(cancel_trans_tasks)"),
+    concurrency: int | None = Body(None, embed=True, description="并发数，默认 rcms.bulk_concurrency"),
+    format: Literal["sse", "ndjson", "json"] = "sse",
+    site: str | None = None,
+):
+    """
+    批量执行 cancel_trans_tasks / forceCancelTask / resumeAction / freeagv
+
+    sse/ndjson 按完成顺序逐条返回每个编号的结果，最后一条为汇总(type=done)；
+    json 全部完成后一次返回汇总与结果列表。
+    """
+    if op not in BULK_OPS:
+        raise HTTPException(status_code=404, detail=f"不支持的批量操作: {op}，可选 {', '.join(BULK_OPS)}")
+    rcs_api = get_rcs_api(site)
+    max_concurrency = cfg.get("rcms.bulk_max_concurrency") or 32
+    if concurrency is not None:
+        concurrency = min(max(concurrency, 1), max_concurrency)
+    kwargs = {}
+    if op == "cancel_trans_tasks":
+        kwargs = {"cancel_type": cancel_type, "toStationTaskCodes": toStationTaskCodes}
+
+    async def events():
+        started = time.monotonic()
+        summary = {"type": "done", "op": op, "total": 0, "succeeded": 0, "failed": [], "elapsed": 0.0}
+        async for result in rcs_api.bulk(op, items, concurrency, **kwargs):
+            summary["total"] += 1
+            if result["success"]:
+                summary["succeeded"] += 1
+            else:
+                summary["failed"].append(result["item"])
+            yield {"type": "item", **result}
+        summary["elapsed"] = round(time.monotonic() - started, 3)
+        summary["success"] = not summary["failed"]
+        yield summary
+
+    if format == "json":
+        results = []
+        async for event in events():
+            results.append(event)
+        summary = results.pop()
+        summary.pop("type")
+        return {**summary, "results": sorted(results, key=lambda x: x["index"])}
+
+    async def stream():
+        async for event in events():
+            data = json.dumps(event, ensure_ascii=False, default=str)
+            yield f"data: {data}\n\n" if format == "sse" else data + "\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream" if format == "sse" else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @rcs_web_router.post("/getPort")
 @handle_rcs_exception()
 async def Port(
@@ -456,36 +530,109 @@ async def Port(
     type: str = Body("-1", embed=True),
     upDown: str = Body("-1", embed=True),
     buforeq: str = Body("machinePort", embed=True),
+    site: str | None = None,
 ):
-    async with rcs_api:
-        result = await rcs_api.getPort(
-            start,
-            limit,
-            port,
-            mapDataCode,
-            cmsIndex,
-            carrierId,
-            carrierLoc,
-            type,
-            upDown,
-            buforeq,
-        )
+    result = await get_rcs_api(site).getPort(
+        start,
+        limit,
+        port,
+        mapDataCode,
+        cmsIndex,
+        carrierId,
+        carrierLoc,
+        type,
+        upDown,
+        buforeq,
+    )
     return result
 
 
 @rcs_web_router.get("/get_device_type_options")
 @handle_rcs_exception()
-async def get_device_type_options():
+async def get_device_type_options(site: str | None = None):
     """
     获取设备类型选项 CMS索引映射表缓存
     """
-    return rcs_api.get_device_type_options()
+    return get_rcs_api(site).get_device_type_options()
+
+
+@rcs_web_router.get("/ports/info")
+def port_directory_info(site: str | None = None):
+    """端口目录状态：端口/设备/载具数量与构建时间"""
+    ports = get_rcs_api(site).ports
+    ports.ensure()
+    return {"data": ports.info(), "success": True}
+
+
+@rcs_web_router.get("/ports/search")
+def search_devices(q: str, limit: int = 20, site: str | None = None):
+    """按设备名/eqName前缀搜索设备，返回设备类型、设备cmsIndex与端口数"""
+    data = get_rcs_api(site).ports.search(q, min(max(limit, 1), 200))
+    return {"data": data, "success": True}
+
+
+@rcs_web_router.get("/ports/by_cms/{cms_index}")
+def ports_by_cms(cms_index: str, site: str | None = None):
+    """cmsIndex -> 端口列表，设备cmsIndex(xxxx00)返回设备下全部端口"""
+    data = get_rcs_api(site).ports.ports_of(cms_index)
+    if not data:
+        return {"message": f"未找到 cmsIndex={cms_index} 的端口", "success": False}
+    return {"data": data, "success": True}
+
+
+@rcs_web_router.get("/ports/by_carrier/{carrier_id}")
+def port_by_carrier(carrier_id: str, site: str | None = None):
+    """载具ID -> 端口（端口缓存时的位置）"""
+    data = get_rcs_api(site).ports.carrier(carrier_id)
+    if data is None:
+        return {"message": f"未找到载具 {carrier_id}", "success": False}
+    return {"data": data, "success": True}
+
+
+@rcs_web_router.get("/ports/{port}")
+def port_detail(port: str, site: str | None = None):
+    """端口 -> cmsIndex、所属设备与类型"""
+    data = get_rcs_api(site).ports.port(port)
+    if data is None:
+        return {"message": f"未找到端口 {port}", "success": False}
+    return {"data": data, "success": True}
+
+
+@rcs_web_router.get("/session")
+async def get_session_api(site: str | None = None):
+    """RCS Web 会话与连接池状态：登录次数、重新登录次数、等待登录的请求数"""
+    return {"data": get_rcs_api(site).session_info(), "success": True}
+
+
+def get_fleet(site: str | None = None):
+    try:
+        return sites.get(site).fleet
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@rcs_web_router.get("/fleet")
+@handle_rcs_exception()
+async def get_fleet_api(site: str | None = None, code: str | None = None, refresh: bool = False):
+    """车队目录：机器人编号 -> IP/车型/固件版本，code 为空时返回全部"""
+    fleet = get_fleet(site)
+    if refresh:
+        await fleet.refresh()
+    if code:
+        entry = await fleet.get(code)
+        if entry is None:
+            return {"message": f"未找到机器人 {code}", "success": False}
+        return {"data": entry, "success": True}
+    if not fleet.loaded_at:
+        await fleet.refresh()
+    return {"data": fleet.entries(), "info": fleet.info(), "success": True}
+
 
 @handle_rcs_exception()
-def refresh_rcs_api():
+async def refresh_rcs_api(site: str | None = None):
     """
-    刷新RCS Web API客户端
+    刷新RCS Web API客户端：关闭长连接，下次请求时重新连接并登录
     """
-    global rcs_api
-    rcs_api = RcsWebApi()
+    rcs_api = get_rcs_api(site)
+    await rcs_api.aclose()
     return {"message": "success", "base_url": rcs_api.base_url}
@@ -6,9 +6,11 @@ from fastapi import FastAPI
 
 from backend.api.other import cleanup_expired_files
 from backend.api.rcmsapi import rapi
+from backend.api.wcsapi import wcs, wcs_poller
 from backend.api.websocket import broadcast_robot_status, start_zeromq_management_task
 from util.config import cfg
 from util.gossip import get_local_info, get_node, stop_default
+from util.sites import sites
 
 # 通知桥接：gossip 线程 -> asyncio WebSocket 广播
 gossip_notification_queue: asyncio.Queue = asyncio.Queue(maxsize=200)
@@ -99,6 +101,38 @@ async def _broadcast_gossip_state():
             pass
 
 
+async def _auto_refresh_rcms_cache(interval: float):
+    """定时从RCMS刷新各现场的缓存，只有内容变化的数据集会写盘，派生产物按需重建"""
+    while True:
+        try:
+            await asyncio.sleep(interval)
+        except asyncio.CancelledError:
+            break
+        for site in sites:
+            try:
+                changed = await site.api.abuild_from_raw()
+                if "sharemapdata" in changed:
+                    await asyncio.to_thread(site.api.genmapimage)
+                await site.web.saveallport()
+            except asyncio.CancelledError:
+                return
+            except Exception as e:
+                print(f"自动刷新现场{site.name}的RCMS缓存失败: {e}")
+
+
+async def _auto_release_datasets(idle_seconds: float, rss_limit_mb: float, interval: float = 60):
+    """定时释放空闲的RCMS数据集，进程内存超过上限时释放更多"""
+    while True:
+        try:
+            await asyncio.sleep(interval)
+            for site in sites:
+                await asyncio.to_thread(site.release_idle_datasets, idle_seconds, rss_limit_mb)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            print(f"释放空闲数据集失败: {e}")
+
+
 # 应用启动时的事件处理
 def setup_startup_event(app: FastAPI):
     """设置应用启动事件"""
@@ -108,16 +142,37 @@ def setup_startup_event(app: FastAPI):
         # Clean up expired files on startup
         cleanup_expired_files()
 
-        # 启动广播任务
-        rdstag = cfg.get_with_reload("rcms.host").split("://")[1].replace(":", "-")
-        task = asyncio.create_task(broadcast_robot_status(rdstag))
-        task.set_name("broadcast_robot_status")
+        # 每个现场启动一个广播任务
+        for site in sites:
+            task = asyncio.create_task(broadcast_robot_status(site.rdstag))
+            task.set_name(f"broadcast_robot_status:{site.name}")
         # t/ask.result
         # 启动ZeroMQ管理任务
         # print(f"cfg.get('zmq_auto'): {cfg.get('zmq_auto')}")``
         if cfg.get("zmq_auto"):
             asyncio.create_task(start_zeromq_management_task())
         rapi.build_from_cache()
+        # 车队目录后台刷新（机器人编号 -> IP）
+        for site in sites:
+            site.fleet.start()
+        # WCS设备状态后台轮询，0为关闭
+        if cfg.get("rcms.wcs_poll_interval"):
+            wcs_poller.start()
+        refresh_interval = cfg.get("rcms.auto_refresh_interval")
+        if refresh_interval:
+            refresh_task = asyncio.create_task(_auto_refresh_rcms_cache(refresh_interval))
+            refresh_task.set_name("rcms-cache-refresh")
+        release_idle = cfg.get("rcms.dataset_idle_release") or 0
+        rss_limit = cfg.get("rcms.dataset_rss_limit_mb") or 0
+        if release_idle or rss_limit:
+            release_task = asyncio.create_task(_auto_release_datasets(release_idle, rss_limit))
+            release_task.set_name("rcms-dataset-release")
+        # Redis中无机器人状态时(如Redis重启)先用磁盘快照填充
+        for site in sites:
+            try:
+                site.ingest.restore_snapshot()
+            except Exception as e:
+                print(f"恢复现场{site.name}的车队快照失败: {e}")
 
         # 启动 gossip 节点（独立线程）
         threading.Thread(
@@ -144,4 +199,9 @@ def setup_startup_event(app: FastAPI):
 
     @app.on_event("shutdown")
     async def shutdown_event():
+        wcs_poller.stop()
+        await wcs.aclose()
+        for site in sites:
+            site.stop()
+            await site.aclose()
         stop_default()
@@ -1,14 +1,108 @@
-from fastapi import APIRouter, Body
+import asyncio
+import json
 
+from fastapi import APIRouter, Body, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel
+
+from backend.api.websocket import hub_try_lead
+from util.config import cfg
+from util.sites import sites
 from util.wcs import Wcs
+from util.wcs_poller import DEFAULT_TYPES, WcsStatusPoller
 
 wcs_web_router = APIRouter(
     prefix="/wcs",
     tags=["wcs"],
 )
+# WCS只有一套(rcms.wcs_rest_api)，设备列表取自默认现场的端口缓存，不按现场区分
 wcs = Wcs()
 
+
+def poll_devices() -> list[tuple[str, str]]:
+    """需要轮询的设备：cmsindexmap 中 rcms.wcs_poll_types 类型的全部设备（读取缓存文件，在线程中调用）"""
+    types = cfg.get("rcms.wcs_poll_types") or DEFAULT_TYPES
+    try:
+        cmsindexmap = sites.default.web.get_cmsindexmap()
+    except FileNotFoundError:
+        return []
+    return [
+        (cms_index, device_type)
+        for device_type in types
+        for cms_index in (cmsindexmap.get(device_type) or {}).values()
+    ]
+
+
+# 多worker时与机器人状态帧生产者共用领导锁，只有一个worker轮询WCS
+wcs_poller = WcsStatusPoller(
+    wcs,
+    poll_devices,
+    sites.default.rdstag,
+    is_leader=lambda: hub_try_lead(sites.default.rdstag),
+)
+
+
 @wcs_web_router.get("/searchDeviceStatusInfo")
 async def search_device_status_info(cms_index: str, device_type: str):
+    """设备状态，后台轮询中已有的设备直接返回内存中的最新状态"""
+    cached = wcs_poller.cached(cms_index, device_type)
+    if cached is not None:
+        return cached
+    return await wcs.query(cms_index, device_type)
+
+
+class DeviceQuery(BaseModel):
+    cms_index: str
+    device_type: str
+
+
+@wcs_web_router.post("/batchDeviceStatusInfo")
+async def batch_device_status_info(
+    items: list[DeviceQuery] = Body(..., embed=True, description="(cms_index, device_type) 列表"),
+    timeout: float = Body(5, embed=True, description="每次调用WCS的超时(秒)，不含排队时间"),
+    queue_timeout: float | None = Body(None, embed=True, description="每项等待并发名额的最长时间(秒)，默认不限"),
+    use_cache: bool = Body(True, embed=True, description="后台轮询中已有的设备直接使用内存状态"),
+):
+    """
+    批量查询设备状态：并发调用WCS，单项失败不影响其他项，结果中带每项的 code/message
+    """
+    max_items = cfg.get("rcms.wcs_batch_max_items") or 200
+    if len(items) > max_items:
+        return {"code": -1, "message": f"一次最多查询 {max_items} 项", "results": []}
+    timeout = min(max(timeout, 0.5), 30)
+    results = await wcs.batch(
+        [(i.cms_index, i.device_type) for i in items],
+        timeout,
+        wcs_poller.cached if use_cache else None,
+        queue_timeout=min(max(queue_timeout, 0.1), 60) if queue_timeout else None,
+    )
+    failed = [f"{r['device_type']}:{r['cms_index']}" for r in results if r["code"] != 0]
+    return {
+        "code": 0 if not failed else -1,
+        "message": "" if not failed else f"{len(failed)} 项查询失败",
+        "total": len(results),
+        "failed": failed,
+        "results": results,
+    }
+
+
+@wcs_web_router.get("/status")
+async def wcs_status(device_type: str | None = None, cms_index: str | None = None):
+    """后台轮询的全部设备状态快照，可按设备类型/cmsIndex过滤"""
+    return {**wcs_poller.snapshot(device_type, cms_index), "info": wcs_poller.info()}
+
 
-    return await wcs.search_device_status_info(cms_index, device_type)
+async def websocket_wcs_status_endpoint(websocket: WebSocket):
+    """WCS设备状态WebSocket：先推送完整快照，之后只推送变化的状态行"""
+    await websocket.accept()
+    queue = wcs_poller.subscribe()
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=25)
+            except asyncio.TimeoutError:
+                message = {"type": "heartbeat"}
+            await websocket.send_text(json.dumps(message, ensure_ascii=False))
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        wcs_poller.unsubscribe(queue)
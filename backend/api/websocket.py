@@ -1,25 +1,59 @@
 import asyncio
 import logging
+import os
+import socket
 import time
 import uuid
 from datetime import datetime, timedelta
 
 import orjson
+import redis.asyncio as aioredis
 from fastapi import WebSocket
 from fastapi.websockets import WebSocketDisconnect
 
 from backend.api import rcmsapi
 from util.config import cfg, r
+from util.road_graph import FleetEta
+from util.sites import Site, sites
 
 logger = logging.getLogger(__name__)
 
 WEBSOCKET_CONNECTIONS_KEY = "websocket_connections"
+# 最近一次WebSocket活动时间(所有worker共享)
+WEBSOCKET_ACTIVITY_KEY = "websocket_last_activity"
+
+# 当前worker进程标识，uvicorn workers > 1 时每个进程各不相同
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+# worker存活心跳TTL(秒)，超时未续期的worker视为已退出
+WORKER_TTL = 5
 
 redis_client = None
 local_connections: dict[WebSocket, str] = {}
+# 每个连接请求的推送频率(Hz)，已归档到 RATE_TIERS 中的某一档
+client_rates: dict[WebSocket, float] = {}
+# 每个连接订阅的现场(rdstag)
+client_sites: dict[WebSocket, str] = {}
+
+# 推送频率档位(Hz)：地图动画用高档位，KPI看板用低档位
+RATE_TIERS = (10.0, 5.0, 2.0, 1.0, 0.5, 0.2)
+
+
+def ws_normalize_rate(rate) -> float:
+    """将客户端请求的频率归档到不超过它的最近档位，并受 ws.max_rate 限制"""
+    default_rate = cfg.get("ws.default_rate") or 1.0
+    max_rate = cfg.get("ws.max_rate") or RATE_TIERS[0]
+    try:
+        rate = float(rate) if rate is not None else float(default_rate)
+    except (TypeError, ValueError):
+        rate = float(default_rate)
+    rate = min(rate, float(max_rate))
+    for tier in RATE_TIERS:
+        if rate >= tier:
+            return tier
+    return RATE_TIERS[-1]
 
 
-def ws_add_connection(ws: WebSocket) -> str:
+def ws_add_connection(ws: WebSocket, rdstag: str = "") -> str:
     conn_id = str(uuid.uuid4())
     conn_data = {
         "id": conn_id,
@@ -27,10 +61,13 @@ def ws_add_connection(ws: WebSocket) -> str:
         "client_host": ws.client.host if ws.client else "",
         "client_port": ws.client.port if ws.client else 0,
         "user_agent": ws.headers.get("user-agent", ""),
+        "worker": WORKER_ID,
+        "rdstag": rdstag,
     }
     r.hset(WEBSOCKET_CONNECTIONS_KEY, conn_id, orjson.dumps(conn_data))
     r.expire(WEBSOCKET_CONNECTIONS_KEY, 60)
     local_connections[ws] = conn_id
+    client_sites[ws] = rdstag
     return conn_id
 
 
@@ -38,8 +75,13 @@ def ws_remove_connection(conn_id: str):
     r.hdel(WEBSOCKET_CONNECTIONS_KEY, conn_id)
 
 
-def ws_get_connection_count() -> int:
-    return r.hlen(WEBSOCKET_CONNECTIONS_KEY)
+def ws_get_connection_count(rdstag: str | None = None) -> int:
+    """连接总数，指定 rdstag 时只统计该现场的连接"""
+    if rdstag is None:
+        return r.hlen(WEBSOCKET_CONNECTIONS_KEY)
+    return sum(
+        1 for c in ws_get_all_connections().values() if c.get("rdstag", rdstag) == rdstag
+    )
 
 
 def ws_get_all_connections() -> dict:
@@ -58,10 +100,12 @@ def ws_get_all_connections() -> dict:
     return result
 
 
-def ws_detail_gen():
+def ws_detail_gen(rdstag: str | None = None):
     connections = ws_get_all_connections()
     ret = []
     for conn_id, data in connections.items():
+        if rdstag is not None and data.get("rdstag", rdstag) != rdstag:
+            continue
         connect_time = data.get("connect_time", "")
         if isinstance(connect_time, datetime):
             connect_time = connect_time.strftime("%Y-%m-%d %H:%M:%S")
@@ -72,6 +116,7 @@ def ws_detail_gen():
                 "host:port": f"{data.get('client_host', '')}:{data.get('client_port', '')}",
                 "ua": data.get("user_agent", ""),
                 "connect_time": connect_time,
+                "worker": data.get("worker", ""),
             }
         )
     return ret
@@ -88,158 +133,432 @@ def ws_refresh_connection(conn_id: str):
     r.expire(WEBSOCKET_CONNECTIONS_KEY, 60)
 
 
+def ws_touch_activity():
+    """记录WebSocket活动时间，供负责ZeroMQ管理的worker判断空闲"""
+    global last_websocket_activity
+    last_websocket_activity = datetime.now()
+    r.set(WEBSOCKET_ACTIVITY_KEY, time.time(), ex=86400)
+
+
 def del_without_error(websocket):
     try:
         del local_connections[websocket]
     except Exception:
         pass
+    client_rates.pop(websocket, None)
+    client_sites.pop(websocket, None)
 
 
 last_websocket_activity = datetime.now()
 
-# 跟踪ZeroMQ进程是否已经因为超时而停止
-zeromq_stopped_due_to_timeout = False
+# 已经因为超时而停止ZeroMQ接入的现场
+zeromq_stopped_due_to_timeout: set[str] = set()
 
 
 async def start_zeromq_management_task():
-    """启动ZeroMQ进程管理定时任务"""
-    global last_websocket_activity, zeromq_stopped_due_to_timeout
+    """启动ZeroMQ进程管理定时任务，逐个现场检查"""
+    global last_websocket_activity
     timeout = cfg.get("zmq_auto_kill_timedelta")
     while True:
         try:
             await asyncio.sleep(10)
-
+            shared_activity = r.get(WEBSOCKET_ACTIVITY_KEY)
+            if shared_activity:
+                last_websocket_activity = max(
+                    last_websocket_activity,
+                    datetime.fromtimestamp(float(shared_activity)),
+                )
             idle_time = datetime.now() - last_websocket_activity
-            has_active_websocket = ws_get_connection_count() > 0
 
-            should_stop_due_to_idle = (
-                idle_time > timedelta(minutes=timeout) and not has_active_websocket
-            )
-
-            try:
-                rcmsapi.check_and_manage_zeromq_process(
-                    has_active_websocket, timeout=idle_time > timedelta(minutes=timeout)
+            for site in sites:
+                # 多worker时只由该现场帧生产者所在的worker负责启停ZeroMQ
+                if not hub_state.get(site.rdstag):
+                    continue
+                has_active_websocket = ws_get_connection_count(site.rdstag) > 0
+                should_stop_due_to_idle = (
+                    idle_time > timedelta(minutes=timeout) and not has_active_websocket
                 )
-                if should_stop_due_to_idle:
-                    if not zeromq_stopped_due_to_timeout:
-                        print(
-                            f"系统已空闲 {idle_time.total_seconds() / 60:.1f} 分钟且无活跃连接，停止ZeroMQ进程"
-                        )
-                        zeromq_stopped_due_to_timeout = True
-                else:
-                    if zeromq_stopped_due_to_timeout:
-                        zeromq_stopped_due_to_timeout = False
-            except Exception as e:
-                print(f"定时检查管理ZeroMQ进程时出错: {e}")
+                try:
+                    # 接入服务可能运行在其他worker中，停止命令需等待该进程响应
+                    await asyncio.to_thread(
+                        rcmsapi.check_and_manage_zeromq_process,
+                        has_active_websocket,
+                        timeout=idle_time > timedelta(minutes=timeout),
+                        site=site.name,
+                    )
+                    if should_stop_due_to_idle:
+                        if site.rdstag not in zeromq_stopped_due_to_timeout:
+                            print(
+                                f"现场 {site.name} 已空闲 {idle_time.total_seconds() / 60:.1f} 分钟且无活跃连接，停止ZeroMQ进程"
+                            )
+                            zeromq_stopped_due_to_timeout.add(site.rdstag)
+                    else:
+                        zeromq_stopped_due_to_timeout.discard(site.rdstag)
+                except Exception as e:
+                    print(f"定时检查管理ZeroMQ进程时出错({site.name}): {e}")
 
         except Exception as e:
             print(f"ZeroMQ管理任务出错: {e}")
             await asyncio.sleep(10)
 
 
-async def broadcast_robot_status(rdstag):
-    """广播机器人状态数据到所有连接的客户端"""
-    while True:
-        try:
-            robot_status = r.hgetall(f"{rdstag}:ROBOT_STATUS")
-            robots = {}
-            if robot_status:
-                robot_ids = [robot_id.decode("utf-8") for robot_id in robot_status.keys()]
-                task_info_keys = [f"{rdstag}:TASK_INFO_REQ:{rid}" for rid in robot_ids]
-                robot_path_keys = [f"{rdstag}:ROBOT_PATH:{rid}" for rid in robot_ids]
-                block_cell_keys = [f"{rdstag}:TRP_BLOCK_CELL:{rid}" for rid in robot_ids]
-                
-                task_info_results = r.mget(task_info_keys)
-                robot_path_results = r.mget(robot_path_keys)
-                block_cell_results = r.mget(block_cell_keys)
-                
-                for idx, (robot_id, status_json) in enumerate(robot_status.items()):
-                    robot_id_str = robot_id.decode("utf-8")
-                    try:
-                        status = orjson.loads(status_json.decode("utf-8"))
-                        robots[robot_id_str] = status
-                        robots[robot_id_str].update(
-                            {
-                                "taskinfo": orjson.loads(
-                                    (task_info_results[idx] or b"").decode("utf-8")
-                                ),
-                                "paths": orjson.loads(
-                                    (robot_path_results[idx] or b"").decode("utf-8")
-                                ),
-                                "block_cell": orjson.loads(
-                                    (block_cell_results[idx] or b"").decode("utf-8")
-                                ),
-                            }
-                        )
-                    except orjson.JSONDecodeError:
-                        continue
+def read_robot_status(rdstag) -> dict:
+    """从Redis读取全部机器人状态，并合并任务、路径、封锁区域信息"""
+    robot_status = r.hgetall(f"{rdstag}:ROBOT_STATUS")
+    robots = {}
+    if robot_status:
+        robot_ids = [robot_id.decode("utf-8") for robot_id in robot_status.keys()]
+        task_info_keys = [f"{rdstag}:TASK_INFO_REQ:{rid}" for rid in robot_ids]
+        robot_path_keys = [f"{rdstag}:ROBOT_PATH:{rid}" for rid in robot_ids]
+        block_cell_keys = [f"{rdstag}:TRP_BLOCK_CELL:{rid}" for rid in robot_ids]
 
-            if robots:
-                message = orjson.dumps(
+        task_info_results = r.mget(task_info_keys)
+        robot_path_results = r.mget(robot_path_keys)
+        block_cell_results = r.mget(block_cell_keys)
+
+        for idx, (robot_id, status_json) in enumerate(robot_status.items()):
+            robot_id_str = robot_id.decode("utf-8")
+            try:
+                status = orjson.loads(status_json.decode("utf-8"))
+                robots[robot_id_str] = status
+                robots[robot_id_str].update(
                     {
-                        "type": "ROBOT_STATUS",
-                        "timestamp": time.time(),
-                        # "task": taskinfo,
-                        "data": robots,
-                        "active_connections": ws_get_connection_count(),
-                        "active_connections_detail": ws_detail_gen(),
+                        "taskinfo": orjson.loads(
+                            (task_info_results[idx] or b"").decode("utf-8")
+                        ),
+                        "paths": orjson.loads(
+                            (robot_path_results[idx] or b"").decode("utf-8")
+                        ),
+                        "block_cell": orjson.loads(
+                            (block_cell_results[idx] or b"").decode("utf-8")
+                        ),
                     }
-                ).decode("utf-8")
+                )
+            except orjson.JSONDecodeError:
+                continue
+    return robots
+
+
+def alarm_active(alarm: dict) -> bool:
+    """报警主码非空且不为0（上报中可能是字符串或数字）"""
+    code = alarm.get("main_code")
+    return code is not None and str(code).strip() not in ("", "0")
+
+
+def detect_important_changes(robots: dict, last_marks: dict) -> tuple[bool, dict]:
+    """检测需要立即推送的变化：新报警（含首次出现即处于报警的机器人）或异常状态翻转
+
+    Returns:
+        tuple: (是否有重要变化, 本次的标记字典，用于下一次比较)
+    """
+    marks = {}
+    important = False
+    for robot_id, status in robots.items():
+        alarm = status.get("alarm") or {}
+        active = alarm_active(alarm)
+        alarm_code = f"{alarm.get('main_code', '')}-{alarm.get('sub_code', '')}" if active else ""
+        mark = (bool(status.get("abnormal")), alarm_code)
+        marks[robot_id] = mark
+        last = last_marks.get(robot_id)
+        if last is None:
+            if active:
+                important = True
+            continue
+        if mark[0] != last[0]:
+            important = True
+        elif mark[1] != last[1] and active:
+            important = True
+    return important, marks
 
-                for ws in list(local_connections.keys()):
+
+# 帧生产者选举与worker间分发，按现场(rdstag)记录本worker是否为生产者
+hub_state: dict[str, bool] = {}
+
+
+def hub_keys(rdstag) -> dict:
+    return {
+        "leader": f"{rdstag}:ws_hub:producer",
+        "channel": f"{rdstag}:ws_hub:frames",
+        "rates": f"{rdstag}:ws_hub:worker_rates",
+        "worker": f"{rdstag}:ws_hub:worker:",
+    }
+
+
+def hub_heartbeat(rdstag):
+    """续期当前worker的存活标记，并上报本worker需要的最高推送频率"""
+    keys = hub_keys(rdstag)
+    # 在线程中调用，先复制事件循环中可能同时修改的字典
+    rates = {rate for ws, rate in list(client_rates.items()) if client_sites.get(ws) == rdstag}
+    pipe = r.pipeline()
+    pipe.set(keys["worker"] + WORKER_ID, 1, ex=WORKER_TTL)
+    if rates:
+        pipe.hset(keys["rates"], WORKER_ID, max(rates))
+        pipe.expire(WEBSOCKET_CONNECTIONS_KEY, 60)
+    else:
+        pipe.hdel(keys["rates"], WORKER_ID)
+    pipe.execute()
+
+
+# 抢占或续期锁：不存在时设置为本worker，已是本worker时续期，比较与续期在Redis中原子执行
+HUB_LEAD_SCRIPT = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[2]) then
+    return 1
+end
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+def hub_try_lead(rdstag) -> bool:
+    """抢占/续期帧生产者锁，同一时刻只有一个worker读取Redis并生成帧"""
+    key = hub_keys(rdstag)["leader"]
+    hub_state[rdstag] = bool(r.eval(HUB_LEAD_SCRIPT, 1, key, WORKER_ID, WORKER_TTL))
+    return hub_state[rdstag]
+
+
+def hub_sweep_dead_workers(rdstag) -> float:
+    """清理已退出worker遗留的频率与连接记录，返回所有存活worker中最高的推送频率"""
+    keys = hub_keys(rdstag)
+    worker_rates = {
+        k.decode("utf-8"): float(v) for k, v in r.hgetall(keys["rates"]).items()
+    }
+    connections = {
+        cid: c
+        for cid, c in ws_get_all_connections().items()
+        if c.get("rdstag", rdstag) == rdstag
+    }
+    workers = set(worker_rates) | {
+        c.get("worker") for c in connections.values() if c.get("worker")
+    }
+    if not workers:
+        return 0
+    workers = list(workers)
+    alive = r.mget([keys["worker"] + w for w in workers])
+    dead = {w for w, a in zip(workers, alive) if not a}
+    if dead:
+        if dead & set(worker_rates):
+            r.hdel(keys["rates"], *(dead & set(worker_rates)))
+        stale_conns = [cid for cid, c in connections.items() if c.get("worker") in dead]
+        if stale_conns:
+            r.hdel(WEBSOCKET_CONNECTIONS_KEY, *stale_conns)
+        logger.info(f"清理已退出worker: {dead}, 连接记录 {len(stale_conns)} 条")
+    return max((v for w, v in worker_rates.items() if w not in dead), default=0)
+
+
+def produce_robot_frame(rdstag, state: dict) -> float:
+    """生产一帧：选举、连接统计、读取并解析全部机器人状态、计算ETA、发布
+
+    全部为同步Redis访问与CPU计算，在线程中执行，不阻塞事件循环。
+
+    Returns:
+        float: 距下一次生产的间隔(秒)
+    """
+    hub_heartbeat(rdstag)
+    now = time.monotonic()
+    if not hub_try_lead(rdstag):
+        state["last_marks"] = {}
+        return 1
+
+    # 连接统计与worker清理需访问Redis，高频推送时每秒最多刷新一次
+    conn_info = state["conn_info"]
+    if now >= conn_info["expire"]:
+        conn_info["rate"] = hub_sweep_dead_workers(rdstag)
+        conn_info["count"] = ws_get_connection_count(rdstag)
+        conn_info["detail"] = ws_detail_gen(rdstag)
+        conn_info["expire"] = now + 1
+    if not conn_info["rate"]:
+        return 1
+
+    robots = read_robot_status(rdstag)
+    important, state["last_marks"] = detect_important_changes(robots, state["last_marks"])
+    for robot_id, robot_eta in state["eta"].update(robots, state["eta_speed"]).items():
+        robots[robot_id]["eta"] = robot_eta
+    if robots:
+        message = orjson.dumps(
+            {
+                "type": "ROBOT_STATUS",
+                "timestamp": time.time(),
+                "important": important,
+                "data": robots,
+                "active_connections": conn_info["count"],
+                "active_connections_detail": conn_info["detail"],
+            }
+        )
+        r.publish(hub_keys(rdstag)["channel"], (b"1" if important else b"0") + message)
+    return 1 / conn_info["rate"]
+
+
+async def produce_robot_frames(rdstag):
+    """帧生产者：仅在持有生产者锁的worker中工作
+
+    以所有worker请求的最高频率读取一次Redis、序列化一次，
+    通过Redis pub/sub分发给全部worker；首字节标记该帧是否包含重要变化。
+    """
+    state = {
+        "eta": FleetEta(),
+        "eta_speed": cfg.get("road.default_speed") or 1000,
+        "last_marks": {},
+        "conn_info": {"expire": 0.0, "count": 0, "detail": [], "rate": 0},
+    }
+    while True:
+        try:
+            delay = await asyncio.to_thread(produce_robot_frame, rdstag, state)
+        except Exception as e:
+            logger.error(f"生成机器人状态帧时出错: {e}")
+            delay = 1
+        await asyncio.sleep(delay)
+
+
+# 本worker收到的各现场最新一帧，新连接建立时立即下发
+latest_frame: dict[str, dict] = {}
+
+
+def build_initial_frame(site: Site) -> str | None:
+    """新连接的首帧：优先使用最新分发帧，其次读取Redis，最后读取磁盘快照(stale)"""
+    frame = latest_frame.get(site.rdstag)
+    if frame and time.monotonic() - frame["time"] < 5:
+        return frame["message"]
+    robots = read_robot_status(site.rdstag)
+    snapshot = False
+    if not robots:
+        robots = site.ingest.load_snapshot().get("robots") or {}
+        snapshot = True
+    if not robots:
+        return None
+    return orjson.dumps(
+        {
+            "type": "ROBOT_STATUS",
+            "timestamp": time.time(),
+            "important": False,
+            "snapshot": snapshot,
+            "data": robots,
+            "active_connections": ws_get_connection_count(site.rdstag),
+        }
+    ).decode("utf-8")
+
+
+async def dispatch_robot_frames(rdstag):
+    """帧分发：每个worker订阅该现场的帧频道，按本地连接的频率档位推送
+
+    到期的档位推送最新一帧（期间的中间变化被合并），重要变化立即推送给所有客户端。
+    """
+    channel = hub_keys(rdstag)["channel"]
+    tier_due: dict[float, float] = {}
+    frame = latest_frame.setdefault(rdstag, {"message": None, "time": 0.0})
+    while True:
+        client = aioredis.Redis(**cfg.get("redis"))
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(channel)
+            async for item in pubsub.listen():
+                if item.get("type") != "message":
+                    continue
+                clients = [
+                    (ws, rate)
+                    for ws, rate in list(client_rates.items())
+                    if client_sites.get(ws) == rdstag
+                ]
+                if not clients:
+                    continue
+                data = item["data"]
+                important = data[:1] == b"1"
+                now = time.monotonic()
+                frame["message"] = data[1:].decode("utf-8")
+                frame["time"] = now
+                due_tiers = {
+                    rate
+                    for _, rate in clients
+                    if important or now >= tier_due.get(rate, 0)
+                }
+                if not due_tiers:
+                    continue
+                message = frame["message"]
+                for rate in due_tiers:
+                    tier_due[rate] = now + 1 / rate
+
+                for ws, rate in clients:
+                    if rate not in due_tiers:
+                        continue
                     try:
                         await ws.send_text(message)
                     except Exception:
                         conn_id = local_connections.get(ws)
                         if conn_id:
                             ws_safe_remove(ws, conn_id)
-                            del_without_error(ws)
-
+                        del_without_error(ws)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"订阅机器人状态帧时出错: {e}, 1秒后重连")
             await asyncio.sleep(1)
+        finally:
+            try:
+                await pubsub.aclose()
+                await client.aclose()
+            except Exception:
+                pass
 
-        except Exception as e:
-            logger.fatal(f"广播机器人状态时出错: {e}")
-            raise e
 
+async def broadcast_robot_status(rdstag):
+    """广播机器人状态数据到所有连接的客户端
+
+    支持 uvicorn workers > 1：每个worker都运行生产者与分发者，
+    生产者通过Redis锁选举，只有一个worker实际读取状态并生成帧。
+    """
+    await asyncio.gather(
+        produce_robot_frames(rdstag),
+        dispatch_robot_frames(rdstag),
+    )
 
-async def websocket_robot_status_endpoint(websocket: WebSocket, rdstag):
-    """机器人状态WebSocket接口"""
+
+async def websocket_robot_status_endpoint(websocket: WebSocket, site: Site, rate=None):
+    """机器人状态WebSocket接口
+
+    site: 推送的现场
+    rate: 请求的推送频率(Hz)，运行中也可发送 {"type": "set_rate", "rate": 0.2} 调整
+    """
     await websocket.accept()
-    
-    conn_id = ws_add_connection(websocket)
+
+    conn_id = ws_add_connection(websocket, site.rdstag)
+    client_rates[websocket] = ws_normalize_rate(rate)
     global last_websocket_activity
-    last_websocket_activity = datetime.now()
-    global zeromq_stopped_due_to_timeout
-    zeromq_stopped_due_to_timeout = False
+    ws_touch_activity()
+    zeromq_stopped_due_to_timeout.discard(site.rdstag)
 
     try:
-        result = rcmsapi.check_and_manage_zeromq_process(True)
+        result = await asyncio.to_thread(rcmsapi.check_and_manage_zeromq_process, True, site=site.name)
         print(f"新的WebSocket连接，当前连接数: {ws_get_connection_count()}")
         print(f"ZeroMQ进程状态: {result['message']}")
     except Exception as e:
         print(f"管理ZeroMQ进程时出错: {e}")
 
     try:
-        # robot_status = r.hgetall(f"{rdstag}:ROBOT_STATUS")
-        # robots = {}
-        # for robot_id, status_json in robot_status.items():
-        #     robot_id_str = robot_id.decode("utf-8")
-        #     try:
-        #         status = orjson.loads(status_json.decode("utf-8"))
-        #         robots[robot_id_str] = status
-        #     except orjson.JSONDecodeError:
-        #         continue
-
-        # await websocket.send_text(
-        #     orjson.dumps({"timestamp": time.time(), "data": robots}).decode("utf-8")
-        # )
+        # 首帧立即下发，不等待下一轮广播
+        first_frame = await asyncio.to_thread(build_initial_frame, site)
+        if first_frame:
+            await websocket.send_text(first_frame)
 
         while True:
             try:
                 rsv = await asyncio.wait_for(websocket.receive_text(), timeout=20)
                 if rsv == "heartbeat":
-                    last_websocket_activity = datetime.now()
+                    ws_touch_activity()
                     ws_refresh_connection(conn_id)
+                elif rsv.startswith("{"):
+                    try:
+                        msg = orjson.loads(rsv)
+                    except orjson.JSONDecodeError:
+                        continue
+                    if msg.get("type") == "set_rate":
+                        client_rates[websocket] = ws_normalize_rate(msg.get("rate"))
+                        await websocket.send_text(
+                            orjson.dumps(
+                                {"type": "rate", "rate": client_rates[websocket]}
+                            ).decode("utf-8")
+                        )
             except asyncio.TimeoutError:
                 await websocket.send_text(
                     orjson.dumps({"type": "heartbeat"}).decode("utf-8")
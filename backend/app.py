@@ -24,9 +24,10 @@ from backend.api.static_routes import (
     setup_root_route,
     setup_static_files,
 )
-from backend.api.wcsapi import wcs_web_router
+from backend.api.wcsapi import wcs_web_router, websocket_wcs_status_endpoint
 from backend.api.websocket import websocket_robot_status_endpoint
 from util.config import cfg
+from util.sites import sites
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -57,7 +58,10 @@ async def add_security_headers(request: Request, call_next):
         "style-src 'self' https: 'unsafe-inline'; "
     )
     content_type = response.headers.get("content-type", "")
-    if "javascript" in content_type or "css" in content_type or "image" in content_type:
+    if "cache-control" in response.headers:
+        # 接口已自行设置缓存策略(如地图瓦片)
+        pass
+    elif "javascript" in content_type or "css" in content_type or "image" in content_type:
         response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
     else:
         response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
@@ -65,6 +69,21 @@ async def add_security_headers(request: Request, call_next):
     return response
 
 
+@app.middleware("http")
+async def rewrite_site_path(request: Request, call_next):
+    """/api/sites/{site}/xxx 转为 /api/xxx?site={site}，各接口通过 site 参数区分现场"""
+    path = request.scope["path"]
+    if path.startswith("/api/sites/"):
+        parts = path[len("/api/sites/"):].split("/", 1)
+        if len(parts) == 2 and parts[0] and parts[1]:
+            query = request.scope.get("query_string", b"")
+            site_query = b"site=" + parts[0].encode("utf-8")
+            request.scope["path"] = "/api/" + parts[1]
+            request.scope["raw_path"] = request.scope["path"].encode("utf-8")
+            request.scope["query_string"] = query + b"&" + site_query if query else site_query
+    return await call_next(request)
+
+
 # 添加CORS中间件支持
 app.add_middleware(
     CORSMiddleware,
@@ -140,10 +159,28 @@ app.include_router(gossip_router, prefix="/api")
 
 # 设置WebSocket路由
 @app.websocket("/ws/robot-status")
-async def websocket_robot_status(websocket: WebSocket):
-    """机器人状态WebSocket接口"""
-    rdstag = cfg.get_with_reload("rcms.host").split("://")[1].replace(":", "-")
-    await websocket_robot_status_endpoint(websocket, rdstag)
+async def websocket_robot_status(
+    websocket: WebSocket, rate: float | None = None, site: str | None = None
+):
+    """机器人状态WebSocket接口, rate为请求的推送频率(Hz), site为现场名称(默认现场可省略)"""
+    try:
+        site_obj = sites.get(site)
+    except KeyError:
+        await websocket.close(code=1008, reason=f"unknown site: {site}")
+        return
+    await websocket_robot_status_endpoint(websocket, site_obj, rate)
+
+
+@app.websocket("/ws/sites/{site}/robot-status")
+async def websocket_site_robot_status(websocket: WebSocket, site: str, rate: float | None = None):
+    """指定现场的机器人状态WebSocket接口"""
+    await websocket_robot_status(websocket, rate, site)
+
+
+@app.websocket("/ws/wcs-status")
+async def websocket_wcs_status(websocket: WebSocket):
+    """WCS设备状态WebSocket接口（后台轮询，只推送变化）"""
+    await websocket_wcs_status_endpoint(websocket)
 
 
 @app.websocket("/ws/chat")
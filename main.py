@@ -32,14 +32,20 @@ def main():
     build_subparsers.add_parser("cache", help="从缓存构建模型")
 
     # build genmap
-    build_subparsers.add_parser("genmap", help="从模型生成地图图片")
+    build_genmap_parser = build_subparsers.add_parser("genmap", help="从模型生成地图图片")
+    build_genmap_parser.add_argument(
+        "-f", "--force", action="store_true", help="共享地图数据未变化时也重新生成"
+    )
     # build saveport
     build_subparsers.add_parser("saveport", help="保存bufferPort和machinePort到缓存")
 
     # build transport
-    build_subparsers.add_parser(
+    build_transport_parser = build_subparsers.add_parser(
         "transport", help="从缓存中读取bufferPort和machinePort并转换"
     )
+    build_transport_parser.add_argument(
+        "-f", "--force", action="store_true", help="端口缓存未变化时也重新转换"
+    )
 
     # ===== run 子命令组 =====
     run_parser = subparsers.add_parser("run", help="运行服务相关操作")
@@ -52,6 +58,9 @@ def main():
     run_zeromq_parser.add_argument(
         "-i", "--interval", type=float, default=None, help="更新间隔时间（秒）"
     )
+    run_zeromq_parser.add_argument(
+        "-s", "--site", default=None, help="现场名称（配置文件 [[sites]]），默认第一个现场"
+    )
 
     # run rabbitmq
     run_subparsers.add_parser("rabbitmq", help="运行RabbitMQ更新服务器")
@@ -72,10 +81,75 @@ def main():
     tools_show_robot_parser.add_argument(
         "-i", "--interval", type=float, default=None, help="更新间隔时间（秒）"
     )
+    tools_show_robot_parser.add_argument(
+        "-s", "--site", default=None, help="现场名称（配置文件 [[sites]]），默认第一个现场"
+    )
 
     # tools rk (remove key)
     tools_subparsers.add_parser("rk", help="remove key")
 
+    # tools bench
+    tools_bench_parser = tools_subparsers.add_parser("bench", help="性能压测")
+    tools_bench_subparsers = tools_bench_parser.add_subparsers(
+        dest="bench_target", help="压测目标"
+    )
+    bench_ws_parser = tools_bench_subparsers.add_parser(
+        "ws", help="压测 /ws/robot-status 广播链路"
+    )
+    bench_ws_parser.add_argument(
+        "--url",
+        default=None,
+        help="WebSocket地址，默认 ws://127.0.0.1:<web.port>/ws/robot-status",
+    )
+    bench_ws_parser.add_argument(
+        "-n", "--clients", type=int, default=100, help="并发客户端数量（默认100）"
+    )
+    bench_ws_parser.add_argument(
+        "-d", "--duration", type=float, default=30, help="压测时长秒（默认30）"
+    )
+    bench_ws_parser.add_argument(
+        "-r", "--rate", type=float, default=1.0, help="客户端请求的推送频率Hz（默认1）"
+    )
+    bench_ws_parser.add_argument(
+        "--fleet",
+        type=int,
+        default=0,
+        help="向Redis写入的合成机器人数量，0表示使用现有状态",
+    )
+    bench_ws_parser.add_argument(
+        "--fleet-hz", type=float, default=2.0, help="合成车队状态写入频率Hz（默认2）"
+    )
+    bench_ws_parser.add_argument(
+        "--ramp", type=float, default=5.0, help="客户端连接爬坡时间秒（默认5）"
+    )
+    bench_ws_parser.add_argument(
+        "--pid", type=int, nargs="*", default=None, help="统计CPU的服务进程PID"
+    )
+    bench_ws_parser.add_argument(
+        "--site",
+        default=None,
+        help="压测的现场名称（默认现场可省略），使用 --fleet 时必须指定专用的压测现场",
+    )
+
+    bench_map_parser = tools_bench_subparsers.add_parser(
+        "map", help="压测地图图片渲染（合成共享地图）"
+    )
+    bench_map_parser.add_argument(
+        "-a", "--areas", type=int, default=5000, help="合成区域数量（默认5000）"
+    )
+    bench_map_parser.add_argument(
+        "-l", "--labels", type=int, default=500, help="合成标签数量（默认500）"
+    )
+    bench_map_parser.add_argument(
+        "-w", "--width", type=int, default=1600, help="图片宽度像素（默认1600）"
+    )
+    bench_map_parser.add_argument(
+        "-s", "--supersample", type=int, default=2, help="超采样倍数（默认2）"
+    )
+    bench_map_parser.add_argument(
+        "-r", "--repeat", type=int, default=3, help="重复次数（默认3）"
+    )
+
     # tools clean
     tools_clean_parser = tools_subparsers.add_parser(
         "clean", help="清理日志文件"
@@ -187,8 +261,8 @@ def main():
             from util.rcms_api import RcmsApi
 
             rapi = RcmsApi()
-            rapi.build_from_cache()
-            rapi.genmapimage()
+            rapi.build_from_cache(lazy=True)
+            rapi.genmapimage(force=args.force)
 
         # -- build saveport --
         case ("build", "saveport"):
@@ -206,19 +280,18 @@ def main():
         case ("build", "transport"):
             from util.rcs_web_api import RcsWebApi
 
-            RcsWebApi().transport()
+            RcsWebApi().transport(force=args.force)
 
         # -- run zeromq --
         case ("run", "zeromq"):
-            from util.rcms_api import RcmsApi
+            from util.sites import sites
             from util.zeromq import Map_info_update
 
-            rapi = RcmsApi()
-            rapi.build_from_cache()
+            site = sites.get(args.site)
             if args.interval is not None:
-                Map_info_update(rapi, interval=args.interval)
+                Map_info_update(site.api, interval=args.interval, rdstag=site.rdstag)
             else:
-                Map_info_update(rapi)
+                Map_info_update(site.api, rdstag=site.rdstag)
 
         # -- run rabbitmq --
         case ("run", "rabbitmq"):
@@ -226,7 +299,7 @@ def main():
             from util.rcms_api import RcmsApi
 
             rapi = RcmsApi()
-            rapi.build_from_cache()
+            rapi.build_from_cache(lazy=True)
             run_rabbitmq_server(rapi)
 
         # -- run web --
@@ -238,11 +311,13 @@ def main():
         # -- tools show-robot --
         case ("tools", "show-robot"):
             from util.showrobot import show_robot_status
+            from util.sites import sites
 
+            site_rdstag = sites.get(args.site).rdstag
             if args.interval is not None:
-                show_robot_status(args.interval)
+                show_robot_status(args.interval, site_rdstag)
             else:
-                show_robot_status()
+                show_robot_status(site_rdstag=site_rdstag)
 
         # -- tools rk --
         case ("tools", "rk"):
@@ -250,6 +325,43 @@ def main():
 
             removekey()
 
+        # -- tools bench --
+        case ("tools", "bench"):
+            target = getattr(args, "bench_target", None)
+            if target == "ws":
+                import asyncio
+
+                from util.bench_ws import print_ws_bench_report, run_ws_bench
+
+                url = args.url or f"ws://127.0.0.1:{cfg.get('web.port')}/ws/robot-status"
+                result = asyncio.run(
+                    run_ws_bench(
+                        url,
+                        clients=args.clients,
+                        duration=args.duration,
+                        rate=args.rate,
+                        fleet=args.fleet,
+                        fleet_hz=args.fleet_hz,
+                        ramp=args.ramp,
+                        server_pids=args.pid,
+                        site=args.site,
+                    )
+                )
+                print_ws_bench_report(result)
+            elif target == "map":
+                from util.bench_map import print_map_bench_report, run_map_bench
+
+                result = run_map_bench(
+                    areas=args.areas,
+                    labels=args.labels,
+                    width=args.width,
+                    supersample=args.supersample,
+                    repeat=args.repeat,
+                )
+                print_map_bench_report(result)
+            else:
+                tools_bench_parser.print_help()
+
         # -- tools clean --
         case ("tools", "clean"):
             import os
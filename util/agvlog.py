@@ -5,11 +5,8 @@ import os
 import subprocess
 from ipaddress import ip_address
 
-from util.config import cfg
-
 # import time
 from util.logger import logger
-from util.rcs_web_api import RcsWebApi
 from util.ssh import SSHManager
 
 agv_log_dir = os.path.join(os.path.dirname(__file__), "data", "agvlog")
@@ -641,20 +638,14 @@ def print_merged_info(merged_logs):
         print(format_binary_comparison(group["pio_result_bin"], group["pio_value_bin"]))
 
 
-async def getip_from_carid(carid: str) -> str:
-    rcs_web_api = RcsWebApi(
-        username=cfg.get("rcms.username"),
-        password=cfg.get("rcms.password"),
-    )
-    async with rcs_web_api:
-        await rcs_web_api.login(rcs_web_api.username, rcs_web_api.password)
-        data = await rcs_web_api.get_agv(agvid=carid)
-        if data.get("code") == "0":
-            ip = data.get("data")[0].get("robotIp")
-            return ip
-        else:
-            logger.error(f"查找小车ip失败:{data}")
-            return None
+async def getip_from_carid(carid: str, site: str | None = None) -> str:
+    """机器人编号 -> IP，从现场的车队目录查询，不再每次登录RCS"""
+    from util.sites import sites
+
+    ip = await sites.get(site).fleet.get_ip(carid)
+    if not ip:
+        logger.error(f"查找小车ip失败: {carid}")
+    return ip
 
 
 if __name__ == "__main__":
@@ -0,0 +1,99 @@
+import json
+import random
+import statistics
+import time
+
+from util.dataparse import generate_map_image, parse_ShareMapInfo
+from util.map_raster import parse_share_map_arrays
+
+
+def fake_share_map_xml(areas: int, labels: int, seed: int = 0) -> str:
+    """生成与 sharemap2json 输出结构一致的合成共享地图XML（随机矩形库位与标签）"""
+    rng = random.Random(seed)
+    width = max(int((areas**0.5) * 3000), 10000)
+    height = width // 2
+    parts = ["<ShareMapInfo>"]
+    for _ in range(areas):
+        x, y = rng.randint(0, width), rng.randint(0, height)
+        w, h = rng.randint(800, 3000), rng.randint(800, 3000)
+        parts.append("<MapRet><Points>")
+        for px, py in ((x, y), (x + w, y), (x + w, y + h), (x, y + h)):
+            parts.append(f'<Point xpos="{px}" ypos="{py}"/>')
+        parts.append(
+            f'</Points><Area color_a="255" color_r="{rng.randint(0, 255)}" '
+            f'color_g="{rng.randint(0, 255)}" color_b="{rng.randint(0, 255)}"/></MapRet>'
+        )
+    for i in range(labels):
+        x, y = rng.randint(0, width), rng.randint(0, height)
+        parts.append(
+            f'<RetName start_x="{x}" start_y="{y}" end_x="{x + 3000}" end_y="{y + 1000}" '
+            f'size="40" font="Microsoft YaHei" font_color_a="255" font_color_r="0" '
+            f'font_color_g="0" font_color_b="0">区域 {i}</RetName>'
+        )
+    parts.append("</ShareMapInfo>")
+    return "".join(parts)
+
+
+def _timeit(func, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return {"min_ms": round(min(times), 1), "median_ms": round(statistics.median(times), 1)}
+
+
+def run_map_bench(
+    areas: int = 5000,
+    labels: int = 500,
+    width: int = 1600,
+    supersample: int = 2,
+    repeat: int = 3,
+    show_labels: bool = True,
+) -> dict:
+    """
+    地图渲染压测：对比 parse_ShareMapInfo(JSON) 路径与结构化数组路径
+
+    Returns:
+        dict: 各阶段耗时(ms)
+    """
+    xml = fake_share_map_xml(areas, labels)
+    share_map_json = parse_ShareMapInfo(xml)
+    arrays = parse_share_map_arrays(xml)
+    return {
+        "areas": areas,
+        "labels": labels,
+        "width": width,
+        "supersample": supersample,
+        "parse_json": _timeit(lambda: json.loads(parse_ShareMapInfo(xml)), repeat),
+        "parse_arrays": _timeit(lambda: parse_share_map_arrays(xml), repeat),
+        "render_json": _timeit(
+            lambda: generate_map_image(share_map_json, width, show_labels=show_labels),
+            repeat,
+        ),
+        "render_arrays": _timeit(
+            lambda: generate_map_image(arrays, width, show_labels=show_labels), repeat
+        ),
+        "render_arrays_aa": _timeit(
+            lambda: generate_map_image(
+                arrays, width, show_labels=show_labels, supersample=supersample
+            ),
+            repeat,
+        ),
+    }
+
+
+def print_map_bench_report(result: dict):
+    print(
+        f"地图渲染压测: {result['areas']} 个区域, {result['labels']} 个标签, "
+        f"宽度 {result['width']}px"
+    )
+    rows = [
+        ("parse_ShareMapInfo + json.loads", result["parse_json"]),
+        ("parse_share_map_arrays", result["parse_arrays"]),
+        ("渲染 (JSON输入)", result["render_json"]),
+        ("渲染 (结构化数组)", result["render_arrays"]),
+        (f"渲染 (结构化数组, {result['supersample']}x超采样)", result["render_arrays_aa"]),
+    ]
+    for name, t in rows:
+        print(f"  {name:<40} min {t['min_ms']:>8.1f} ms   median {t['median_ms']:>8.1f} ms")
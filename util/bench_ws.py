@@ -0,0 +1,281 @@
+import asyncio
+import logging
+import random
+import statistics
+import threading
+import time
+
+import orjson
+import websockets
+
+from util.config import r
+from util.procstat import process_cpu_seconds
+from util.sites import sites
+
+logger = logging.getLogger(__name__)
+
+# 合成车队使用的机器人编号起点，避免与真实车辆冲突，压测结束后删除
+FAKE_ROBOT_BASE = 90000
+
+
+def fake_robot_status(robot_id: str, x: int, y: int, abnormal: bool, map_code: str = "") -> dict:
+    """生成与 Robot_msg_decode.parse_robot_status 输出格式一致的状态"""
+    return {
+        "type": "ROBOT_STATUS",
+        "map_code": map_code,
+        "RobotId": robot_id,
+        "ip": "127.0.0.1",
+        "position": {"x": str(x), "y": str(y), "h": "0"},
+        "load_status": 0,
+        "direction": 0,
+        "battery": random.randint(20, 100),
+        "soh": 100,
+        "speed": random.randint(0, 1500),
+        "status": "异常" if abnormal else "任务执行中",
+        "status_code": 67 if abnormal else 2,
+        "abnormal": abnormal,
+        "alarm": {
+            "main_code": "1" if abnormal else "0",
+            "main_name": "",
+            "sub_code": "1" if abnormal else "0",
+            "sub_name": "",
+            "solution": "",
+        },
+        "stop": False,
+        "stay": False,
+        "tgt_distance": 0,
+        "remove": False,
+        "change": False,
+        "version": "bench",
+        "roller_status_code": 0,
+        "pod": {"id": None, "bind": 0},
+        "time": time.time(),
+    }
+
+
+def feed_fake_fleet(rdstag, count: int, hz: float, stop_event: threading.Event, map_code: str = ""):
+    """
+    向Redis持续写入合成车队状态（随机游走，偶尔翻转异常）
+
+    在独立线程中运行：同步的 hset 与整队JSON编码不占用测量客户端的事件循环，
+    否则会把写入耗时计入帧到达延迟。
+    """
+    key = f"{rdstag}:ROBOT_STATUS"
+    robots = {
+        str(FAKE_ROBOT_BASE + i): [random.randint(0, 100000), random.randint(0, 100000), False]
+        for i in range(count)
+    }
+    try:
+        while not stop_event.is_set():
+            started = time.monotonic()
+            mapping = {}
+            for rid, state in robots.items():
+                state[0] += random.randint(-500, 500)
+                state[1] += random.randint(-500, 500)
+                if random.random() < 0.001:
+                    state[2] = not state[2]
+                mapping[rid] = orjson.dumps(fake_robot_status(rid, *state, map_code=map_code))
+            r.hset(key, mapping=mapping)
+            stop_event.wait(max(1 / hz - (time.monotonic() - started), 0))
+    finally:
+        r.hdel(key, *robots.keys())
+        logger.info(f"已删除 {len(robots)} 台合成机器人状态")
+
+
+def find_server_pids(rdstag) -> list[int]:
+    """从WebSocket hub的worker存活标记中找出本机服务进程PID"""
+    import socket
+
+    hostname = socket.gethostname()
+    pids = []
+    for key in r.scan_iter(match=f"{rdstag}:ws_hub:worker:{hostname}:*"):
+        try:
+            pids.append(int(key.decode("utf-8").rsplit(":", 1)[1]))
+        except ValueError:
+            continue
+    return pids
+
+
+class BenchClient:
+    """单个压测客户端，行为与前端一致：收到服务端heartbeat后回复"heartbeat" """
+
+    def __init__(self, idx: int, url: str):
+        self.idx = idx
+        self.url = url
+        self.frames = 0
+        self.bytes = 0
+        self.latencies: list[float] = []
+        # 连接后的第一帧可能是服务端缓存的初始帧（最多数秒前），不计入延迟
+        self._first_frame = True
+        self.connected = False
+        # 服务端正常关闭连接(如服务重启)，不计入掉线
+        self.closed = False
+        self.dropped = False
+        self.error = ""
+
+    async def run(self, stop_event: asyncio.Event, heartbeat_interval: float):
+        try:
+            async with websockets.connect(self.url, max_size=None) as ws:
+                self.connected = True
+                last_heartbeat = time.monotonic()
+                while not stop_event.is_set():
+                    try:
+                        raw = await asyncio.wait_for(ws.recv(), timeout=0.5)
+                    except asyncio.TimeoutError:
+                        raw = None
+                    now = time.monotonic()
+                    if now - last_heartbeat >= heartbeat_interval:
+                        await ws.send("heartbeat")
+                        last_heartbeat = now
+                    if raw is None:
+                        continue
+                    self.bytes += len(raw)
+                    msg = orjson.loads(raw)
+                    if msg.get("type") == "heartbeat":
+                        await ws.send("heartbeat")
+                        continue
+                    if msg.get("type") == "ROBOT_STATUS":
+                        self.frames += 1
+                        if self._first_frame:
+                            self._first_frame = False
+                            continue
+                        self.latencies.append(time.time() - msg.get("timestamp", 0))
+        except websockets.exceptions.ConnectionClosedOK as e:
+            self.error = repr(e)
+            self.closed = True
+        except Exception as e:
+            self.error = repr(e)
+            # 已连接后异常断开视为掉线，未能建立连接也计入掉线
+            self.dropped = True
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(p / 100 * (len(values) - 1)))))
+    return values[k]
+
+
+async def run_ws_bench(
+    url: str,
+    clients: int = 100,
+    duration: float = 30,
+    rate: float = 1.0,
+    fleet: int = 0,
+    fleet_hz: float = 2.0,
+    ramp: float = 5.0,
+    heartbeat_interval: float = 10.0,
+    server_pids: list[int] | None = None,
+    site: str | None = None,
+) -> dict:
+    """
+    对 /ws/robot-status 广播链路进行压测
+
+    Args:
+        url: WebSocket地址，如 ws://127.0.0.1:8000/ws/robot-status
+        clients: 并发客户端数量
+        duration: 压测时长(秒)，从全部客户端开始连接时计时
+        rate: 每个客户端请求的推送频率(Hz)
+        fleet: 合成车队机器人数量，0表示使用Redis中已有的真实状态
+        fleet_hz: 合成车队状态写入频率
+        ramp: 客户端建立连接的爬坡时间(秒)
+        heartbeat_interval: 客户端主动发送heartbeat的间隔(秒)
+        server_pids: 统计CPU的服务进程PID，默认从hub心跳中自动发现
+        site: 压测的现场名称，默认为默认现场；使用合成车队时必须指定专用的压测现场，
+            合成状态写入该现场的Redis命名空间，不影响真实现场
+
+    Returns:
+        dict: 汇总结果
+    """
+    bench_site = sites.get(site)
+    if fleet and bench_site is sites.default:
+        raise ValueError("合成车队不能写入默认现场，请在 [[sites]] 中配置专用的压测现场并用 site 指定")
+    rdstag = bench_site.rdstag
+    sep = "&" if "?" in url else "?"
+    target = f"{url}{sep}rate={rate}"
+    if site:
+        target += f"&site={site}"
+    stop_event = asyncio.Event()
+
+    feeder = None
+    feeder_stop = threading.Event()
+    if fleet:
+        feeder = asyncio.create_task(
+            asyncio.to_thread(feed_fake_fleet, rdstag, fleet, fleet_hz, feeder_stop, bench_site.map_code)
+        )
+
+    pids = server_pids or find_server_pids(rdstag)
+    cpu_start = {pid: process_cpu_seconds(pid) for pid in pids}
+    wall_start = time.monotonic()
+
+    bench_clients = [BenchClient(i, target) for i in range(clients)]
+    tasks = []
+    for c in bench_clients:
+        tasks.append(asyncio.create_task(c.run(stop_event, heartbeat_interval)))
+        if ramp and clients:
+            await asyncio.sleep(ramp / clients)
+
+    await asyncio.sleep(max(0.0, duration - (time.monotonic() - wall_start)))
+    stop_event.set()
+    feeder_stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if feeder:
+        await feeder
+    wall = time.monotonic() - wall_start
+
+    cpu = {}
+    for pid, start in cpu_start.items():
+        end = process_cpu_seconds(pid)
+        if start is not None and end is not None:
+            cpu[pid] = round((end - start) / wall * 100, 1)
+
+    latencies = [lat * 1000 for c in bench_clients for lat in c.latencies]
+    frames = [c.frames for c in bench_clients]
+    byte_counts = [c.bytes for c in bench_clients]
+    dropped = [c for c in bench_clients if c.dropped]
+    return {
+        "url": target,
+        "clients": clients,
+        "duration_s": round(wall, 1),
+        "connected": sum(1 for c in bench_clients if c.connected),
+        "closed": sum(1 for c in bench_clients if c.closed),
+        "dropped": len(dropped),
+        "drop_errors": sorted({c.error for c in dropped})[:5],
+        "frames_total": sum(frames),
+        "frames_per_client_avg": round(statistics.mean(frames), 1) if frames else 0,
+        "frame_rate_per_client": round(statistics.mean(frames) / wall, 2) if frames else 0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 1),
+            "p90": round(percentile(latencies, 90), 1),
+            "p99": round(percentile(latencies, 99), 1),
+            "max": round(max(latencies), 1) if latencies else 0.0,
+        },
+        "bytes_per_client_avg": int(statistics.mean(byte_counts)) if byte_counts else 0,
+        "bytes_per_client_per_s": int(statistics.mean(byte_counts) / wall) if byte_counts else 0,
+        "server_cpu_percent": cpu or "n/a",
+    }
+
+
+def print_ws_bench_report(result: dict):
+    lat = result["latency_ms"]
+    print(f"URL:              {result['url']}")
+    print(
+        f"客户端:           {result['clients']} (已连接 {result['connected']}, 掉线 {result['dropped']},"
+        f" 服务端正常关闭 {result['closed']})"
+    )
+    print(f"时长:             {result['duration_s']} s")
+    print(
+        f"帧数:             总计 {result['frames_total']}, 每客户端 {result['frames_per_client_avg']}"
+        f" ({result['frame_rate_per_client']} 帧/s)"
+    )
+    print(
+        f"帧到达延迟(ms):   p50 {lat['p50']}  p90 {lat['p90']}  p99 {lat['p99']}  max {lat['max']}"
+    )
+    print(
+        f"每客户端流量:     {result['bytes_per_client_avg']} B"
+        f" ({result['bytes_per_client_per_s']} B/s)"
+    )
+    print(f"服务端CPU(%):     {result['server_cpu_percent']}")
+    for err in result["drop_errors"]:
+        print(f"  掉线原因: {err}")
@@ -0,0 +1,212 @@
+import contextlib
+import logging
+import os
+import pathlib
+import threading
+import time
+from hashlib import sha256
+
+import orjson
+
+try:
+    import fcntl
+except ImportError:  # Windows：只有进程内的锁
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# 变更记录保留条数
+FEED_SIZE = 50
+
+
+def content_hash(data: bytes) -> str:
+    return sha256(data).hexdigest()
+
+
+def atomic_write(path: pathlib.Path, data: bytes):
+    """先写临时文件再替换，读取方不会看到写了一半的文件"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+@contextlib.contextmanager
+def file_lock(path: pathlib.Path):
+    """跨进程独占锁（锁文件 path.lock），保护读-合并-写清单"""
+    with open(path.with_name(path.name + ".lock"), "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+_manifests: dict[pathlib.Path, "CacheManifest"] = {}
+_manifests_lock = threading.Lock()
+
+
+def get_manifest(cache_dir: pathlib.Path) -> "CacheManifest":
+    """同一缓存目录在进程内共用一个清单实例（RcmsApi 与 RcsWebApi 可能使用同一目录）"""
+    key = pathlib.Path(cache_dir).resolve()
+    with _manifests_lock:
+        manifest = _manifests.get(key)
+        if manifest is None:
+            manifest = _manifests[key] = CacheManifest(pathlib.Path(cache_dir))
+        return manifest
+
+
+class CacheManifest:
+    """缓存清单
+
+    记录缓存目录中每个数据集的内容哈希，只写入内容变化的文件，
+    并记录派生产物（地图图片、cmsindexmap 等）构建时所用的输入哈希，
+    输入未变化时派生产物无需重建。
+
+    manifest.json 结构：
+        datasets:  {数据集: {"file", "hash", "size", "updated_at"}}
+        artifacts: {派生产物: {"inputs": {数据集: hash}, "built_at"}}
+        feed:      [{"time", "datasets": [...]}]  最近的变更记录
+
+    本进程内通过 get_manifest 共用实例；保存时在文件锁内重新读取磁盘上的清单，
+    只合并本实例修改过的条目，不会覆盖其他进程写入的数据集。
+    """
+
+    def __init__(self, cache_dir: pathlib.Path):
+        self.cache_dir = cache_dir
+        self.path = cache_dir / "manifest.json"
+        self._lock = threading.RLock()
+        self._listeners = []
+        # 已修改但尚未保存到磁盘的条目
+        self._pending_datasets: set[str] = set()
+        self._pending_artifacts: set[str] = set()
+        self.data = self._load()
+
+    def _load(self) -> dict:
+        data = {}
+        if self.path.exists():
+            try:
+                with open(self.path, "rb") as f:
+                    data = orjson.loads(f.read())
+            except (OSError, orjson.JSONDecodeError) as e:
+                logger.warning(f"缓存清单读取失败，将重新生成: {e}")
+        data.setdefault("datasets", {})
+        data.setdefault("artifacts", {})
+        data.setdefault("feed", [])
+        return data
+
+    def _save(self):
+        atomic_write(self.path, orjson.dumps(self.data, option=orjson.OPT_INDENT_2))
+
+    def _merge_pending(self, data: dict) -> dict:
+        """把本实例尚未保存的条目合并到从磁盘读取的清单上"""
+        for name in self._pending_datasets:
+            data["datasets"][name] = self.data["datasets"][name]
+        for name in self._pending_artifacts:
+            data["artifacts"][name] = self.data["artifacts"][name]
+        return data
+
+    def _save_merged(self, feed_entry: dict | None = None):
+        """文件锁内重新读取、合并本实例的修改后保存"""
+        with self._lock, file_lock(self.path):
+            data = self._merge_pending(self._load())
+            if feed_entry:
+                data["feed"].append(feed_entry)
+                data["feed"] = data["feed"][-FEED_SIZE:]
+            self.data = data
+            self._save()
+            self._pending_datasets.clear()
+            self._pending_artifacts.clear()
+
+    def reload(self):
+        """重新读取清单（其他进程可能已更新缓存），保留本实例尚未保存的修改"""
+        with self._lock:
+            self.data = self._merge_pending(self._load())
+
+    def get_hash(self, name: str) -> str | None:
+        entry = self.data["datasets"].get(name)
+        return entry["hash"] if entry else None
+
+    def record(self, name: str, filename: str, data: bytes):
+        """登记已存在文件的哈希（早于清单生成的缓存），不写文件"""
+        self._set_dataset(name, filename, content_hash(data), len(data))
+
+    def _set_dataset(self, name: str, filename: str, digest: str, size: int):
+        with self._lock:
+            self.data["datasets"][name] = {
+                "file": filename,
+                "hash": digest,
+                "size": size,
+                "updated_at": time.time(),
+            }
+            self._pending_datasets.add(name)
+
+    def write(self, name: str, filename: str, data: bytes) -> bool:
+        """写入数据集，内容未变化且文件仍在时跳过，返回是否有变化"""
+        digest = content_hash(data)
+        file_path = self.cache_dir / filename
+        entry = self.data["datasets"].get(name)
+        if entry and entry["hash"] == digest and file_path.exists():
+            return False
+        atomic_write(file_path, data)
+        self._set_dataset(name, filename, digest, len(data))
+        return True
+
+    def write_file(self, name: str, filename: str, tmp_path: pathlib.Path, digest: str, size: int) -> bool:
+        """
+        登记流式写好的临时文件（调用方边写边计算 sha256）：
+        内容未变化时删除临时文件，否则替换正式文件，返回是否有变化
+        """
+        file_path = self.cache_dir / filename
+        entry = self.data["datasets"].get(name)
+        if entry and entry["hash"] == digest and file_path.exists():
+            tmp_path.unlink(missing_ok=True)
+            return False
+        os.replace(tmp_path, file_path)
+        self._set_dataset(name, filename, digest, size)
+        return True
+
+    def commit(self, changed: list[str]):
+        """保存清单并通知订阅者，在一批 write 之后调用一次"""
+        self._save_merged({"time": time.time(), "datasets": changed} if changed else None)
+        if changed:
+            logger.info(f"缓存已更新: {', '.join(changed)}")
+            for listener in list(self._listeners):
+                try:
+                    listener(set(changed))
+                except Exception as e:
+                    logger.error(f"缓存变更回调出错: {e}")
+
+    def subscribe(self, callback):
+        """订阅变更，callback 接收本次变化的数据集名称集合"""
+        self._listeners.append(callback)
+
+    def _input_hashes(self, inputs: list[str] | dict[str, str]) -> dict:
+        """inputs 为数据集名称列表时取清单中的哈希；为字典时直接使用给定的哈希(如内存中数据的哈希)"""
+        if isinstance(inputs, dict):
+            return dict(inputs)
+        return {name: self.get_hash(name) for name in inputs}
+
+    def needs_rebuild(
+        self, artifact: str, inputs: list[str] | dict[str, str], files: list[pathlib.Path] = ()
+    ) -> bool:
+        """派生产物的输入哈希与上次构建时不同，或产物文件缺失时需要重建"""
+        self.reload()
+        if any(not p.exists() for p in files):
+            return True
+        built = self.data["artifacts"].get(artifact)
+        if not built:
+            return True
+        return any(built["inputs"].get(name) != digest for name, digest in self._input_hashes(inputs).items())
+
+    def mark_built(self, artifact: str, inputs: list[str] | dict[str, str]):
+        """记录派生产物构建时使用的输入哈希"""
+        with self._lock:
+            self.data["artifacts"][artifact] = {
+                "inputs": self._input_hashes(inputs),
+                "built_at": time.time(),
+            }
+            self._pending_artifacts.add(artifact)
+        self._save_merged()
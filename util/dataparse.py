@@ -3,8 +3,12 @@ import logging
 import os
 import time
 import xml.etree.ElementTree as ET
+from functools import lru_cache
 
-from PIL import Image, ImageDraw, ImageFont
+import numpy as np
+from PIL import ImageDraw, ImageFont
+
+from .map_raster import map_bounds, rasterize_areas, share_map_arrays_from_dict, to_pixels
 
 logger = logging.getLogger(__name__)
 
@@ -290,6 +294,97 @@ def parse_ShareMapInfo(j):
     return json.dumps(map_data, indent=2, ensure_ascii=False)
 
 
+# 标签字体按 (字体名, 字号) 缓存，同一地图中大量标签使用相同字体
+@lru_cache(maxsize=256)
+def _label_font(font_family: str | None, size: int, default_font_family: str):
+    try:
+        # 尝试使用数据中指定的准确字体系列
+        if font_family and font_family.lower() in ["microsoft yahei", "microsoft yahei ui"]:
+            # 特殊处理Microsoft YaHei，它可能有不同的字体文件名
+            for font_file in ["msyh.ttc", "msyhbd.ttc", "msyhl.ttc", "microsoft yahei.ttf"]:
+                try:
+                    return ImageFont.truetype(font_file, size)
+                except Exception:
+                    continue
+        return ImageFont.truetype(font_family or default_font_family, size)
+    except Exception:
+        # 如果指定的字体失败，尝试默认字体系列
+        try:
+            return ImageFont.truetype(default_font_family, size)
+        except Exception:
+            # 如果所有尝试都失败，回退到系统默认字体
+            return ImageFont.load_default()
+
+
+@lru_cache(maxsize=1)
+def _default_font_family() -> str:
+    """依次尝试宋体、Arial，都不可用时为 default"""
+    for family in ("simsun.ttc", "arial.ttf"):
+        try:
+            ImageFont.truetype(family, 16)
+            return family
+        except Exception:
+            continue
+    return "default"
+
+
+def _label_font_size(text: str, base_font_size: float, font_scale, compile_scale, size_factor):
+    """适当缩放字体大小，考虑地图尺寸、缩放因子和文本长度"""
+    scaled_font_size = base_font_size * font_scale * compile_scale * size_factor
+    # 根据文本长度调整字体大小，长文本使用稍小字体
+    scaled_font_size *= max(0.7, min(1.0, 20.0 / max(len(text), 10)))
+    return scaled_font_size
+
+
+def _draw_label(draw, text: str, pixel_x: float, pixel_y: float, font, font_color):
+    """以 (pixel_x, pixel_y) 为中心绘制标签，空格处换行"""
+    # 将空格替换为换行符
+    text_lines = text.split(" ")
+
+    # 计算各行列的大小和文本总大小
+    line_metrics = []  # 存储每行的宽度、高度和边界框
+    for line in text_lines:
+        try:
+            # 使用textbbox获取精确的文本边界框
+            bbox = draw.textbbox((0, 0), line, font=font)
+            width = bbox[2] - bbox[0]
+            height = bbox[3] - bbox[1]
+            ascent = abs(bbox[1])  # 从基线到顶部的距离
+            descent = bbox[3]  # 从基线到底部的距离
+            line_metrics.append((width, height, ascent, descent, bbox))
+        except Exception:
+            # 回退计算
+            try:
+                width, height = draw.textsize(line, font=font)
+                ascent = height * 0.7  # 近似ascent
+                descent = height * 0.3  # 近似descent
+                line_metrics.append((width, height, ascent, descent, None))
+            except Exception:
+                # 完全回退
+                line_metrics.append((0, font.getsize("A")[1], 0, 0, None))
+
+    # 计算文本总尺寸
+    total_ascent = max(m[2] for m in line_metrics) if line_metrics else 0
+    total_descent = max(m[3] for m in line_metrics) if line_metrics else 0
+
+    # 计算行高和行间距
+    line_height = total_ascent + total_descent
+    line_spacing = line_height * 0.2  # 行间距为行高的20%
+    total_text_height = line_height + (len(text_lines) - 1) * (line_height + line_spacing)
+
+    # 垂直居中，考虑文本的基线位置
+    current_y = pixel_y - total_text_height // 2 + total_ascent
+
+    # 分别绘制每行，控制行间距
+    for i, (line, metrics) in enumerate(zip(text_lines, line_metrics)):
+        # 计算此行的水平居中位置，使用每行实际宽度
+        line_x = pixel_x - metrics[0] // 2
+        draw.text((line_x, current_y), line, fill=font_color, font=font)
+        # 为下一行移动位置，使用行高加行间距
+        if i < len(text_lines) - 1:
+            current_y += line_height + line_spacing
+
+
 # 从ShareMapInfo数据生成地图图像的函数
 def generate_map_image(
     share_map_json,
@@ -300,12 +395,14 @@ def generate_map_image(
     svg_filename=None,
     font_scale=0.3,
     compile_scale=1.0,
+    supersample=1,
 ):
     """
-    从提供的ShareMapInfo JSON数据生成地图图像。
+    从提供的ShareMapInfo数据生成地图图像。
 
     参数:
-        share_map_json: parse_ShareMapInfo返回的包含地图数据的JSON字符串
+        share_map_json: 地图数据，可以是 parse_ShareMapInfo 返回的JSON字符串或字典，
+            也可以是 parse_share_map_arrays 返回的结构化数组（无需JSON转换，推荐）
         desired_width: 输出图像的宽度（像素），默认1200以获得更高分辨率
         show_labels: 是否显示每个区域的文本标签
         border_padding: 地图周围的内边距，确保所有内容可见
@@ -313,47 +410,29 @@ def generate_map_image(
         svg_filename: SVG导出的文件名（export_svg为True时必填）
         font_scale: 字体大小缩放因子，用于调整文本显示大小，默认0.5
         compile_scale: 编译缩放参数，用于整体缩放地图元素，默认1.0
+        supersample: 区域多边形超采样倍数，大于1时抗锯齿，默认1
 
     返回:
         PIL.Image: 生成的地图图像
     """
-    # 解析JSON数据
-    share_map_data = json.loads(share_map_json)
-
-    # 提取所有坐标点（来自map_ret_list和ret_name_list）以确定坐标范围
-    all_points = []
-    for map_ret in share_map_data["map_ret_list"]:
-        all_points.extend(map_ret["points"])
-
-    # 添加ret_name_list中的坐标点，确保它们也在可见区域内
-    if "ret_name_list" in share_map_data:
-        for ret_name in share_map_data["ret_name_list"]:
-            all_points.append(
-                {"xpos": ret_name["start_x"], "ypos": ret_name["start_y"]}
-            )
-            all_points.append({"xpos": ret_name["end_x"], "ypos": ret_name["end_y"]})
-
-    # 计算带内边距的坐标范围
-    xs = [point["xpos"] for point in all_points]
-    ys = [point["ypos"] for point in all_points]
-    original_minX = min(xs)
-    original_maxX = max(xs)
-    original_minY = min(ys)
-    original_maxY = max(ys)
-
-    # 添加内边距以确保所有内容可见
-    padding_x = (original_maxX - original_minX) * 0.05  # 每边5%的内边距
-    padding_y = (original_maxY - original_minY) * 0.05
-    minX = original_minX - padding_x
-    maxX = original_maxX + padding_x
-    minY = original_minY - padding_y
-    maxY = original_maxY + padding_y
+    if isinstance(share_map_json, dict) and "areas" in share_map_json:
+        arrays = share_map_json
+    else:
+        share_map_data = (
+            json.loads(share_map_json) if isinstance(share_map_json, str) else share_map_json
+        )
+        arrays = share_map_arrays_from_dict(share_map_data)
+    areas, labels, texts = arrays["areas"], arrays["labels"], arrays["texts"]
+
+    # 区域与标签共同确定坐标范围，每边5%的内边距确保所有内容可见
+    bounds = map_bounds(arrays)
+    minX, maxX, minY, maxY = bounds
 
     # 计算坐标空间尺寸
     coord_width = maxX - minX
     coord_height = maxY - minY
 
-    logger.info(f"找到 {len(share_map_data['map_ret_list'])} 个地图区域")
+    logger.info(f"找到 {len(areas)} 个地图区域")
     logger.info(f"坐标范围: X({minX}, {maxX}), Y({minY}, {maxY})")
     logger.info(f"坐标空间尺寸: {coord_width} x {coord_height}")
 
@@ -365,202 +444,37 @@ def generate_map_image(
     logger.info(f"图像尺寸: {image_width} x {image_height} 像素")
     logger.info(f"缩放因子: {scale:.4f}")
 
-    # 将坐标转换为图像像素的辅助函数
-    def coord_to_pixel(coord, min_val, max_val, image_size):
-        # 将坐标归一化到[0, 1]范围
-        normalized = (coord - min_val) / (max_val - min_val)
-        # 缩放到图像尺寸
-        return int(normalized * image_size)
-
-    # 创建白色背景图像
-    image = Image.new("RGB", (image_width, image_height), color="white")
+    # 绘制所有地图区域（多边形），坐标转换一次完成
+    image = rasterize_areas(arrays, bounds, image_width, image_height, supersample)
     draw = ImageDraw.Draw(image)
 
-    # 绘制所有地图区域（多边形）
-    for map_ret in share_map_data["map_ret_list"]:
-        points = map_ret["points"]
-        area = map_ret["area"]
-
-        # 将多边形坐标转换为像素坐标
-        pixel_points = []
-        for point in points:
-            x = point["xpos"]
-            y = point["ypos"]
-            pixel_x = coord_to_pixel(x, minX, maxX, image_width - 1)
-            pixel_y = image_height - coord_to_pixel(y, minY, maxY, image_height - 1)
-            pixel_points.append((pixel_x, pixel_y))
-
-        # 从区域数据创建颜色元组
-        color = (area["color_r"], area["color_g"], area["color_b"], area["color_a"])
-
-        # 绘制指定颜色的多边形（无边框）
-        draw.polygon(pixel_points, fill=color[:3])  # 仅使用RGB值填充
+    # 标签中心点像素坐标（按整幅图像尺寸归一化）
+    label_center = np.stack(
+        ((labels["start_x"] + labels["end_x"]) / 2, (labels["start_y"] + labels["end_y"]) / 2),
+        axis=1,
+    )
+    label_px = to_pixels(label_center, bounds, image_width + 1, image_height + 1, integer=True)
+    label_px[:, 1] -= 1
+    label_color = np.stack((labels["r"], labels["g"], labels["b"]), axis=1).tolist()
+    # 基于地图整体尺寸的自适应缩放，相对于1000像素尺寸的因子
+    size_factor = min(image_width, image_height) / 1000.0
 
     # 如果show_labels为True，绘制文本标签
-    if show_labels and "ret_name_list" in share_map_data:
-        # 初始化默认字体参数
-        default_font_family = "simsun.ttc"
-        default_font_size = 16
-
-        # 尝试使用TrueType字体以获得更好的文本渲染效果
-        try:
-            # 尝试Windows系统字体
-            font = ImageFont.truetype(default_font_family, default_font_size)
-        except Exception:
-            try:
-                # 尝试另一种常用字体
-                default_font_family = "arial.ttf"
-                font = ImageFont.truetype(default_font_family, default_font_size)
-            except Exception:
-                # 回退到默认字体
-                font = ImageFont.load_default()
-                default_font_family = "default"
-
-        for ret_name in share_map_data["ret_name_list"]:
-            # 使用实际坐标点计算文本位置
-            center_x = (ret_name["start_x"] + ret_name["end_x"]) / 2
-            center_y = (ret_name["start_y"] + ret_name["end_y"]) / 2
-
-            # 转换为像素坐标
-            pixel_x = coord_to_pixel(center_x, minX, maxX, image_width)
-            pixel_y = image_height - coord_to_pixel(center_y, minY, maxY, image_height)
-
-            # 获取文本内容
-            text = ret_name["text"]
-
-            # 从ret_name数据获取字体属性
-            font_family = ret_name.get("font", default_font_family)
-
-            # 适当缩放字体大小，考虑地图尺寸和缩放因子
-            base_font_size = ret_name["size"]
-
-            # 基于地图整体尺寸的自适应缩放
-            size_factor = (
-                min(image_width, image_height) / 1000.0
-            )  # 相对于1000像素尺寸的因子
-            scaled_font_size = base_font_size * font_scale * compile_scale * size_factor
-
-            # 根据文本长度调整字体大小，长文本使用稍小字体
-            text_length_factor = max(
-                0.7, min(1.0, 20.0 / max(len(text), 10))
-            )  # 文本越长，因子越小
-            scaled_font_size *= text_length_factor
-
-            # 确保字体大小合理（不过小或过大）
-            final_font_size = max(
-                1, min(scaled_font_size, 100)
-            )  # 限制在8到32像素之间，提供更灵活的范围
-
-            # 使用正确的字体系列和大小创建字体
-            current_font = font  # 默认使用回退字体
-            try:
-                # 尝试使用数据中指定的准确字体系列
-                if font_family.lower() in ["microsoft yahei", "microsoft yahei ui"]:
-                    # 特殊处理Microsoft YaHei，它可能有不同的字体文件名
-                    possible_font_files = [
-                        "msyh.ttc",
-                        "msyhbd.ttc",
-                        "msyhl.ttc",
-                        "microsoft yahei.ttf",
-                    ]
-                    for font_file in possible_font_files:
-                        try:
-                            current_font = ImageFont.truetype(
-                                font_file, int(final_font_size)
-                            )
-                            break
-                        except Exception:
-                            continue
-                else:
-                    # 直接尝试指定的字体系列
-                    current_font = ImageFont.truetype(font_family, int(final_font_size))
-            except Exception:
-                # 如果指定的字体失败，尝试默认字体系列
-                try:
-                    current_font = ImageFont.truetype(
-                        default_font_family, int(final_font_size)
-                    )
-                except Exception:
-                    # 如果所有尝试都失败，回退到系统默认字体
-                    current_font = ImageFont.load_default()
-
-            # 将空格替换为换行符
-            text_lines = text.split(" ")
-
-            # 计算各行列的大小和文本总大小
-            line_metrics = []  # 存储每行的宽度、高度和边界框
-
-            for line in text_lines:
-                try:
-                    # 使用textbbox获取精确的文本边界框
-                    bbox = draw.textbbox((0, 0), line, font=current_font)
-                    width = bbox[2] - bbox[0]
-                    height = bbox[3] - bbox[1]
-                    ascent = abs(bbox[1])  # 从基线到顶部的距离
-                    descent = bbox[3]  # 从基线到底部的距离
-                    line_metrics.append((width, height, ascent, descent, bbox))
-                except Exception:
-                    # 回退计算
-                    try:
-                        width, height = draw.textsize(line, font=current_font)
-                        ascent = height * 0.7  # 近似ascent
-                        descent = height * 0.3  # 近似descent
-                        line_metrics.append((width, height, ascent, descent, None))
-                    except Exception:
-                        # 完全回退
-                        line_metrics.append(
-                            (0, current_font.getsize("A")[1], 0, 0, None)
-                        )
-
-            # 计算文本总尺寸
-            # line_widths = [m[0] for m in line_metrics]
-            line_ascent = [m[2] for m in line_metrics]
-            line_descent = [m[3] for m in line_metrics]
-
-            # max_line_width = max(line_widths) if line_widths else 0
-            total_ascent = max(line_ascent) if line_ascent else 0
-            total_descent = max(line_descent) if line_descent else 0
-
-            # 计算行高和行间距
-            line_height = total_ascent + total_descent
-            line_spacing = line_height * 0.2  # 行间距为行高的20%
-            total_text_height = line_height + (len(text_lines) - 1) * (
-                line_height + line_spacing
+    if show_labels and len(labels):
+        default_font_family = _default_font_family()
+        for i, (pixel_x, pixel_y) in enumerate(label_px.tolist()):
+            text = texts[i]
+            scaled_font_size = _label_font_size(
+                text, float(labels["size"][i]), font_scale, compile_scale, size_factor
             )
-
-            # 计算起始位置以居中整个文本块
-            # 水平居中
-            # start_x = pixel_x - max_line_width // 2
-
-            # 垂直居中，考虑文本的基线位置
-            start_y = pixel_y - total_text_height // 2 + total_ascent
-
-            # 分别绘制每行，控制行间距
-            current_y = start_y
-            font_color = (
-                ret_name["font_color_r"],
-                ret_name["font_color_g"],
-                ret_name["font_color_b"],
+            # 确保字体大小合理（不过小或过大）
+            final_font_size = max(1, min(scaled_font_size, 100))
+            font = _label_font(
+                arrays["fonts"][i] or default_font_family,
+                int(final_font_size),
+                default_font_family,
             )
-
-            for i, (line, metrics) in enumerate(zip(text_lines, line_metrics)):
-                line_width, _, _, _, _ = metrics
-
-                # 计算此行的水平居中位置，使用每行实际宽度
-                line_x = pixel_x - line_width // 2
-
-                # 绘制文本行
-                draw.text((line_x, current_y), line, fill=font_color, font=current_font)
-
-                # 为下一行移动位置，使用行高加行间距
-                if i < len(text_lines) - 1:
-                    current_y += line_height + line_spacing
-
-            # 可选：绘制背景以提高文本可见性
-            # text_bbox = draw.textbbox((0, 0), text, font=font)[2:]
-            # draw.rectangle((pixel_x, pixel_y, pixel_x + text_bbox[0], pixel_y + text_bbox[1]),
-            #                fill="white", outline="white")
-            # draw.text((pixel_x, pixel_y), text, fill=font_color, font=font)
+            _draw_label(draw, text, pixel_x, pixel_y, font, tuple(label_color[i]))
 
     # 如果需要，导出为SVG格式
     if export_svg:
@@ -577,70 +491,32 @@ def generate_map_image(
         ]
         svg_content.append('  <rect width="100%" height="100%" fill="white"/>')
 
-        # 向SVG添加多边形
-        for map_ret in share_map_data["map_ret_list"]:
-            points = map_ret["points"]
-            area = map_ret["area"]
-
-            # 将多边形坐标转换为SVG坐标
-            svg_points = []
-            for point in points:
-                x = point["xpos"]
-                y = point["ypos"]
-                pixel_x = coord_to_pixel(x, minX, maxX, image_width - 1)
-                pixel_y = image_height - coord_to_pixel(y, minY, maxY, image_height - 1)
-                svg_points.append(f"{pixel_x},{pixel_y}")
-
-            # 从区域数据创建颜色
-            color = (area["color_r"], area["color_g"], area["color_b"])
-            color_hex = "#{:02x}{:02x}{:02x}".format(*color)
-
-            # 向SVG添加多边形
-            svg_content.append(
-                f'  <polygon points="{" ".join(svg_points)}" fill="{color_hex}"/>'
-            )
+        # 向SVG添加多边形，顶点坐标一次转换
+        pixels = to_pixels(
+            arrays["points"], bounds, image_width, image_height, integer=True
+        ).tolist()
+        for area in areas.tolist():
+            start, count, r, g, b = area[:5]
+            svg_points = " ".join(f"{x},{y}" for x, y in pixels[start : start + count])
+            color_hex = "#{:02x}{:02x}{:02x}".format(r, g, b)
+            svg_content.append(f'  <polygon points="{svg_points}" fill="{color_hex}"/>')
 
         # 向SVG添加文本标签
-        if show_labels and "ret_name_list" in share_map_data:
-            for ret_name in share_map_data["ret_name_list"]:
-                # 计算文本位置
-                center_x = (ret_name["start_x"] + ret_name["end_x"]) / 2
-                center_y = (ret_name["start_y"] + ret_name["end_y"]) / 2
-
-                # 转换为SVG坐标
-                pixel_x = coord_to_pixel(center_x, minX, maxX, image_width)
-                pixel_y = image_height - coord_to_pixel(
-                    center_y, minY, maxY, image_height
-                )
-
+        if show_labels and len(labels):
+            for i, (pixel_x, pixel_y) in enumerate(label_px.tolist()):
                 # 获取文本内容
-                text = ret_name["text"]
-
-                # 获取字体颜色
-                font_color = (
-                    ret_name["font_color_r"],
-                    ret_name["font_color_g"],
-                    ret_name["font_color_b"],
-                )
-                font_color_hex = "#{:02x}{:02x}{:02x}".format(*font_color)
+                text = texts[i]
+                font_color_hex = "#{:02x}{:02x}{:02x}".format(*label_color[i])
 
                 # 将空格替换为换行符
                 text_to_draw = text.replace(" ", "\n")
 
-                # 向SVG添加文本，使用正确的字体系列和缩放大小
-                font_family = ret_name.get("font", "Microsoft YaHei, Arial")
-                base_font_size = ret_name["size"]
-
-                # 使用与PNG相同的缩放逻辑
-                size_factor = min(image_width, image_height) / 1000.0
-                scaled_font_size = (
-                    base_font_size * font_scale * compile_scale * size_factor
+                # 向SVG添加文本，使用与PNG相同的缩放逻辑
+                font_family = arrays["fonts"][i] or "Microsoft YaHei, Arial"
+                scaled_font_size = _label_font_size(
+                    text, float(labels["size"][i]), font_scale, compile_scale, size_factor
                 )
 
-                # 根据文本长度调整字体大小
-                text_length_factor = max(0.7, min(1.0, 20.0 / max(len(text), 10)))
-                scaled_font_size *= text_length_factor
-
                 # 确保字体大小合理
                 font_size = max(8, min(scaled_font_size, 32))
 
@@ -648,10 +524,8 @@ def generate_map_image(
                 svg_text = f'  <text x="{pixel_x}" y="{pixel_y}" text-anchor="middle" font-family="{font_family}, Arial" font-size="{font_size}" fill="{font_color_hex}" line-height="1.0">'
 
                 # 为每行添加tspan元素，使用合适的行间距
-                for i, line in enumerate(text_to_draw.split("\n")):
-                    dy = (
-                        f"{i * font_size * 0.7}" if i > 0 else "0"
-                    )  # 行间距为字体大小的70%
+                for j, line in enumerate(text_to_draw.split("\n")):
+                    dy = f"{j * font_size * 0.7}" if j > 0 else "0"  # 行间距为字体大小的70%
                     svg_text += f'<tspan x="{pixel_x}" dy="{dy}">{line}</tspan>'
 
                 svg_text += "</text>"
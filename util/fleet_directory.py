@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import time
+
+import orjson
+
+from util.config import cfg, r
+
+logger = logging.getLogger(__name__)
+
+# findAllAgv 返回 {"code": "0", "data": [...]}，每行字段与 getAgvStatus 相同
+CODE_KEY = "robotCode"
+IP_KEY = "robotIp"
+TYPE_KEY = "robotType"
+FIRMWARE_KEY = "softVersion"
+# 刷新失败后，查询时至少间隔这么久(秒)才再次尝试完整刷新，期间只单独查询
+RETRY_INTERVAL = 30
+
+
+def _field(row: dict, key: str) -> str:
+    value = row.get(key)
+    return "" if value is None else str(value)
+
+
+class FleetDirectory:
+    """车队目录：机器人编号 -> IP/车型/固件版本
+
+    用 findAllAgv 一次读取全部机器人，后台定时刷新，查询为字典O(1)；
+    刷新时与Redis中实时 ROBOT_STATUS 的 ip 字段核对，两者不一致时以实时上报为准。
+    目录中没有的编号才会单独调用 getAgvStatus 查询。
+    """
+
+    def __init__(self, web, rdstag: str, refresh_interval: float | None = None):
+        """
+        Args:
+            web: 现场的 RcsWebApi（长连接会话）
+            rdstag: 现场的Redis键前缀
+            refresh_interval: 后台刷新间隔(秒)，默认 rcms.fleet_refresh_interval
+        """
+        self.web = web
+        self.rdstag = rdstag
+        self.refresh_interval = refresh_interval or cfg.get("rcms.fleet_refresh_interval") or 300
+        self._entries: dict[str, dict] = {}
+        self._by_ip: dict[str, str] = {}
+        self._mismatch: dict[str, dict] = {}
+        self._refreshing: asyncio.Future | None = None
+        self._task: asyncio.Task | None = None
+        self.loaded_at = 0.0
+        self.failed_at = 0.0
+        self.stats = {"refreshes": 0, "errors": 0, "hits": 0, "misses": 0, "single_queries": 0}
+
+    def _live_ips(self) -> dict[str, str]:
+        """Redis中实时 ROBOT_STATUS 的 RobotId -> ip"""
+        live = {}
+        try:
+            for robot_id, status_json in r.hgetall(f"{self.rdstag}:ROBOT_STATUS").items():
+                ip = orjson.loads(status_json).get("ip")
+                if ip:
+                    live[robot_id.decode() if isinstance(robot_id, bytes) else str(robot_id)] = ip
+        except Exception as e:
+            logger.debug(f"读取实时机器人IP失败: {e}")
+        return live
+
+    def _live_ip(self, code: str) -> str | None:
+        try:
+            status_json = r.hget(f"{self.rdstag}:ROBOT_STATUS", code)
+        except Exception:
+            return None
+        if not status_json:
+            return None
+        return orjson.loads(status_json).get("ip") or None
+
+    async def _load(self) -> int:
+        d = await self.web.findAllAgv()
+        if not isinstance(d, dict):
+            raise Exception(f"findAllAgv 返回格式错误: {d!r}")
+        rows = d.get("data")
+        if d.get("_error") or not isinstance(rows, list):
+            raise Exception(f"findAllAgv 失败: {d.get('msg', d.get('message', d))}")
+
+        now = time.time()
+        entries = {}
+        for row in rows:
+            if not isinstance(row, dict):
+                continue
+            code = _field(row, CODE_KEY)
+            if not code:
+                continue
+            entries[code] = {
+                "code": code,
+                "ip": _field(row, IP_KEY),
+                "type": _field(row, TYPE_KEY),
+                "firmware": _field(row, FIRMWARE_KEY),
+                "source": "rcs",
+                "updated_at": now,
+            }
+
+        # 与实时上报核对：RCS配置的IP与小车实际上报不一致时以实时为准
+        mismatch = {}
+        for code, ip in (await asyncio.to_thread(self._live_ips)).items():
+            entry = entries.get(code)
+            if entry is None:
+                entries[code] = {
+                    "code": code, "ip": ip, "type": "", "firmware": "",
+                    "source": "live", "updated_at": now,
+                }
+            elif entry["ip"] != ip:
+                mismatch[code] = {"rcs": entry["ip"], "live": ip}
+                entry["ip"] = ip
+                entry["source"] = "live"
+        for code, item in mismatch.items():
+            if self._mismatch.get(code) != item:
+                logger.warning(f"机器人{code} RCS登记IP {item['rcs']} 与实时上报IP {item['live']} 不一致")
+
+        self._entries = entries
+        self._by_ip = {e["ip"]: code for code, e in entries.items() if e["ip"]}
+        self._mismatch = mismatch
+        self.loaded_at = now
+        self.stats["refreshes"] += 1
+        return len(entries)
+
+    async def refresh(self) -> int:
+        """重新读取车队目录，并发调用只读取一次"""
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.ensure_future(self._load())
+        try:
+            return await asyncio.shield(self._refreshing)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed_at = time.time()
+            self.stats["errors"] += 1
+            logger.error(f"刷新车队目录失败: {e}")
+            return 0
+
+    async def get(self, code: str) -> dict | None:
+        """按机器人编号查询，目录未加载时先加载(刷新失败后 RETRY_INTERVAL 内不重试)，目录中没有时单独查询该机器人"""
+        code = str(code)
+        if not self.loaded_at and time.time() - self.failed_at >= RETRY_INTERVAL:
+            await self.refresh()
+        entry = self._entries.get(code)
+        if entry is not None:
+            self.stats["hits"] += 1
+            return entry
+        self.stats["misses"] += 1
+
+        # 新上线的车可能还不在目录中
+        ip = await asyncio.to_thread(self._live_ip, code)
+        source = "live"
+        if not ip:
+            self.stats["single_queries"] += 1
+            data = await self.web.get_agv(agvid=code)
+            rows = data.get("data") if isinstance(data, dict) and data.get("code") == "0" else None
+            ip = rows[0].get(IP_KEY) if rows and isinstance(rows[0], dict) else None
+            source = "rcs"
+        if not ip:
+            return None
+        entry = {"code": code, "ip": ip, "type": "", "firmware": "", "source": source, "updated_at": time.time()}
+        self._entries[code] = entry
+        self._by_ip[ip] = code
+        return entry
+
+    async def get_ip(self, code: str) -> str | None:
+        entry = await self.get(code)
+        return entry["ip"] if entry else None
+
+    def code_of(self, ip: str) -> str | None:
+        """IP -> 机器人编号（仅查已加载的目录）"""
+        return self._by_ip.get(ip)
+
+    def entries(self) -> list[dict]:
+        return list(self._entries.values())
+
+    async def _refresh_loop(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        """启动后台定时刷新"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+            self._task.set_name(f"fleet-directory:{self.rdstag}")
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def info(self) -> dict:
+        return {
+            "robots": len(self._entries),
+            "loaded_at": self.loaded_at,
+            "failed_at": self.failed_at,
+            "age": round(time.time() - self.loaded_at, 1) if self.loaded_at else None,
+            "refresh_interval": self.refresh_interval,
+            "running": self._task is not None and not self._task.done(),
+            "mismatch": self._mismatch,
+            "stats": dict(self.stats),
+        }
@@ -0,0 +1,307 @@
+import io
+import logging
+import math
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from .cache_manifest import atomic_write
+
+logger = logging.getLogger(__name__)
+
+# occupancy: ROBOT_STATUS 机器人停留时间；block: BLOCK_CELL/TRP_BLOCK_CELL 封锁时间
+LAYERS = ("occupancy", "block")
+# 两条消息间隔超过该值(秒)时按该值计，避免断线后第一条消息权重过大
+MAX_DT = 5.0
+# 衰减指数超过该值时把缩放折算进数组，防止溢出（摊销后仍为每条消息O(1)）
+RENORM_EXPONENT = 30.0
+# 封锁消息中点位编码可能使用的字段
+CELL_CODE_KEYS = ("@code", "@Code", "@cellCode", "@CellCode", "@mapDataCode", "code", "cellCode")
+
+
+def _heat_lut() -> np.ndarray:
+    """热力图调色板 (256, 4)：透明 -> 蓝 -> 青 -> 黄 -> 红，透明度随数值增加"""
+    stops = np.asarray([0.0, 0.25, 0.5, 0.75, 1.0])
+    colors = np.asarray(
+        [
+            (0, 0, 255, 0),
+            (0, 128, 255, 140),
+            (0, 255, 128, 170),
+            (255, 255, 0, 200),
+            (255, 0, 0, 230),
+        ],
+        dtype=np.float64,
+    )
+    t = np.linspace(0.0, 1.0, 256)
+    lut = np.stack([np.interp(t, stops, colors[:, c]) for c in range(4)], axis=1)
+    return lut.astype(np.uint8)
+
+
+HEAT_LUT = _heat_lut()
+
+
+def block_points(content, resolve=None) -> np.ndarray:
+    """
+    BLOCK_CELL/TRP_BLOCK_CELL 消息中的封锁点位 -> (n, 2) 坐标数组
+
+    带x/y属性的节点直接取坐标，只有点位编码的节点用 resolve(code) 解析
+    """
+    coords = []
+    stack = [content]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+            continue
+        if not isinstance(node, dict):
+            continue
+        x, y = node.get("@x", node.get("x")), node.get("@y", node.get("y"))
+        if x is not None and y is not None:
+            try:
+                coords.append((float(x), float(y)))
+                continue
+            except (TypeError, ValueError):
+                pass
+        code = next((node[k] for k in CELL_CODE_KEYS if node.get(k)), None)
+        if code is not None and resolve is not None:
+            cell = resolve(str(code))
+            if cell:
+                coords.append((cell["x"], cell["y"]))
+                continue
+        stack.extend(v for v in node.values() if isinstance(v, (dict, list)))
+    return np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+
+
+class FleetHeatmap:
+    """车队占用/拥堵热力图累加器
+
+    网格与共享地图范围(map_bounds)对齐，每个格子 cell_size(mm)。
+    每条消息只更新对应格子：
+    - decayed: 指数衰减累计（半衰期 half_life 秒），衰减通过全局缩放因子延迟计算
+    - hourly: 按本地时间小时(0-23)分别累计，不衰减
+    数值单位为秒：机器人在格子内的停留时间 / 格子被封锁的时间。
+    """
+
+    def __init__(self, bounds, cell_size: float = 1000.0, half_life: float = 1800.0, resolve=None):
+        """
+        Args:
+            bounds: 地图坐标范围 (min_x, max_x, min_y, max_y)，见 map_bounds
+            cell_size: 格子边长(mm)
+            half_life: decayed 累计的半衰期(秒)
+            resolve: 点位编码 -> {"x", "y"} 的解析函数，用于只带编码的封锁消息
+        """
+        self.bounds = tuple(float(v) for v in bounds)
+        self.cell_size = float(cell_size)
+        self.half_life = float(half_life)
+        self.resolve = resolve
+        min_x, max_x, min_y, max_y = self.bounds
+        self.nx = max(int(math.ceil((max_x - min_x) / self.cell_size)), 1)
+        self.ny = max(int(math.ceil((max_y - min_y) / self.cell_size)), 1)
+        self._rate = math.log(2) / self.half_life
+        self._lock = threading.Lock()
+        self._loaded_mtime = 0.0
+        self.reset()
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.ny, self.nx
+
+    def reset(self):
+        with self._lock:
+            # decayed 中保存的是放大后的值，实际值 = decayed * exp(-rate * (now - t_ref))
+            self.decayed = np.zeros((len(LAYERS), self.ny, self.nx), dtype=np.float64)
+            self.hourly = np.zeros((24, len(LAYERS), self.ny, self.nx), dtype=np.float32)
+            self.t_ref = time.time()
+            self._last_seen: dict[str, float] = {}
+            self.stats = {"messages": 0, "samples": 0, "outside": 0, "since": self.t_ref}
+
+    def _cell(self, x: float, y: float):
+        min_x, _, min_y, _ = self.bounds
+        ix = int((x - min_x) // self.cell_size)
+        iy = int((y - min_y) // self.cell_size)
+        if 0 <= ix < self.nx and 0 <= iy < self.ny:
+            return iy, ix
+        return None
+
+    def _weight(self, source: str, now: float) -> float:
+        """距同一来源上一条消息的时间，作为本次样本的权重(秒)"""
+        last = self._last_seen.get(source)
+        self._last_seen[source] = now
+        if last is None:
+            return 0.0
+        return min(max(now - last, 0.0), MAX_DT)
+
+    def _add(self, layer: int, cells, dt: float, now: float):
+        exponent = self._rate * (now - self.t_ref)
+        if exponent > RENORM_EXPONENT:
+            self.decayed *= math.exp(-exponent)
+            self.t_ref = now
+            exponent = 0.0
+        boost = dt * math.exp(exponent)
+        hour = time.localtime(now).tm_hour
+        for iy, ix in cells:
+            self.decayed[layer, iy, ix] += boost
+            self.hourly[hour, layer, iy, ix] += dt
+        self.stats["samples"] += len(cells)
+
+    def add_position(self, robot_id: str, x: float, y: float, now: float | None = None):
+        """累加一条机器人位置"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self.stats["messages"] += 1
+            dt = self._weight(f"robot:{robot_id}", now)
+            cell = self._cell(x, y)
+            if cell is None:
+                self.stats["outside"] += 1
+            elif dt:
+                self._add(0, (cell,), dt, now)
+
+    def add_blocks(self, source: str, points: np.ndarray, now: float | None = None):
+        """累加一条封锁消息中的所有封锁点位"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self.stats["messages"] += 1
+            dt = self._weight(f"block:{source}", now)
+            if not dt or not len(points):
+                return
+            cells = {c for c in map(self._cell, points[:, 0].tolist(), points[:, 1].tolist()) if c}
+            self.stats["outside"] += len(points) - len(cells)
+            self._add(1, cells, dt, now)
+
+    def handle(self, msg_type: str, content: dict, now: float | None = None):
+        """ZeroMQ消息入口，只处理 ROBOT_STATUS/BLOCK_CELL/TRP_BLOCK_CELL"""
+        if msg_type == "ROBOT_STATUS":
+            pos = content.get("position") or {}
+            try:
+                x, y = float(pos.get("x")), float(pos.get("y"))
+            except (TypeError, ValueError):
+                return
+            self.add_position(str(content.get("RobotId", "-1")), x, y, now)
+        elif msg_type == "BLOCK_CELL":
+            self.add_blocks("global", block_points(content, self.resolve), now)
+        elif msg_type == "TRP_BLOCK_CELL":
+            rid = content.get("RobotId", "-1")
+            self.add_blocks(f"robot:{rid}", block_points(content, self.resolve), now)
+
+    def grid(self, layer: str = "occupancy", mode: str = "decayed", hour: int | None = None) -> np.ndarray:
+        """
+        取累计网格 (ny, nx)，行号对应 y 从小到大
+
+        Args:
+            layer: occupancy 或 block
+            mode: decayed 衰减累计 / total 全部小时之和 / hour 指定小时
+            hour: mode=hour 时的小时(0-23)
+        """
+        li = LAYERS.index(layer)
+        with self._lock:
+            if mode == "decayed":
+                scale = math.exp(-self._rate * (time.time() - self.t_ref))
+                return (self.decayed[li] * scale).astype(np.float32)
+            if mode == "hour":
+                return self.hourly[int(hour) % 24, li].copy()
+            return self.hourly[:, li].sum(axis=0)
+
+    def hotspots(self, grid: np.ndarray, top: int = 10) -> list[dict]:
+        """数值最大的格子及其中心坐标"""
+        flat = grid.ravel()
+        top = min(top, int(np.count_nonzero(flat)))
+        if top <= 0:
+            return []
+        idx = np.argpartition(flat, -top)[-top:]
+        idx = idx[np.argsort(flat[idx])[::-1]]
+        min_x, _, min_y, _ = self.bounds
+        result = []
+        for i in idx.tolist():
+            iy, ix = divmod(i, self.nx)
+            result.append(
+                {
+                    "ix": ix,
+                    "iy": iy,
+                    "x": min_x + (ix + 0.5) * self.cell_size,
+                    "y": min_y + (iy + 0.5) * self.cell_size,
+                    "value": round(float(flat[i]), 2),
+                }
+            )
+        return result
+
+    def render(self, grid: np.ndarray, width: int, height: int, gamma: float = 0.5) -> Image.Image:
+        """
+        按地图图片的像素映射(与 to_pixels 相同)把网格渲染为RGBA叠加层
+
+        Args:
+            gamma: 数值归一化后的幂次，小于1时突出低值区域
+        """
+        min_x, max_x, min_y, max_y = self.bounds
+        # 每列/每行像素中心对应的格子号，行号翻转(图片y轴向下)
+        xs = min_x + np.arange(width) * ((max_x - min_x) / max(width - 1, 1))
+        ys = min_y + (height - np.arange(height)) * ((max_y - min_y) / max(height - 1, 1))
+        ix = np.clip(((xs - min_x) // self.cell_size).astype(np.int64), 0, self.nx - 1)
+        iy = np.clip(((ys - min_y) // self.cell_size).astype(np.int64), 0, self.ny - 1)
+        peak = float(grid.max()) if grid.size else 0.0
+        if peak <= 0:
+            return Image.new("RGBA", (width, height), (0, 0, 0, 0))
+        level = (np.power(grid / peak, gamma) * 255).astype(np.uint8)
+        return Image.fromarray(HEAT_LUT[level[np.ix_(iy, ix)]], mode="RGBA")
+
+    def to_bytes(self) -> bytes:
+        with self._lock:
+            buf = io.BytesIO()
+            np.savez_compressed(
+                buf,
+                bounds=np.asarray(self.bounds),
+                cell_size=self.cell_size,
+                decayed=self.decayed,
+                hourly=self.hourly,
+                t_ref=self.t_ref,
+                since=self.stats["since"],
+            )
+            return buf.getvalue()
+
+    def save(self, path) -> None:
+        atomic_write(path, self.to_bytes())
+
+    def load(self, path) -> bool:
+        """从 save 保存的文件恢复累计数据，网格范围不一致(地图已变化)时忽略"""
+        try:
+            with np.load(path) as data:
+                if (
+                    tuple(data["bounds"].tolist()) != self.bounds
+                    or float(data["cell_size"]) != self.cell_size
+                    or data["decayed"].shape != self.decayed.shape
+                ):
+                    logger.info("热力图网格与当前地图不一致，忽略已保存的数据")
+                    return False
+                with self._lock:
+                    self.decayed = data["decayed"]
+                    self.hourly = data["hourly"]
+                    self.t_ref = float(data["t_ref"])
+                    self.stats["since"] = float(data["since"])
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning(f"读取热力图数据失败: {e}")
+            return False
+        return True
+
+    def sync(self, path) -> bool:
+        """接入服务在其他进程运行时，文件有更新则重新读取"""
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime <= self._loaded_mtime:
+            return False
+        self._loaded_mtime = mtime
+        return self.load(path)
+
+    def info(self) -> dict:
+        return {
+            "layers": list(LAYERS),
+            "bounds": self.bounds,
+            "cell_size": self.cell_size,
+            "shape": list(self.shape),
+            "half_life": self.half_life,
+            "stats": dict(self.stats),
+        }
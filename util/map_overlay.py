@@ -0,0 +1,276 @@
+import io
+import logging
+import math
+import pathlib
+import threading
+import time
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from .map_raster import to_pixels
+from .map_tiles import load_font
+from .road_graph import path_points
+
+logger = logging.getLogger(__name__)
+
+ROBOT_IMG_PATH = pathlib.Path(__file__).parent / "data" / "robot_img"
+# 图标旋转角度按该步长取整，每个角度的图标只生成一次
+ANGLE_STEP = 10
+PATH_COLOR = (33, 150, 243)
+LABEL_COLOR = (0, 0, 0)
+# 载货指示相对机器人中心的偏移，与前端地图一致
+LOAD_OFFSETS = ((-10, 10), (-10, -10), (10, 10), (10, -10))
+
+
+def robot_icon_name(status: dict) -> str:
+    """按机器人状态选择 robot_img 下的图标"""
+    alarm = status.get("alarm") or {}
+    if status.get("stale"):
+        return "offline"
+    if status.get("remove"):
+        return "exclude"
+    if alarm.get("main_code") not in ("", "0", None):
+        return "alarm"
+    if status.get("abnormal"):
+        return "abnormal_status"
+    if status.get("stop"):
+        return "stop"
+    if "充电" in str(status.get("status") or ""):
+        return "charging"
+    return "online"
+
+
+@lru_cache(maxsize=32)
+def _icon(name: str, size: int) -> Image.Image:
+    path = ROBOT_IMG_PATH / f"{name}.png"
+    if not path.exists():
+        path = ROBOT_IMG_PATH / "online.png"
+    with Image.open(path) as im:
+        return im.convert("RGBA").resize((size, size), Image.LANCZOS)
+
+
+@lru_cache(maxsize=1024)
+def robot_sprite(name: str, size: int, angle: int) -> Image.Image:
+    """预缩放、预旋转的机器人图标"""
+    icon = _icon(name, size)
+    if not angle:
+        return icon
+    return icon.rotate(-angle, resample=Image.BICUBIC, expand=True)
+
+
+def _union(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def _intersects(a, b) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+class FleetOverlay:
+    """机器人实时叠加图
+
+    在地图底图上合成机器人图标、载货标记、编号和可选的路径线。
+    每帧只恢复并重绘位置或状态变化的机器人所在区域，编码结果在机器人状态
+    未变化时直接复用，多个MJPEG客户端共享同一实例。
+    """
+
+    def __init__(
+        self,
+        base: Image.Image,
+        bounds,
+        version: str,
+        icon_size: int = 30,
+        show_paths: bool = True,
+    ):
+        """
+        Args:
+            base: 底图（genmapimage 生成的地图图片）
+            bounds: 底图对应的地图坐标范围 (min_x, max_x, min_y, max_y)，见 map_bounds
+            version: 共享地图内容哈希，地图变化后需要重建叠加图
+            icon_size: 机器人图标边长(像素)
+            show_paths: 是否绘制机器人路径
+        """
+        self.base = base.convert("RGB")
+        self.bounds = bounds
+        self.version = version
+        self.icon_size = icon_size
+        self.show_paths = show_paths
+        self.frame = self.base.copy()
+        self.font = load_font(12)
+        # 每个机器人上一帧的绘制参数与占用区域 {RobotId: (绘制参数, 区域)}
+        self.drawn: dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._encoded: dict[str, bytes] = {}
+        self._refreshed = 0.0
+        self.stats = {"frames": 0, "dirty_frames": 0, "dirty_pixels": 0}
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.base.size
+
+    def _layout(self, status: dict):
+        """计算机器人的绘制参数与占用区域，无有效坐标时返回None"""
+        pos = status.get("position") or {}
+        try:
+            xy = np.asarray([[float(pos.get("x")), float(pos.get("y"))]])
+        except (TypeError, ValueError):
+            return None
+        width, height = self.size
+        x, y = to_pixels(xy, self.bounds, width, height)[0].tolist()
+        try:
+            angle = round(float(status.get("direction") or 0) / ANGLE_STEP) * ANGLE_STEP % 360
+        except (TypeError, ValueError):
+            angle = 0
+        icon = robot_icon_name(status)
+        # 滚筒状态码末4位为四个载货位
+        roller = str(status.get("roller_status_code") or "")
+        loads = tuple(d == "1" for d in roller[-4:].rjust(4, "0")) if roller else ()
+        path = ()
+        if self.show_paths:
+            points = path_points(status.get("paths"))
+            if len(points):
+                pixels = to_pixels(points, self.bounds, width, height)
+                path = tuple(map(tuple, np.round(pixels).astype(int).tolist()))
+        x, y = round(x), round(y)
+        params = (x, y, icon, angle, loads, str(status.get("RobotId", "")), path)
+        sprite = robot_sprite(icon, self.icon_size, angle)
+        # 图标 + 下方编号文字
+        half_w = max(sprite.width // 2 + 1, 40)
+        box = (x - half_w, y - sprite.height // 2 - 1, x + half_w, y + self.icon_size // 2 + 30)
+        if path:
+            xs = [p[0] for p in path]
+            ys = [p[1] for p in path]
+            box = _union(
+                box,
+                (
+                    math.floor(min(xs)) - 4,
+                    math.floor(min(ys)) - 4,
+                    math.ceil(max(xs)) + 4,
+                    math.ceil(max(ys)) + 4,
+                ),
+            )
+        box = (max(box[0], 0), max(box[1], 0), min(box[2], width), min(box[3], height))
+        return params, box
+
+    @staticmethod
+    def _draw_path(draw: ImageDraw.ImageDraw, params, ox: int = 0, oy: int = 0):
+        x, y, *_, path = params
+        if path:
+            path = [(px - ox, py - oy) for px, py in path]
+            draw.line([(x - ox, y - oy), *path], fill=PATH_COLOR, width=2)
+            end_x, end_y = path[-1]
+            draw.ellipse((end_x - 3, end_y - 3, end_x + 3, end_y + 3), fill=PATH_COLOR)
+
+    def _draw_robot(self, image: Image.Image, draw: ImageDraw.ImageDraw, params, ox: int = 0, oy: int = 0):
+        x, y, icon, angle, loads, robot_id, _ = params
+        x, y = x - ox, y - oy
+        sprite = robot_sprite(icon, self.icon_size, angle)
+        image.paste(sprite, (x - sprite.width // 2, y - sprite.height // 2), sprite)
+        if loads:
+            full = _icon("full", 6)
+            for (dx, dy), loaded in zip(LOAD_OFFSETS, loads):
+                if loaded:
+                    image.paste(full, (x + dx - 3, y + dy - 3), full)
+        draw.text(
+            (x, y + self.icon_size // 2 + 10),
+            robot_id,
+            fill=LABEL_COLOR,
+            font=self.font,
+            anchor="mt",
+        )
+
+    def _render_region(self, region: tuple, layouts: dict) -> Image.Image:
+        """裁剪底图的 region 区域，重绘与该区域相交的机器人（处理相互遮挡）"""
+        ox, oy = region[:2]
+        patch = self.base.crop(region)
+        draw = ImageDraw.Draw(patch)
+        redraw = [params for params, box in layouts.values() if _intersects(box, region)]
+        # 路径在下层，先画全部路径再画图标
+        if self.show_paths:
+            for params in redraw:
+                self._draw_path(draw, params, ox, oy)
+        for params in redraw:
+            self._draw_robot(patch, draw, params, ox, oy)
+        return patch
+
+    def update(self, robots: dict) -> list[tuple]:
+        """
+        按最新机器人状态更新叠加图
+
+        Returns:
+            list: 本次重绘的区域 (x1, y1, x2, y2)
+        """
+        with self._lock:
+            layouts = {}
+            for rid, status in robots.items():
+                layout = self._layout(status)
+                if layout is not None:
+                    layouts[rid] = layout
+
+            dirty = []
+            for rid in set(self.drawn) | set(layouts):
+                old, new = self.drawn.get(rid), layouts.get(rid)
+                if old is not None and new is not None and old[0] == new[0]:
+                    continue
+                if old is not None:
+                    dirty.append(old[1])
+                if new is not None:
+                    dirty.append(new[1])
+            self.stats["frames"] += 1
+            if not dirty:
+                return []
+
+            # 只裁剪变化区域的底图重绘后贴回当前帧，区域外的像素保持不变；
+            # 变化区域集中时合并为一个外接矩形，分散时(外接矩形远大于各区域之和)逐个处理
+            dirty = [box for box in dirty if box[0] < box[2] and box[1] < box[3]]
+            union = None
+            for box in dirty:
+                union = _union(union, box)
+            area = sum((b[2] - b[0]) * (b[3] - b[1]) for b in dirty)
+            regions = dirty
+            if union is not None and (union[2] - union[0]) * (union[3] - union[1]) <= area * 2:
+                regions = [union]
+            for region in regions:
+                self.frame.paste(self._render_region(region, layouts), region[:2])
+            self.drawn = layouts
+            self._encoded.clear()
+            self.stats["dirty_frames"] += 1
+            self.stats["dirty_pixels"] += sum((b[2] - b[0]) * (b[3] - b[1]) for b in dirty)
+            return dirty
+
+    def encode(self, fmt: str = "JPEG", quality: int = 80) -> bytes:
+        """编码当前帧，画面未变化时复用上一次的编码结果"""
+        with self._lock:
+            data = self._encoded.get(fmt)
+            if data is None:
+                buf = io.BytesIO()
+                if fmt == "JPEG":
+                    self.frame.save(buf, format="JPEG", quality=quality)
+                else:
+                    self.frame.save(buf, format=fmt)
+                data = buf.getvalue()
+                self._encoded[fmt] = data
+            return data
+
+    def refresh(self, fetch, max_age: float) -> bool:
+        """
+        距上次刷新超过 max_age 秒时调用 fetch() 读取机器人状态并更新，
+        多个客户端同时请求时只读取一次
+
+        Returns:
+            bool: 是否读取了新状态
+        """
+        with self._refresh_lock:
+            now = time.monotonic()
+            if now - self._refreshed < max_age:
+                return False
+            self._refreshed = now
+            self.update(fetch())
+            return True
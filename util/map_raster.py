@@ -0,0 +1,192 @@
+import logging
+import xml.etree.ElementTree as ET
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+logger = logging.getLogger(__name__)
+
+# 地图区域：points[start:start + count] 为多边形顶点，min/max 为包围盒
+AREA_DTYPE = np.dtype(
+    [
+        ("start", np.int64),
+        ("count", np.int32),
+        ("r", np.uint8),
+        ("g", np.uint8),
+        ("b", np.uint8),
+        ("a", np.uint8),
+        ("min_x", np.float64),
+        ("min_y", np.float64),
+        ("max_x", np.float64),
+        ("max_y", np.float64),
+    ]
+)
+# 区域标签，文本与字体名存放在 texts/fonts 列表中，下标一致
+LABEL_DTYPE = np.dtype(
+    [
+        ("start_x", np.float64),
+        ("start_y", np.float64),
+        ("end_x", np.float64),
+        ("end_y", np.float64),
+        ("size", np.float64),
+        ("r", np.uint8),
+        ("g", np.uint8),
+        ("b", np.uint8),
+        ("a", np.uint8),
+    ]
+)
+
+
+def _build_arrays(
+    polygons: list, area_rows: list, label_rows: list, texts: list, fonts: list
+) -> dict:
+    counts = np.asarray([len(p) for p in polygons], dtype=np.int64)
+    points = np.asarray([xy for p in polygons for xy in p], dtype=np.float64).reshape(-1, 2)
+    areas = np.zeros(len(polygons), dtype=AREA_DTYPE)
+    if len(polygons):
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        areas["start"] = starts
+        areas["count"] = counts
+        colors = np.asarray(area_rows, dtype=np.uint8).reshape(-1, 4)
+        areas["r"], areas["g"], areas["b"], areas["a"] = colors.T
+        # 空多边形的包围盒取 nan，不参与范围计算和裁剪
+        nonempty = counts > 0
+        idx = starts[nonempty]
+        areas["min_x"] = areas["min_y"] = areas["max_x"] = areas["max_y"] = np.nan
+        areas["min_x"][nonempty] = np.minimum.reduceat(points[:, 0], idx)
+        areas["min_y"][nonempty] = np.minimum.reduceat(points[:, 1], idx)
+        areas["max_x"][nonempty] = np.maximum.reduceat(points[:, 0], idx)
+        areas["max_y"][nonempty] = np.maximum.reduceat(points[:, 1], idx)
+    labels = np.zeros(len(label_rows), dtype=LABEL_DTYPE)
+    if label_rows:
+        values = np.asarray(label_rows, dtype=np.float64)
+        for i, name in enumerate(LABEL_DTYPE.names):
+            labels[name] = values[:, i]
+    return {"points": points, "areas": areas, "labels": labels, "texts": texts, "fonts": fonts}
+
+
+def parse_share_map_arrays(xml_content: str) -> dict:
+    """
+    共享地图XML直接解析为结构化数组，不经过 parse_ShareMapInfo 的JSON字符串
+
+    Returns:
+        dict: points (n, 2) 顶点坐标，areas AREA_DTYPE 数组，labels LABEL_DTYPE 数组，
+              texts/fonts 标签文本与字体名列表
+    """
+    root = ET.fromstring(xml_content)
+    polygons, area_rows = [], []
+    for map_ret in root.iter("MapRet"):
+        polygons.append(
+            [(int(p.get("xpos")), int(p.get("ypos"))) for p in map_ret.iter("Point")]
+        )
+        area = map_ret.find(".//Area")
+        area_rows.append(
+            tuple(int(area.get(k)) for k in ("color_r", "color_g", "color_b", "color_a"))
+        )
+    label_rows, texts, fonts = [], [], []
+    for ret_name in root.iter("RetName"):
+        label_rows.append(
+            (
+                int(ret_name.get("start_x")),
+                int(ret_name.get("start_y")),
+                int(ret_name.get("end_x")),
+                int(ret_name.get("end_y")),
+                float(ret_name.get("size")),
+                int(ret_name.get("font_color_r")),
+                int(ret_name.get("font_color_g")),
+                int(ret_name.get("font_color_b")),
+                int(ret_name.get("font_color_a")),
+            )
+        )
+        texts.append(ret_name.text.strip() if ret_name.text else "")
+        fonts.append(ret_name.get("font"))
+    return _build_arrays(polygons, area_rows, label_rows, texts, fonts)
+
+
+def share_map_arrays_from_dict(share_map_data: dict) -> dict:
+    """parse_ShareMapInfo 的字典结构转换为结构化数组"""
+    polygons, area_rows = [], []
+    for map_ret in share_map_data.get("map_ret_list", []):
+        polygons.append([(p["xpos"], p["ypos"]) for p in map_ret["points"]])
+        area = map_ret["area"]
+        area_rows.append((area["color_r"], area["color_g"], area["color_b"], area["color_a"]))
+    label_rows, texts, fonts = [], [], []
+    for ret_name in share_map_data.get("ret_name_list", []):
+        label_rows.append(
+            (
+                ret_name["start_x"],
+                ret_name["start_y"],
+                ret_name["end_x"],
+                ret_name["end_y"],
+                ret_name["size"],
+                ret_name["font_color_r"],
+                ret_name["font_color_g"],
+                ret_name["font_color_b"],
+                ret_name["font_color_a"],
+            )
+        )
+        texts.append(ret_name["text"])
+        fonts.append(ret_name.get("font"))
+    return _build_arrays(polygons, area_rows, label_rows, texts, fonts)
+
+
+def map_bounds(arrays: dict, padding: float = 0.05) -> tuple[float, float, float, float]:
+    """区域与标签的坐标范围，每边加 padding 比例的内边距，返回 (min_x, max_x, min_y, max_y)"""
+    areas, labels = arrays["areas"], arrays["labels"]
+    xs = np.concatenate((areas["min_x"], areas["max_x"], labels["start_x"], labels["end_x"]))
+    ys = np.concatenate((areas["min_y"], areas["max_y"], labels["start_y"], labels["end_y"]))
+    if not np.isfinite(xs).any():
+        raise ValueError("共享地图中没有区域与标签")
+    min_x, max_x = float(np.nanmin(xs)), float(np.nanmax(xs))
+    min_y, max_y = float(np.nanmin(ys)), float(np.nanmax(ys))
+    pad_x, pad_y = (max_x - min_x) * padding, (max_y - min_y) * padding
+    return min_x - pad_x, max_x + pad_x, min_y - pad_y, max_y + pad_y
+
+
+def to_pixels(xy: np.ndarray, bounds, width: int, height: int, integer: bool = False) -> np.ndarray:
+    """
+    地图坐标 (n, 2) 一次性转换为像素坐标，y轴翻转
+
+    Args:
+        integer: 与逐点转换的旧实现一致，归一化后取整再翻转y轴
+    """
+    min_x, max_x, min_y, max_y = bounds
+    px = np.empty(xy.shape, dtype=np.float64)
+    px[:, 0] = (xy[:, 0] - min_x) * ((width - 1) / (max_x - min_x))
+    px[:, 1] = (xy[:, 1] - min_y) * ((height - 1) / (max_y - min_y))
+    if integer:
+        px = np.floor(px).astype(np.int64)
+    px[:, 1] = height - px[:, 1]
+    return px
+
+
+def rasterize_areas(
+    arrays: dict, bounds, width: int, height: int, supersample: int = 1
+) -> Image.Image:
+    """
+    绘制全部区域多边形
+
+    Args:
+        supersample: 超采样倍数，按 width*supersample 绘制后缩小，实现抗锯齿
+    """
+    ss = max(int(supersample), 1)
+    image = Image.new("RGB", (width * ss, height * ss), color="white")
+    draw = ImageDraw.Draw(image)
+    areas = arrays["areas"]
+    if len(areas):
+        # 所有顶点一次转换，再按区域切片；tolist 后逐个绘制避免 numpy 标量开销
+        # 不超采样时取整，与逐点转换的旧实现输出一致
+        pixels = to_pixels(arrays["points"], bounds, width, height, integer=ss == 1)
+        if ss > 1:
+            pixels *= ss
+        flat = pixels.ravel().tolist()
+        colors = np.stack((areas["r"], areas["g"], areas["b"]), axis=1).tolist()
+        for start, count, color in zip(
+            areas["start"].tolist(), areas["count"].tolist(), colors
+        ):
+            if count < 2:
+                continue
+            draw.polygon(flat[start * 2 : (start + count) * 2], fill=tuple(color))
+    if ss > 1:
+        image = image.resize((width, height), Image.LANCZOS)
+    return image
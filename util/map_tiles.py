@@ -0,0 +1,214 @@
+import io
+import logging
+import math
+import pathlib
+import shutil
+import threading
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from .cache_manifest import atomic_write
+from .map_raster import map_bounds
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 256
+# 标签字号小于该值(像素)时不绘制
+MIN_LABEL_PX = 6
+# 与 generate_map_image 一致的标签字号缩放因子
+FONT_SCALE = 0.3
+
+
+@lru_cache(maxsize=64)
+def load_font(size: int):
+    """按字号加载字体，依次尝试宋体、雅黑、Arial，都不可用时使用默认字体"""
+    for family in ("simsun.ttc", "msyh.ttc", "arial.ttf"):
+        try:
+            return ImageFont.truetype(family, size)
+        except Exception:
+            continue
+    return ImageFont.load_default()
+
+
+class MapTiler:
+    """共享地图XYZ瓦片
+
+    地图左上角为瓦片坐标原点，第 z 级地图较长的一边为 TILE_SIZE * 2^z 像素。
+    瓦片在首次请求时渲染，按 共享地图内容哈希/z/x/y.png 缓存到磁盘，
+    地图数据变化后哈希改变，旧版本瓦片目录被清理。
+    """
+
+    def __init__(
+        self,
+        arrays: dict,
+        version: str,
+        cache_dir: pathlib.Path,
+        max_zoom: int | None = None,
+        min_resolution: float = 5.0,
+    ):
+        """
+        Args:
+            arrays: parse_share_map_arrays 解析的结构化数组
+            version: 共享地图内容哈希
+            cache_dir: 瓦片缓存根目录，每个版本一个子目录
+            max_zoom: 最大缩放级别，为空时按 min_resolution 计算
+            min_resolution: 最大缩放级别下每像素对应的地图长度(mm)
+        """
+        self.version = version
+        self.cache_root = cache_dir
+        self.cache_dir = cache_dir / version[:16]
+        self._lock = threading.Lock()
+
+        self.points = arrays["points"]
+        self.areas = arrays["areas"][arrays["areas"]["count"] >= 3]
+        # 每个区域的包围盒 (min_x, min_y, max_x, max_y)，用于按瓦片范围筛选
+        self.poly_bbox = np.stack(
+            [self.areas[k] for k in ("min_x", "min_y", "max_x", "max_y")], axis=1
+        ).reshape(-1, 4)
+        self.colors = np.stack(
+            (self.areas["r"], self.areas["g"], self.areas["b"]), axis=1
+        ).tolist()
+
+        labels = arrays["labels"]
+        self.labels = [
+            (text, float(size), tuple(color))
+            for text, size, color in zip(
+                arrays["texts"],
+                labels["size"],
+                np.stack((labels["r"], labels["g"], labels["b"]), axis=1).tolist(),
+            )
+        ]
+        self.label_xy = np.stack(
+            ((labels["start_x"] + labels["end_x"]) / 2, (labels["start_y"] + labels["end_y"]) / 2),
+            axis=1,
+        ).reshape(-1, 2)
+
+        # 坐标范围与 generate_map_image 相同：包含区域与标签，每边5%内边距
+        if len(self.areas) or len(labels):
+            self.min_x, self.max_x, self.min_y, self.max_y = map_bounds(arrays)
+        else:
+            self.min_x = self.max_x = self.min_y = self.max_y = 0.0
+        self.span = max(self.max_x - self.min_x, self.max_y - self.min_y, 1.0)
+        self.max_zoom = (
+            max_zoom
+            if max_zoom is not None
+            else max(0, math.ceil(math.log2(self.span / (TILE_SIZE * min_resolution))))
+        )
+
+    def resolution(self, z: int) -> float:
+        """第 z 级每像素对应的地图长度(mm)"""
+        return self.span / (TILE_SIZE * (1 << z))
+
+    def tile_bounds(self, z: int, x: int, y: int) -> tuple[float, float, float, float]:
+        """瓦片覆盖的地图坐标范围 (min_x, min_y, max_x, max_y)"""
+        size = TILE_SIZE * self.resolution(z)
+        left = self.min_x + x * size
+        top = self.max_y - y * size
+        return left, top - size, left + size, top
+
+    def valid(self, z: int, x: int, y: int) -> bool:
+        return 0 <= z <= self.max_zoom and 0 <= x < (1 << z) and 0 <= y < (1 << z)
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "tile_size": TILE_SIZE,
+            "min_zoom": 0,
+            "max_zoom": self.max_zoom,
+            "bounds": {
+                "min_x": self.min_x,
+                "min_y": self.min_y,
+                "max_x": self.max_x,
+                "max_y": self.max_y,
+            },
+            "span": self.span,
+            "resolutions": [self.resolution(z) for z in range(self.max_zoom + 1)],
+            "areas": len(self.areas),
+            "labels": len(self.labels),
+        }
+
+    def render(self, z: int, x: int, y: int) -> bytes:
+        """渲染单个瓦片为PNG"""
+        res = self.resolution(z)
+        x1, y1, x2, y2 = self.tile_bounds(z, x, y)
+        image = Image.new("RGB", (TILE_SIZE, TILE_SIZE), color="white")
+        draw = ImageDraw.Draw(image)
+
+        bbox = self.poly_bbox
+        hits = np.nonzero(
+            (bbox[:, 0] <= x2) & (bbox[:, 2] >= x1) & (bbox[:, 1] <= y2) & (bbox[:, 3] >= y1)
+        )[0]
+        for i in hits.tolist():
+            start, count = int(self.areas["start"][i]), int(self.areas["count"][i])
+            points = self.points[start : start + count]
+            px = np.empty_like(points)
+            px[:, 0] = (points[:, 0] - x1) / res
+            px[:, 1] = (y2 - points[:, 1]) / res
+            draw.polygon(px.ravel().tolist(), fill=tuple(self.colors[i]))
+
+        if len(self.labels):
+            # 字号计算与 generate_map_image 相同，地图尺寸按当前级别换算为像素
+            size_factor = min(self.max_x - self.min_x, self.max_y - self.min_y) / res / 1000.0
+            # 中心在瓦片外一个瓦片宽度内的标签也绘制，跨瓦片的文字各绘制一部分
+            margin = TILE_SIZE * res
+            lx, ly = self.label_xy[:, 0], self.label_xy[:, 1]
+            near = np.nonzero(
+                (lx >= x1 - margin)
+                & (lx <= x2 + margin)
+                & (ly >= y1 - margin)
+                & (ly <= y2 + margin)
+            )[0]
+            for i in near:
+                text, size, color = self.labels[i]
+                # 长文本使用稍小字体
+                length_factor = max(0.7, min(1.0, 20.0 / max(len(text), 10)))
+                font_px = size * FONT_SCALE * size_factor * length_factor
+                if font_px < MIN_LABEL_PX:
+                    continue
+                draw.multiline_text(
+                    ((lx[i] - x1) / res, (y2 - ly[i]) / res),
+                    text.replace(" ", "\n"),
+                    fill=color,
+                    font=load_font(int(min(font_px, 100))),
+                    anchor="mm",
+                    align="center",
+                )
+
+        buf = io.BytesIO()
+        image.save(buf, format="PNG", optimize=True)
+        return buf.getvalue()
+
+    def tile_path(self, z: int, x: int, y: int) -> pathlib.Path:
+        return self.cache_dir / str(z) / str(x) / f"{y}.png"
+
+    def get(self, z: int, x: int, y: int) -> bytes | None:
+        """读取瓦片，未缓存时渲染并写入磁盘，超出范围返回None"""
+        if not self.valid(z, x, y):
+            return None
+        path = self.tile_path(z, x, y)
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            if path.exists():
+                return path.read_bytes()
+            data = self.render(z, x, y)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write(path, data)
+            return data
+
+    def purge_old_versions(self) -> list[str]:
+        """删除其他版本的瓦片目录"""
+        removed = []
+        if not self.cache_root.exists():
+            return removed
+        for child in self.cache_root.iterdir():
+            if child.is_dir() and child != self.cache_dir:
+                shutil.rmtree(child, ignore_errors=True)
+                removed.append(child.name)
+        if removed:
+            logger.info(f"已清理旧版本地图瓦片: {removed}")
+        return removed
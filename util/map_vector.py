@@ -0,0 +1,167 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VECTOR_FORMAT = "compact-v1"
+
+
+def _point_segment_distance(points: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """points (n, 2) 到线段 ab 的距离"""
+    ab = b - a
+    length2 = float(ab @ ab)
+    if length2 == 0.0:
+        return np.hypot(*(points - a).T)
+    t = np.clip(((points - a) @ ab) / length2, 0.0, 1.0)
+    proj = a + t[:, None] * ab
+    return np.hypot(*(points - proj).T)
+
+
+def _simplify_open(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """Douglas-Peucker 折线化简，返回保留点的布尔掩码（首尾点始终保留）"""
+    n = len(points)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        dist = _point_segment_distance(points[i + 1 : j], points[i], points[j])
+        k = int(dist.argmax())
+        if dist[k] > tolerance:
+            m = i + 1 + k
+            keep[m] = True
+            stack.append((i, m))
+            stack.append((m, j))
+    return keep
+
+
+def simplify_ring(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    闭合多边形化简：以首点和距首点最远的点把环分为两条折线分别化简
+
+    Returns:
+        np.ndarray: 保留的顶点，少于3个点时表示多边形在该容差下退化
+    """
+    if tolerance <= 0 or len(points) <= 3:
+        return points
+    far = int(np.hypot(*(points - points[0]).T).argmax())
+    if far == 0:
+        return points[:1]
+    closed = np.vstack((points, points[:1]))
+    first = _simplify_open(closed[: far + 1], tolerance)
+    second = _simplify_open(closed[far:], tolerance)
+    keep = np.concatenate((first, second[1:]))[:-1]
+    return points[keep]
+
+
+def _dedupe_ring(points: np.ndarray) -> np.ndarray:
+    """去掉量化后重合的相邻顶点（含首尾）"""
+    if len(points) < 2:
+        return points
+    diff = np.any(points != np.roll(points, 1, axis=0), axis=1)
+    if not diff.any():
+        return points[:1]
+    return points[diff]
+
+
+def compact_share_map(
+    arrays: dict, version: str, tolerance: float = 0.0, quantum: float = 10.0
+) -> dict:
+    """
+    共享地图结构化数组转换为紧凑矢量格式
+
+    坐标按 quantum(mm) 量化为相对 origin 的整数，x = origin[0] + qx * quantum；
+    每个多边形首点为绝对值，后续顶点为与前一点的差值，JSON中数字更短。
+    区域与标签颜色合并为调色板，区域和标签只保存调色板下标。
+
+    Args:
+        arrays: parse_share_map_arrays 解析的结构化数组
+        version: 共享地图内容哈希
+        tolerance: 多边形化简容差(mm)，0为不化简；化简后少于3个顶点的区域被丢弃
+        quantum: 坐标量化步长(mm)
+
+    Returns:
+        dict: 可直接序列化为JSON的紧凑地图数据
+    """
+    quantum = float(quantum) if quantum and quantum > 0 else 1.0
+    points, areas, labels = arrays["points"], arrays["areas"], arrays["labels"]
+
+    xs = np.concatenate((points[:, 0], labels["start_x"], labels["end_x"]))
+    ys = np.concatenate((points[:, 1], labels["start_y"], labels["end_y"]))
+    if len(xs):
+        origin = (float(np.floor(xs.min())), float(np.floor(ys.min())))
+    else:
+        origin = (0.0, 0.0)
+    q_points = np.rint((points - origin) / quantum).astype(np.int64)
+
+    # 区域与标签颜色合并去重
+    colors = np.concatenate(
+        (
+            np.stack((areas["r"], areas["g"], areas["b"], areas["a"]), axis=1),
+            np.stack((labels["r"], labels["g"], labels["b"], labels["a"]), axis=1),
+        )
+    ).reshape(-1, 4)
+    palette, color_index = np.unique(colors, axis=0, return_inverse=True)
+    color_index = color_index.reshape(-1)
+    area_colors, label_colors = color_index[: len(areas)], color_index[len(areas) :]
+
+    q_tolerance = tolerance / quantum
+    rings, kept_colors = [], []
+    for start, count, color in zip(
+        areas["start"].tolist(), areas["count"].tolist(), area_colors.tolist()
+    ):
+        ring = _dedupe_ring(q_points[start : start + count])
+        ring = simplify_ring(ring, q_tolerance)
+        if len(ring) < 3:
+            continue
+        rings.append(ring)
+        kept_colors.append(color)
+
+    counts = [len(ring) for ring in rings]
+    if rings:
+        coords = np.concatenate(rings)
+        deltas = np.diff(coords, axis=0, prepend=coords[:1])
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        deltas[starts] = coords[starts]
+        flat = deltas.ravel().tolist()
+    else:
+        flat = []
+
+    fonts: dict[str, int] = {}
+    font_index = [fonts.setdefault(f or "", len(fonts)) for f in arrays["fonts"]]
+    rect = np.stack(
+        (
+            (labels["start_x"] - origin[0]) / quantum,
+            (labels["start_y"] - origin[1]) / quantum,
+            (labels["end_x"] - origin[0]) / quantum,
+            (labels["end_y"] - origin[1]) / quantum,
+        ),
+        axis=1,
+    )
+
+    return {
+        "format": VECTOR_FORMAT,
+        "version": version[:16],
+        "quantum": quantum,
+        "tolerance": tolerance,
+        "origin": list(origin),
+        "palette": palette.tolist(),
+        "areas": {"color": kept_colors, "count": counts, "coords": flat},
+        "fonts": list(fonts),
+        "labels": {
+            "rect": np.rint(rect).astype(np.int64).ravel().tolist(),
+            "size": labels["size"].tolist(),
+            "color": label_colors.tolist(),
+            "font": font_index,
+            "text": list(arrays["texts"]),
+        },
+        "stats": {
+            "areas": int(len(areas)),
+            "areas_kept": len(rings),
+            "points": int(len(points)),
+            "points_kept": int(sum(counts)),
+        },
+    }
@@ -0,0 +1,188 @@
+import bisect
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 端口目录依赖的缓存数据集
+INPUTS = ("bufferPort", "machinePort", "cmsindexmap")
+# 其他进程(如命令行 saveport)更新缓存时没有订阅通知，按该间隔(秒)核对清单中的哈希
+CHECK_INTERVAL = 5.0
+
+
+def device_index(cms_index: str) -> str:
+    """端口 cmsIndex -> 所属设备的 cmsIndex（前4位+"00"，与 cmsindexmap 一致）"""
+    return cms_index[:4] + "00" if cms_index else ""
+
+
+class PortIndex:
+    """一次构建的端口/设备索引，构建完成后不再修改，读取方拿到的始终是完整的一份"""
+
+    def __init__(
+        self, ports=None, by_cms=None, by_carrier=None, devices=None, cmsindexmap=None, names=None, built_at=0.0
+    ):
+        self.ports: dict[str, dict] = ports or {}
+        self.by_cms: dict[str, list[str]] = by_cms or {}
+        self.by_carrier: dict[str, str] = by_carrier or {}
+        self.devices: dict[str, dict] = devices or {}
+        self.cmsindexmap: dict[str, dict] = cmsindexmap or {}
+        self.names: list[tuple[str, str]] = names or []
+        self.built_at = built_at
+
+
+class PortDirectory:
+    """端口/设备目录
+
+    由缓存的 bufferPort/machinePort 与 cmsindexmap 一次构建索引：
+    - port -> 端口信息（含 cmsIndex）
+    - cmsIndex -> 端口列表（端口自身的 cmsIndex 或所属设备的 cmsIndex）
+    - carrierId -> 端口（缓存时的载具位置，随端口缓存刷新）
+    - 设备名/eqName 前缀搜索（有序列表二分查找）
+    端口缓存变化时（清单订阅或定期核对哈希）下次访问重新构建；
+    新索引构建完成后整体替换，并发读取不会看到构建了一半的数据。
+    """
+
+    def __init__(self, cache_path, manifest):
+        self.cache_path = cache_path
+        self.manifest = manifest
+        self._lock = threading.Lock()
+        self._built = False
+        self._hashes: dict[str, str | None] = {}
+        self._checked_at = 0.0
+        self.built_at = 0.0
+        self._index = PortIndex()
+        manifest.subscribe(self._on_change)
+
+    def _on_change(self, changed: set):
+        if changed.intersection(INPUTS):
+            self.invalidate()
+
+    def invalidate(self):
+        self._built = False
+
+    def _load_rows(self, name: str) -> list[dict]:
+        try:
+            with open(self.cache_path / f"{name}.json", encoding="utf-8") as f:
+                return json.load(f).get("data") or []
+        except FileNotFoundError:
+            return []
+
+    def _build(self):
+        started = time.perf_counter()
+        hashes = self._current_hashes()
+        try:
+            with open(self.cache_path / "cmsindexmap.json", encoding="utf-8") as f:
+                cmsindexmap = json.load(f)
+        except FileNotFoundError:
+            cmsindexmap = {}
+
+        ports, by_cms, by_carrier, devices = {}, {}, {}, {}
+        for kind in ("bufferPort", "machinePort"):
+            for row in self._load_rows(kind):
+                port = row.get("port")
+                if not port:
+                    continue
+                cms_index = row.get("cmsIndex") or ""
+                entry = {
+                    "port": port,
+                    "kind": kind,
+                    "type": row.get("type"),
+                    "cmsIndex": cms_index,
+                    "device": device_index(cms_index),
+                    "eqName": row.get("eqName") or "",
+                    "carrierId": row.get("carrierId") or "",
+                    "carrierLoc": row.get("carrierLoc") or "",
+                    "mapDataCode": row.get("mapDataCode") or "",
+                }
+                ports.setdefault(port, entry)
+                if cms_index:
+                    by_cms.setdefault(cms_index, []).append(port)
+                    if entry["device"] != cms_index:
+                        by_cms.setdefault(entry["device"], []).append(port)
+                if entry["carrierId"]:
+                    by_carrier[entry["carrierId"]] = port
+                if entry["eqName"]:
+                    devices.setdefault(
+                        entry["eqName"],
+                        {"name": entry["eqName"], "deviceType": "", "cmsIndex": entry["device"]},
+                    )
+
+        # cmsindexmap 中的设备名（BUFFER 为端口前4位、EQ 为 eqName+位置等）
+        for device_type, items in cmsindexmap.items():
+            for name, cms_index in items.items():
+                devices[name] = {"name": name, "deviceType": device_type, "cmsIndex": cms_index}
+
+        names = sorted({(name.upper(), name) for name in devices})
+        # 整体替换，读取方要么拿到旧索引，要么拿到完整的新索引
+        # 构建时间用作派生数据的缓存键，时钟精度低(Windows)时也保证递增
+        built_at = max(time.time(), self.built_at + 1e-6)
+        self._index = PortIndex(ports, by_cms, by_carrier, devices, cmsindexmap, names, built_at)
+        self._hashes = hashes
+        self._checked_at = time.monotonic()
+        self.built_at = built_at
+        self._built = True
+        logger.info(
+            f"端口目录构建完成: {len(ports)} 个端口，{len(devices)} 个设备，"
+            f"耗时 {time.perf_counter() - started:.3f}s"
+        )
+
+    def _stale(self) -> bool:
+        now = time.monotonic()
+        if now - self._checked_at < CHECK_INTERVAL:
+            return False
+        self._checked_at = now
+        return self._current_hashes() != self._hashes
+
+    def _current_hashes(self) -> dict:
+        self.manifest.reload()
+        return {name: self.manifest.get_hash(name) for name in INPUTS}
+
+    def ensure(self) -> PortIndex:
+        """首次访问或缓存变化后构建索引，返回当前索引"""
+        if self._built and not self._stale():
+            return self._index
+        with self._lock:
+            # 等待锁期间可能已被其他线程重建
+            if not self._built or self._hashes != self._current_hashes():
+                self._build()
+        return self._index
+
+    def port(self, port: str) -> dict | None:
+        return self.ensure().ports.get(port)
+
+    def ports_of(self, cms_index: str) -> list[dict]:
+        """cmsIndex -> 端口列表，设备 cmsIndex（xxxx00）返回该设备的全部端口"""
+        index = self.ensure()
+        return [index.ports[p] for p in index.by_cms.get(cms_index, ())]
+
+    def carrier(self, carrier_id: str) -> dict | None:
+        index = self.ensure()
+        port = index.by_carrier.get(carrier_id)
+        return index.ports.get(port) if port else None
+
+    def search(self, prefix: str, limit: int = 20) -> list[dict]:
+        """设备名/eqName 前缀搜索（不区分大小写）"""
+        index = self.ensure()
+        key = prefix.upper()
+        names = index.names
+        result = []
+        for i in range(bisect.bisect_left(names, (key,)), len(names)):
+            upper, name = names[i]
+            if not upper.startswith(key) or len(result) >= limit:
+                break
+            device = index.devices[name]
+            result.append({**device, "ports": len(index.by_cms.get(device["cmsIndex"], ()))})
+        return result
+
+    def info(self) -> dict:
+        index = self._index
+        return {
+            "built": self._built,
+            "built_at": self.built_at,
+            "ports": len(index.ports),
+            "cms_indexes": len(index.by_cms),
+            "carriers": len(index.by_carrier),
+            "devices": len(index.devices),
+        }
@@ -0,0 +1,37 @@
+import os
+
+
+def _psutil_process(pid: int | None):
+    """psutil 的进程对象，未安装 psutil 时返回None"""
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process(pid)
+
+
+def process_cpu_seconds(pid: int) -> float | None:
+    """进程累计CPU时间(秒)，优先psutil，其次/proc，都不可用时返回None"""
+    try:
+        proc = _psutil_process(pid)
+        if proc is not None:
+            t = proc.cpu_times()
+            return t.user + t.system
+        with open(f"/proc/{pid}/stat", "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except Exception:
+        return None
+
+
+def process_rss_mb(pid: int | None = None) -> float | None:
+    """进程常驻内存(MB)，默认当前进程，优先psutil，其次/proc，都不可用时返回None"""
+    try:
+        proc = _psutil_process(pid)
+        if proc is not None:
+            return round(proc.memory_info().rss / 1048576, 1)
+        with open(f"/proc/{pid or 'self'}/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 1048576, 1)
+    except Exception:
+        return None
@@ -1,15 +1,29 @@
+import asyncio
+import itertools
 import json
 import logging
 import os
 import pathlib
+import threading
+import time
 
 import httpx
+import orjson
+from PIL import Image
 
 from util.xml2json import safe_lxml_parse
 
+from .cache_manifest import atomic_write, content_hash, get_manifest
 from .config import cfg
-from .dataparse import generate_map_image, parse_ShareMapInfo
+from .dataparse import generate_map_image
+from .heatmap import FleetHeatmap
 from .helper import sharemap2json
+from .map_overlay import FleetOverlay
+from .map_raster import map_bounds, parse_share_map_arrays
+from .map_tiles import MapTiler
+from .map_vector import compact_share_map
+from .procstat import process_rss_mb
+from .spatial_index import CellIndex
 
 logger = logging.getLogger(__name__)
 
@@ -21,12 +35,81 @@ cache_path = pathlib.Path(os.path.join(os.path.dirname(__file__), "data/cache"))
 if not cache_path.exists():
     cache_path.mkdir()
 
+# 缓存目录中的JSON数据集
+CACHE_DATASETS = [
+    "rcsdata",
+    "maplist",
+    "devicelist",
+    "displaytype",
+    "alarmtype",
+    "rabbitmqdata",
+    "mapdata",
+    "sharemapdata_dict",
+]
+# 可选数据集：缺失时不影响从缓存构建（旧缓存目录中没有这些文件）
+OPTIONAL_DATASETS = ["maplinedata"]
+# 已解析数据集的快照文件，源文件哈希与 manifest.json 一致时直接加载
+PARSED_SNAPSHOT = "parsed_snapshot.orjson"
+PARSED_SNAPSHOT_VERSION = 1
+
+_MISSING = object()
+# 数据集版本号，每次赋值或从缓存加载时取下一个值，进程内不重复
+_dataset_versions = itertools.count(1)
+
+
+class LazyDataset:
+    """RcmsApi 数据集属性
+
+    懒加载模式下首次访问时才从缓存文件读取；被 release() 释放的数据集再次访问时重新加载；
+    其他情况下未赋值时返回默认值。
+    """
+
+    def __init__(self, default_factory, always_lazy: bool = False):
+        self.default_factory = default_factory
+        # 不在预解析快照中的数据集，任何模式下都在首次访问时从缓存文件加载
+        self.always_lazy = always_lazy
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        # 后台线程可能随时 release()，只在锁内取值，返回取到的对象
+        value = obj._datasets.get(self.name, _MISSING)
+        if value is _MISSING:
+            if obj._lazy or self.always_lazy or self.name in obj._released:
+                value = obj._load_dataset(self.name)
+            else:
+                with obj._dataset_lock:
+                    value = obj._datasets.setdefault(self.name, self.default_factory())
+        obj._dataset_access[self.name] = time.monotonic()
+        return value
+
+    def __set__(self, obj, value):
+        with obj._dataset_lock:
+            obj._datasets[self.name] = value
+            obj._dataset_version[self.name] = next(_dataset_versions)
+            obj._released.discard(self.name)
+
 
 class RcmsApi:
+    rcsdata = LazyDataset(dict)
+    rabbitmqdata = LazyDataset(dict)
+    mapdata = LazyDataset(dict)
+    sharemapdata = LazyDataset(str)
+    sharemapdata_dict = LazyDataset(dict)
+    maplist = LazyDataset(lambda: None)
+    alarmtype = LazyDataset(dict)
+    devicelist = LazyDataset(dict)
+    displaytype = LazyDataset(dict)
+    maplinedata = LazyDataset(dict, always_lazy=True)
+
     def __init__(
         self,
         host: str = cfg.get("rcms.rcms_rest_api"),
         fake: bool = cfg.get("fake"),
+        map_code: str | None = None,
     ):
         self.host = host
         self.base_url = f"{self.host}/rcms/services/rest/clientService"
@@ -34,18 +117,27 @@ class RcmsApi:
         self.client = httpx.Client(
             headers={"Content-Type": "application/json", "User-Agent": self.user_agent}, verify=False
         )
+        # 为空时使用 maplist 中的第一个地图
+        self.map_code = map_code if map_code is not None else cfg.get("rcms.map_code")
         self.fake = fake
-        self.rcsdata = {}
-        self.rabbitmqdata = {}
-        self.mapdata = {}
-        self.sharemapdata = ""
-        self.sharemapdata_dict = {}
-        self.maplinedata = {}
-        self.maplist = None
-        self.alarmtype = {}
-        self.devicelist = {}
-        self.displaytype = {}
+        # 数据集实际存储，见 LazyDataset
+        self._datasets = {}
+        self._dataset_stats = {}
+        self._dataset_access = {}
+        self._dataset_version = {}
+        self._dataset_lock = threading.RLock()
+        self._lazy = False
+        # 已释放、下次访问时从缓存重新加载的数据集
+        self._released: set[str] = set()
         self.current_cache_path = self._get_current_cache_path()
+        self.manifest = get_manifest(self.current_cache_path)
+        # 由共享地图派生的对象（结构化数组、瓦片、实时叠加图），按内容哈希缓存
+        self._map_cache = {}
+        self._map_lock = threading.RLock()
+        # (sharemapdata, 内容哈希)，见 share_map_version
+        self._share_map_version: tuple[str, str] | None = None
+        # 异步客户端按事件循环分别创建，只在所属事件循环中关闭
+        self._aclients: dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
 
     def _get_current_cache_path(self):
         current_cache_path = cache_path / self.host.split("://")[1].replace(
@@ -56,40 +148,105 @@ class RcmsApi:
             current_cache_path.mkdir()
         return current_cache_path
 
-    def cache_data(self):
+    def cache_data(self) -> list[str]:
         """
-        持久化数据到文件
+        持久化数据到文件，只写入内容有变化的数据集
+        :return: 有变化的数据集名称列表
         """
 
         p = self.current_cache_path
         if not p.exists():
             p.mkdir()
-        for k in [
-            "alarmtype",
-            "devicelist",
-            "displaytype",
-            "rabbitmqdata",
-            "rcsdata",
-            "maplist",
-            "mapdata",
-            "sharemapdata_dict",
-        ]:
-            with open(p / f"{k}.json", "w", encoding="utf-8") as f:
-                json.dump(self.__dict__[k], f, indent=2, ensure_ascii=False)
-        with open(p / "sharemapdata.xml", "w", encoding="utf-8") as f:
-            f.write(self.sharemapdata)
-        logger.info(f"数据已持久化到 {p}")
+        self.manifest.reload()
+        changed = []
+        for k in CACHE_DATASETS:
+            data = json.dumps(getattr(self, k), indent=2, ensure_ascii=False)
+            if self.manifest.write(k, f"{k}.json", data.encode("utf-8")):
+                changed.append(k)
+        if self.manifest.write(
+            "sharemapdata", "sharemapdata.xml", self.sharemapdata.encode("utf-8")
+        ):
+            changed.append("sharemapdata")
+        for k in OPTIONAL_DATASETS:
+            value = getattr(self, k)
+            if value and self.manifest.write(k, f"{k}.json", orjson.dumps(value)):
+                changed.append(k)
+        self.manifest.commit(changed)
+        if changed or not (p / PARSED_SNAPSHOT).exists():
+            self.save_parsed_snapshot()
+        logger.info(f"数据已持久化到 {p}，变化的数据集: {changed or '无'}")
+        return changed
 
     def close(self):
         """关闭httpx客户端"""
         self.client.close()
 
+    async def aclose(self):
+        """关闭当前事件循环中的异步httpx客户端，其他事件循环的客户端不受影响"""
+        client = self._aclients.pop(asyncio.get_running_loop(), None)
+        if client is not None and not client.is_closed:
+            await client.aclose()
+
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
 
+    def _request(self, method: str, json=None, data=None):
+        """同步请求RCMS接口，无请求体时使用GET"""
+        url = f"{self.base_url}/{method}"
+        if json is None and data is None:
+            response = self.client.get(url)
+        else:
+            response = self.client.post(url, json=json, data=data)
+        response.raise_for_status()
+        return response
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """获取当前事件循环的异步客户端（每个实例、每个事件循环一个连接池）"""
+        loop = asyncio.get_running_loop()
+        # 已结束的事件循环(如 asyncio.run)中的客户端无法再关闭，只丢弃引用
+        for old_loop in [lp for lp in self._aclients if lp.is_closed()]:
+            del self._aclients[old_loop]
+        client = self._aclients.get(loop)
+        if client is None or client.is_closed:
+            pool_size = cfg.get("rcms.pool_size") or 10
+            client = httpx.AsyncClient(
+                headers={"Content-Type": "application/json", "User-Agent": self.user_agent},
+                verify=False,
+                timeout=30,
+                limits=httpx.Limits(
+                    max_connections=pool_size, max_keepalive_connections=pool_size
+                ),
+            )
+            self._aclients[loop] = client
+        return client
+
+    async def _arequest(self, method: str, json=None, data=None):
+        """异步请求RCMS接口，无请求体时使用GET"""
+        client = self._get_async_client()
+        url = f"{self.base_url}/{method}"
+        if json is None and data is None:
+            response = await client.get(url)
+        else:
+            response = await client.post(url, json=json, data=data)
+        response.raise_for_status()
+        return response
+
+    def _parse_xml(self, method: str, c: str):
+        """解析接口返回的XML，模拟模式下读取模拟数据"""
+        if self.fake:
+            return safe_lxml_parse(xml_string=self.fake_data(method))
+        return safe_lxml_parse(xml_string=c)
+
+    def _load_sharemap(self, method: str, content):
+        """共享地图与线路接口返回JSON，统一转换为XML字符串"""
+        if self.fake:
+            with open(f"{fake_path}/{method}.json", "r", encoding="utf-8") as f:
+                return sharemap2json(json.load(f))
+        return sharemap2json(content)
+
     def find_device_list_by_elc_map_code(self, elc_map_code: str):
         """
         根据电子地图代码查找设备列表
@@ -97,19 +254,14 @@ class RcmsApi:
         :return: 设备列表
         """
         method = "findDeviceListByElcMapCode"
-        c = ""
-        if self.fake:
-            result = safe_lxml_parse(xml_string=self.fake_data(method))
-        else:
-            url = f"{self.base_url}/{method}"
-            data = {"elcMapCode": elc_map_code}
-            response = self.client.post(url, json=data)
-            response.raise_for_status()
-            c = response.text
-            result = safe_lxml_parse(xml_string=c)
-
-        # 将结果存储到self.data
-        self.devicelist = result["rows"]["row"]
+        c = "" if self.fake else self._request(method, json={"elcMapCode": elc_map_code}).text
+        self.devicelist = self._parse_xml(method, c)["rows"]["row"]
+        return method, c
+
+    async def afind_device_list_by_elc_map_code(self, elc_map_code: str):
+        method = "findDeviceListByElcMapCode"
+        c = "" if self.fake else (await self._arequest(method, json={"elcMapCode": elc_map_code})).text
+        self.devicelist = self._parse_xml(method, c)["rows"]["row"]
         return method, c
 
     def find_map_list_by_rcs_code(self, rcs_code: str):
@@ -119,19 +271,14 @@ class RcmsApi:
         :return: 地图列表
         """
         method = "findMapListByRcsCode"
-        c = ""
-        if self.fake:
-            result = safe_lxml_parse(xml_string=self.fake_data(method))
-        else:
-            url = f"{self.base_url}/{method}"
-            data = {"rcsCode": rcs_code}
-            response = self.client.post(url, json=data)
-            response.raise_for_status()
-            c = response.text
-            result = safe_lxml_parse(xml_string=c)
-
-        # 将结果存储到self.data
-        self.maplist = result["rows"]["row"]
+        c = "" if self.fake else self._request(method, json={"rcsCode": rcs_code}).text
+        self.maplist = self._parse_xml(method, c)["rows"]["row"]
+        return method, c
+
+    async def afind_map_list_by_rcs_code(self, rcs_code: str):
+        method = "findMapListByRcsCode"
+        c = "" if self.fake else (await self._arequest(method, json={"rcsCode": rcs_code})).text
+        self.maplist = self._parse_xml(method, c)["rows"]["row"]
         return method, c
 
     def find_remove_agv(self, map_code: str):
@@ -140,11 +287,11 @@ class RcmsApi:
         :param map_code: 地图代码
         :return: 排除AGV列表以及原因
         """
-        method = "findRemoveAgv"
-        url = f"{self.base_url}/{method}"
-        data = {"mapCode": map_code}
-        response = self.client.post(url, json=data)
-        response.raise_for_status()
+        response = self._request("findRemoveAgv", json={"mapCode": map_code})
+        return safe_lxml_parse(xml_string=response.text)
+
+    async def afind_remove_agv(self, map_code: str):
+        response = await self._arequest("findRemoveAgv", json={"mapCode": map_code})
         return safe_lxml_parse(xml_string=response.text)
 
     def find_all_rcs_list(self):
@@ -153,22 +300,22 @@ class RcmsApi:
         :return: RCS列表
         """
         method = "findAllRcsList"
-        c = ""
+        c = "" if self.fake else self._request(method).text
+        self._set_rcsdata(method, c)
+        return method, c
+
+    async def afind_all_rcs_list(self):
+        method = "findAllRcsList"
+        c = "" if self.fake else (await self._arequest(method)).text
+        self._set_rcsdata(method, c)
+        return method, c
+
+    def _set_rcsdata(self, method: str, c: str):
         if self.fake:
-            result = safe_lxml_parse(xml_string=self.fake_data(method))
             logger.info("使用模拟数据")
-        else:
-            url = f"{self.base_url}/{method}"
-            response = self.client.get(url)
-            response.raise_for_status()
-            c = response.text
-            if not c.startswith("<"):
-                raise Exception(str(c))
-            # print(url,c)
-            result = safe_lxml_parse(xml_string=c)
-        # 将结果存储到self.data
-        self.rcsdata = result["rows"]["row"]
-        return method, c
+        elif not c.startswith("<"):
+            raise Exception(str(c))
+        self.rcsdata = self._parse_xml(method, c)["rows"]["row"]
 
     def find_display_biz_ele_typ(self):
         """
@@ -176,18 +323,14 @@ class RcmsApi:
         :return: 业务元素类型列表
         """
         method = "findDisplayBizEleTyp"
-        c = ""
-        if self.fake:
-            result = safe_lxml_parse(xml_string=self.fake_data(method))
-        else:
-            url = f"{self.base_url}/{method}"
-            response = self.client.get(url)
-            response.raise_for_status()
-            c = response.text
-            result = safe_lxml_parse(xml_string=c)
+        c = "" if self.fake else self._request(method).text
+        self.displaytype = self._parse_xml(method, c)["MapEleTyps"]["MapEleTyp"]
+        return method, c
 
-        # 将结果存储到self.data
-        self.displaytype = result["MapEleTyps"]["MapEleTyp"]
+    async def afind_display_biz_ele_typ(self):
+        method = "findDisplayBizEleTyp"
+        c = "" if self.fake else (await self._arequest(method)).text
+        self.displaytype = self._parse_xml(method, c)["MapEleTyps"]["MapEleTyp"]
         return method, c
 
     def find_alarm_typ_list(self):
@@ -196,18 +339,14 @@ class RcmsApi:
         :return: 报警类型列表
         """
         method = "findAlarmTypList"
-        c = ""
-        if self.fake:
-            result = safe_lxml_parse(xml_string=self.fake_data(method))
-        else:
-            url = f"{self.base_url}/{method}"
-            response = self.client.get(url)
-            response.raise_for_status()
-            c = response.text
-            result = safe_lxml_parse(xml_string=c)
+        c = "" if self.fake else self._request(method).text
+        self.alarmtype = self._parse_xml(method, c)["rows"]["row"]
+        return method, c
 
-        # 将结果存储到self.data
-        self.alarmtype = result["rows"]["row"]
+    async def afind_alarm_typ_list(self):
+        method = "findAlarmTypList"
+        c = "" if self.fake else (await self._arequest(method)).text
+        self.alarmtype = self._parse_xml(method, c)["rows"]["row"]
         return method, c
 
     def get_map_data_info(self, map_code: str):
@@ -217,34 +356,44 @@ class RcmsApi:
         :return: 地图数据信息
         """
         method = "getMapDataInfo"
-        c = ""
-        if self.fake:
-            result = safe_lxml_parse(xml_string=self.fake_data(method))
-        else:
-            url = f"{self.base_url}/{method}"
-            data = {"mapCode": map_code}
-            response = self.client.post(url, json=data)
-            response.raise_for_status()
-            c = response.text
-            result = safe_lxml_parse(xml_string=c)
-
-        self.mapdata = result["rows"]["row"]    
+        c = "" if self.fake else self._request(method, json={"mapCode": map_code}).text
+        self.mapdata = self._parse_xml(method, c)["rows"]["row"]
         return method, c
 
+    async def aget_map_data_info(self, map_code: str):
+        method = "getMapDataInfo"
+        c = "" if self.fake else (await self._arequest(method, json={"mapCode": map_code})).text
+        self.mapdata = self._parse_xml(method, c)["rows"]["row"]
+        return method, c
+
+    def _load_line_info(self, method: str, content):
+        """线路接口返回JSON，原样保留供路网构建使用"""
+        if self.fake:
+            path = fake_path / f"{method}.json"
+            if not path.exists():
+                return {}
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return content
+
     def get_line_info(self, map_code: str):
+        """
+        获取地图线路信息（点位之间的连线）
+        :param map_code: 地图代码
+        :return: 线路数据
+        """
         method = "findByElcMapCode"
-        c = ""
-        if self.fake:
-            with open(f"{fake_path}/{method}.json", "r", encoding="utf-8") as f:
-                c = sharemap2json(json.load(f))
-        else:
-            url = f"{self.base_url}/{method}"
-            payload = {"mapCode": map_code}
-            response = self.client.post(url, data=payload)
-            response.raise_for_status()
-            c = sharemap2json(response.json())
-        self.maplinedata = c
-        return method, c
+        content = None if self.fake else self._request(method, data={"mapCode": map_code}).json()
+        self.maplinedata = self._load_line_info(method, content)
+        return method, self.maplinedata
+
+    async def aget_line_info(self, map_code: str):
+        method = "findByElcMapCode"
+        content = None
+        if not self.fake:
+            content = (await self._arequest(method, data={"mapCode": map_code})).json()
+        self.maplinedata = self._load_line_info(method, content)
+        return method, self.maplinedata
 
     def get_share_map_data_info(self, map_code: str, typen: int = 1):
         """
@@ -254,136 +403,331 @@ class RcmsApi:
         :return: 地图数据信息
         """
         method = "getShareMapInfoByMapCode"
-        # c = map_code="DD"
-        if self.fake:
-            with open(f"{fake_path}/{method}.json", "r", encoding="utf-8") as f:
-                c = sharemap2json(json.load(f))
-        else:
-            url = f"{self.base_url}/{method}"
-            data = {"mapCode": map_code, "shareInfos": {"content": "", "type": typen}}
-            response = self.client.post(url, json=data)
-            response.raise_for_status()
-            # print(response.text)
-            c = sharemap2json(response.json())
+        data = {"mapCode": map_code, "shareInfos": {"content": "", "type": typen}}
+        content = None if self.fake else self._request(method, json=data).json()
+        c = self._load_sharemap(method, content)
         self.sharemapdata = c
         self.sharemapdata_dict = safe_lxml_parse(xml_string=c)
         return method, c
 
+    async def aget_share_map_data_info(self, map_code: str, typen: int = 1):
+        method = "getShareMapInfoByMapCode"
+        data = {"mapCode": map_code, "shareInfos": {"content": "", "type": typen}}
+        content = None if self.fake else (await self._arequest(method, json=data)).json()
+        c = self._load_sharemap(method, content)
+        self.sharemapdata = c
+        # 共享地图XML较大，放到线程中解析，避免阻塞其他并发请求
+        self.sharemapdata_dict = await asyncio.to_thread(safe_lxml_parse, xml_string=c)
+        return method, c
+
     def get_rabbit_mq_param(self):
         """
         获取RabbitMQ参数
         :return: RabbitMQ参数
         """
         method = "getRabbitMqParam"
-        c = ""
-        if self.fake:
-            result = safe_lxml_parse(xml_string=self.fake_data(method))
-        else:
-            url = f"{self.base_url}/{method}"
-            response = self.client.get(url)
-            response.raise_for_status()
-            c = response.text
-            result = safe_lxml_parse(xml_string=c)
+        c = "" if self.fake else self._request(method).text
+        self.rabbitmqdata = self._parse_xml(method, c)["result"]
+        return method, c
 
-        # 将结果存储到self.data
-        self.rabbitmqdata = result["result"]
+    async def aget_rabbit_mq_param(self):
+        method = "getRabbitMqParam"
+        c = "" if self.fake else (await self._arequest(method)).text
+        self.rabbitmqdata = self._parse_xml(method, c)["result"]
         return method, c
 
     def auto_set_dynamic_cfg(self):
         """
-        自动设置动态配置，按照API依赖关系调用
+        自动设置动态配置，供同步调用方使用，内部并发执行 aauto_set_dynamic_cfg
         """
-        logger.info("开始自动设置动态配置...")
+        asyncio.run(self._auto_set_dynamic_cfg_and_close())
 
-        # 1. 先获取所有RCS列表
-        logger.info("1. 获取所有RCS列表...")
-        self.find_all_rcs_list()
+    async def _auto_set_dynamic_cfg_and_close(self):
+        try:
+            await self.aauto_set_dynamic_cfg()
+        finally:
+            await self.aclose()
 
-        # 2. 从RCS列表中获取第一个RCS的code
-        if isinstance(self.rcsdata, dict):
-            self.rcsdata = [self.rcsdata]
+    async def aauto_set_dynamic_cfg(self):
+        """
+        自动设置动态配置，按照API依赖关系并发调用
 
-        if self.rcsdata:
+        只有 RCS列表 -> 地图列表 -> 设备列表/地图数据/共享地图 存在依赖，
+        显示类型、报警类型、RabbitMQ参数与之并发获取；
+        指定了 map_code（rcms.map_code）时依赖地图代码的请求也无需等待地图列表。
+        """
+        logger.info("开始自动设置动态配置...")
+        start = time.perf_counter()
+        map_code = self.map_code
+
+        async def map_chain():
+            await self.afind_all_rcs_list()
+            if isinstance(self.rcsdata, dict):
+                self.rcsdata = [self.rcsdata]
+            if not self.rcsdata:
+                return None
             rcs_code = self.rcsdata[0].get("code", "")
             logger.info(f"   使用RCS代码: {rcs_code}")
-
-            # 3. 根据RCS代码获取地图列表
-            logger.info("2. 根据RCS代码获取地图列表...")
-            self.find_map_list_by_rcs_code(rcs_code)
-
-            # 4. 从地图列表中获取第一个地图的code
+            await self.afind_map_list_by_rcs_code(rcs_code)
             if isinstance(self.maplist, dict):
                 self.maplist = [self.maplist]
+            if not self.maplist:
+                return None
+            return self.maplist[0].get("code", "")
+
+        async def map_data(code):
+            logger.info(f"   使用地图代码: {code}")
+            results = await asyncio.gather(
+                self.afind_device_list_by_elc_map_code(code),
+                self.aget_map_data_info(code),
+                self.aget_share_map_data_info(code),
+                self.aget_line_info(code),
+                return_exceptions=True,
+            )
+            # 线路数据只用于路网计算，获取失败不影响其他数据
+            if isinstance(results[3], Exception):
+                logger.warning(f"获取地图线路信息失败: {results[3]}")
+            for result in results[:3]:
+                if isinstance(result, Exception):
+                    raise result
+
+        tasks = [
+            map_chain(),
+            self.afind_display_biz_ele_typ(),
+            self.afind_alarm_typ_list(),
+            self.aget_rabbit_mq_param(),
+        ]
+        if map_code:
+            tasks.append(map_data(map_code))
+        results = await asyncio.gather(*tasks)
+        if not map_code and results[0]:
+            await map_data(results[0])
 
-            if self.maplist:
-                map_code = cfg.get("rcms.map_code") or self.maplist[0].get("code", "")
-                
-                logger.info(f"   使用地图代码: {map_code}")
-
-                # 5. 根据地图代码获取设备列表
-                logger.info("3. 根据地图代码获取设备列表...")
-                self.find_device_list_by_elc_map_code(map_code)
-
-                # 6. 获取地图数据信息
-                logger.info("4. 获取地图数据信息...")
-                self.get_map_data_info(map_code)
-
-        # 7. 获取其他配置信息
-        logger.info("5. 获取显示业务元素类型...")
-        self.find_display_biz_ele_typ()
-
-        logger.info("6. 获取报警类型列表...")
-        self.find_alarm_typ_list()
-
-        logger.info("7. 获取RabbitMQ参数...")
-        self.get_rabbit_mq_param()
-
-        # 8. 获取共享地图数据信息
-        logger.info("8. 获取共享地图数据信息...")
-        self.get_share_map_data_info(map_code)
-
-        logger.info("自动设置动态配置完成！")
+        logger.info(f"自动设置动态配置完成！耗时 {time.perf_counter() - start:.2f}s")
 
-    def build_from_raw(self):
+    def build_from_raw(self) -> list[str]:
         """
         从原始数据构建API对象 并且缓存
         cache_data()
+        :return: 有变化的数据集名称列表
         """
         self.auto_set_dynamic_cfg()
-        self.cache_data()
-
-    def build_from_cache(self):
+        return self.cache_data()
+
+    async def abuild_from_raw(self) -> list[str]:
+        """build_from_raw 的异步版本，供已在事件循环中的调用方使用"""
+        await self.aauto_set_dynamic_cfg()
+        return await asyncio.to_thread(self.cache_data)
+
+    def _snapshot_sources(self) -> dict:
+        """预解析快照依赖的源文件：清单中的哈希 + 文件大小与修改时间
+
+        文件被清单之外的方式改动时（手动替换缓存文件）修改时间会变化，快照随之失效。
+        """
+        sources = {}
+        for name in CACHE_DATASETS + ["sharemapdata"]:
+            digest = self.manifest.get_hash(name)
+            filename = "sharemapdata.xml" if name == "sharemapdata" else f"{name}.json"
+            try:
+                st = (self.current_cache_path / filename).stat()
+            except OSError:
+                sources[name] = None
+                continue
+            sources[name] = [digest, st.st_size, st.st_mtime_ns] if digest else None
+        return sources
+
+    def save_parsed_snapshot(self):
+        """将已解析的数据集写成单个快照文件，记录生成时的源文件哈希"""
+        sources = self._snapshot_sources()
+        if not all(sources.values()):
+            return False
+        snapshot = {
+            "version": PARSED_SNAPSHOT_VERSION,
+            "sources": sources,
+            "data": {name: getattr(self, name) for name in CACHE_DATASETS},
+            "sharemapdata": self.sharemapdata,
+        }
+        atomic_write(self.current_cache_path / PARSED_SNAPSHOT, orjson.dumps(snapshot))
+        return True
+
+    def _load_parsed_snapshot(self) -> bool:
+        """源文件哈希与清单一致时，一次读取恢复全部数据集"""
+        path = self.current_cache_path / PARSED_SNAPSHOT
+        if not path.exists():
+            return False
+        try:
+            with open(path, "rb") as f:
+                snapshot = orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError) as e:
+            logger.warning(f"预解析快照读取失败: {e}")
+            return False
+        sources = self._snapshot_sources()
+        if (
+            snapshot.get("version") != PARSED_SNAPSHOT_VERSION
+            or not all(sources.values())
+            or snapshot.get("sources") != sources
+        ):
+            return False
+        for name, value in snapshot["data"].items():
+            setattr(self, name, value)
+        self.sharemapdata = snapshot["sharemapdata"]
+        return True
+
+    @staticmethod
+    def _dataset_file(name: str) -> str:
+        return "sharemapdata.xml" if name == "sharemapdata" else f"{name}.json"
+
+    def _load_dataset(self, name: str):
+        """从缓存文件加载单个数据集，记录耗时与文件大小，返回加载的数据"""
+        with self._dataset_lock:
+            if name in self._datasets:
+                return self._datasets[name]
+            start = time.perf_counter()
+            path = self.current_cache_path / self._dataset_file(name)
+            xml_path = self.current_cache_path / "sharemapdata.xml"
+            size = 0
+            if name == "sharemapdata_dict" and not path.exists() and xml_path.exists():
+                value = safe_lxml_parse(xml_string=self.sharemapdata)
+                size = xml_path.stat().st_size
+            elif not path.exists():
+                if name not in OPTIONAL_DATASETS:
+                    logger.warning(f"缓存文件不存在: {path}")
+                value = getattr(type(self), name).default_factory()
+            else:
+                with open(path, "rb") as f:
+                    raw = f.read()
+                size = len(raw)
+                value = raw.decode("utf-8") if name == "sharemapdata" else orjson.loads(raw)
+            self._datasets[name] = value
+            self._dataset_version[name] = next(_dataset_versions)
+            self._released.discard(name)
+            self._dataset_stats[name] = {
+                "load_ms": round((time.perf_counter() - start) * 1000, 2),
+                "file_size": size,
+                "loaded_at": time.time(),
+            }
+            return value
+
+    def dataset_version(self, name: str) -> int:
+        """内存中数据集的版本号，重新赋值或重新加载后变化，用作派生对象的缓存键"""
+        getattr(self, name)
+        return self._dataset_version.get(name, 0)
+
+    def dataset_stats(self) -> dict:
+        """各数据集是否已加载、加载耗时、缓存文件大小、距上次访问时间，以及进程常驻内存"""
+        now = time.monotonic()
+        stats = {}
+        for name in CACHE_DATASETS + OPTIONAL_DATASETS + ["sharemapdata"]:
+            stat = self._dataset_stats.get(name, {})
+            last_access = self._dataset_access.get(name)
+            stats[name] = {
+                "loaded": name in self._datasets,
+                "released": name in self._released,
+                "load_ms": stat.get("load_ms"),
+                "file_size": stat.get("file_size"),
+                "idle_seconds": round(now - last_access, 1) if last_access else None,
+            }
+        return {"lazy": self._lazy, "rss_mb": process_rss_mb(), "datasets": stats}
+
+    def release(self, names: list[str] | None = None, idle_seconds: float = 0) -> list[str]:
+        """
+        释放数据集内存，下次访问时从缓存文件重新加载
+        :param names: 要释放的数据集，默认全部
+        :param idle_seconds: 只释放超过该时间未访问的数据集
+        :return: 已释放的数据集
+        """
+        now = time.monotonic()
+        released = []
+        with self._dataset_lock:
+            for name in names or CACHE_DATASETS + OPTIONAL_DATASETS + ["sharemapdata"]:
+                if name not in self._datasets:
+                    continue
+                path = self.current_cache_path / self._dataset_file(name)
+                # 没有缓存文件的数据集释放后无法恢复
+                if not path.exists() and name != "sharemapdata_dict":
+                    continue
+                if idle_seconds and now - self._dataset_access.get(name, 0) < idle_seconds:
+                    continue
+                del self._datasets[name]
+                self._released.add(name)
+                released.append(name)
+            if "sharemapdata" in released:
+                self._share_map_version = None
+        return released
+
+    def release_idle(self, idle_seconds: float, rss_limit_mb: float = 0, min_idle: float = 60) -> list[str]:
+        """
+        后台定期调用：释放超过 idle_seconds 未访问的数据集；
+        进程常驻内存超过 rss_limit_mb 时，释放超过 min_idle 未访问的全部数据集
+        """
+        rss = process_rss_mb() if rss_limit_mb else None
+        if rss is not None and rss > rss_limit_mb:
+            idle_seconds = min(idle_seconds, min_idle) if idle_seconds else min_idle
+        elif not idle_seconds:
+            return []
+        released = self.release(idle_seconds=idle_seconds)
+        if released:
+            logger.info(f"释放空闲数据集 {released}，进程内存 {rss if rss is not None else process_rss_mb()} MB")
+        return released
+
+    def build_from_cache(self, lazy: bool = False):
         """
         从缓存数据构建API对象
-        """
+
+        优先读取预解析快照（一次读取，无XML解析），
+        快照缺失或源文件哈希不一致时逐个读取缓存文件并重建快照。
+        :param lazy: 只检查缓存文件，数据集在首次访问时加载
+        """
+        if lazy:
+            with self._dataset_lock:
+                self._datasets.clear()
+                self._released.clear()
+                self._lazy = True
+            retmsg = []
+            for name in CACHE_DATASETS + ["sharemapdata"]:
+                path = self.current_cache_path / self._dataset_file(name)
+                if not path.exists():
+                    retmsg.append(f"缓存文件不存在: {path}")
+            return retmsg
+        self._lazy = False
+        self._released.clear()
+        if self._load_parsed_snapshot():
+            return []
         retmsg = []
+        map_data_path = self.current_cache_path / "sharemapdata.xml"
         # logger.info(f"从缓存目录 {self.current_cache_path} 加载数据...")
-        for d in [
-            "rcsdata",
-            "maplist",
-            "devicelist",
-            "displaytype",
-            "alarmtype",
-            "rabbitmqdata",
-            "mapdata",
-            "sharemapdata_dict",
-        ]:
+        for d in CACHE_DATASETS:
+            # sharemapdata_dict 由 sharemapdata.xml 解析得到，XML存在时不重复读取
+            if d == "sharemapdata_dict" and map_data_path.exists():
+                continue
             file_path = self.current_cache_path / f"{d}.json"
             if not file_path.exists():
                 logger.warning(f"缓存文件不存在: {file_path}")
                 retmsg.append(f"缓存文件不存在: {file_path}")
                 continue
 
-            with open(file_path, "r", encoding="utf-8") as f:
-                setattr(self, d, json.load(f))
-        map_data_path = self.current_cache_path / "sharemapdata.xml"
+            with open(file_path, "rb") as f:
+                raw = f.read()
+            setattr(self, d, orjson.loads(raw))
+            if not self.manifest.get_hash(d):
+                self.manifest.record(d, f"{d}.json", raw)
         if map_data_path.exists():
-            with open(map_data_path, "r", encoding="utf-8") as f:
-                self.sharemapdata = f.read()
-                self.sharemapdata_dict = safe_lxml_parse(xml_string=self.sharemapdata)
+            with open(map_data_path, "rb") as f:
+                raw = f.read()
+            self.sharemapdata = raw.decode("utf-8")
+            self.sharemapdata_dict = safe_lxml_parse(xml_string=self.sharemapdata)
+            if not self.manifest.get_hash("sharemapdata"):
+                self.manifest.record("sharemapdata", "sharemapdata.xml", raw)
+            dict_path = self.current_cache_path / "sharemapdata_dict.json"
+            if not self.manifest.get_hash("sharemapdata_dict") and dict_path.exists():
+                with open(dict_path, "rb") as f:
+                    self.manifest.record("sharemapdata_dict", "sharemapdata_dict.json", f.read())
         else:
             logger.warning(f"地图数据缓存文件不存在: {map_data_path}")
             retmsg.append(f"地图数据缓存文件不存在: {map_data_path}")
+        if not retmsg:
+            self.manifest.commit([])
+            self.save_parsed_snapshot()
         # logger.info("从缓存数据构建API对象完成！")
         return retmsg
 
@@ -419,13 +763,23 @@ class RcmsApi:
                 f.write(content)
                 logger.info(f"已生成模拟数据: {n}")
 
-    def genmapimage(self):
+    def genmapimage(self, force: bool = False):
         """
-        生成地图图片
+        生成地图图片，共享地图数据未变化且图片已存在时跳过
+        :param force: 忽略缓存清单强制重新生成
         """
+        png_path = self.current_cache_path / "map_image.png"
+        svg_path = self.current_cache_path / "map_image.svg"
+        # 按内存中的共享地图判断与记录，清单可能已被其他进程更新
+        inputs = {"sharemapdata": self.share_map_version()}
+        if not force and not self.manifest.needs_rebuild(
+            "map_image", inputs, [png_path, svg_path]
+        ):
+            logger.info("共享地图数据未变化，跳过生成地图图片")
+            return False
         try:
-            # Parse the XML content
-            json_result = parse_ShareMapInfo(self.sharemapdata)
+            # 直接解析为结构化数组，PNG与SVG共用
+            arrays = self.share_map_arrays()
             logger.info("Parse successful!")
 
             # Generate and save both PNG and SVG images
@@ -433,9 +787,11 @@ class RcmsApi:
 
             # Generate PNG image
             map_image = generate_map_image(
-                json_result, desired_width=1600, show_labels=True
+                arrays,
+                desired_width=1600,
+                show_labels=True,
+                supersample=cfg.get("map.supersample") or 1,
             )
-            png_path = self.current_cache_path / "map_image.png"
             map_image.save(png_path)
             logger.info(f"PNG image saved to {png_path}")
             logger.info(
@@ -443,20 +799,169 @@ class RcmsApi:
             )
 
             # Generate SVG image
-            svg_path = self.current_cache_path / "map_image.svg"
             map_image = generate_map_image(
-                json_result,
+                arrays,
                 desired_width=1600,
                 show_labels=True,
                 export_svg=True,
                 svg_filename=svg_path,
             )
+            self.manifest.mark_built("map_image", inputs)
+            return True
 
         except Exception as e:
             logger.error(f"Error: {e}")
             import traceback
 
             traceback.print_exc()
+            return False
+
+    def share_map_version(self) -> str | None:
+        """
+        内存中共享地图的内容哈希，无共享地图数据时返回None
+
+        按内存中的数据计算（每次赋值/加载只计算一次），不使用清单中的哈希：
+        清单可能已被其他进程更新，而派生对象仍由内存中的数据生成。
+        """
+        data = self.sharemapdata
+        if not data:
+            return None
+        memo = self._share_map_version
+        # 保留数据引用，对象相同即内容相同
+        if memo is None or memo[0] is not data:
+            memo = self._share_map_version = (data, content_hash(data.encode("utf-8")))
+        return memo[1]
+
+    def _map_cached(self, key: str, version: str, factory):
+        """按共享地图版本缓存派生对象，版本变化时重新创建"""
+        entry = self._map_cache.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        with self._map_lock:
+            entry = self._map_cache.get(key)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+            value = factory()
+            self._map_cache[key] = (version, value)
+            return value
+
+    def share_map_arrays(self) -> dict | None:
+        """共享地图结构化数组，见 parse_share_map_arrays"""
+        version = self.share_map_version()
+        if version is None:
+            return None
+        return self._map_cached(
+            "arrays", version, lambda: parse_share_map_arrays(self.sharemapdata)
+        )
+
+    def share_map_json(self) -> tuple[str, bytes] | None:
+        """
+        共享地图原始结构(safe_lxml_parse)的JSON，按共享地图版本只序列化一次
+        :return: (ETag, JSON字节)，无共享地图数据时返回None
+        """
+        version = self.share_map_version()
+        if version is None:
+            return None
+        return self._map_cached(
+            "json",
+            version,
+            lambda: (
+                f'"{version[:16]}-raw"',
+                orjson.dumps(safe_lxml_parse(xml_string=self.sharemapdata)),
+            ),
+        )
+
+    def share_map_vector(self, tolerance: float = 0.0) -> tuple[str, bytes] | None:
+        """
+        共享地图紧凑矢量格式的JSON，见 compact_share_map
+        :param tolerance: 多边形化简容差(mm)，取配置 map.vector_tolerances 中不大于该值的最大档位，
+                          每个档位按共享地图版本只计算和序列化一次
+        :return: (ETag, JSON字节)，无共享地图数据时返回None
+        """
+        version = self.share_map_version()
+        if version is None:
+            return None
+        levels = sorted(cfg.get("map.vector_tolerances") or [0])
+        tolerance = max([t for t in levels if t <= tolerance] or [0])
+        quantum = cfg.get("map.vector_quantum") or 10
+
+        def build():
+            payload = compact_share_map(self.share_map_arrays(), version, tolerance, quantum)
+            logger.info(f"共享地图矢量数据 容差{tolerance}mm: {payload['stats']}")
+            return f'"{version[:16]}-v{tolerance}-{quantum}"', orjson.dumps(payload)
+
+        return self._map_cached(f"vector:{tolerance}", version, build)
+
+    def map_tiler(self) -> MapTiler | None:
+        """
+        共享地图瓦片生成器，按共享地图内容哈希缓存，数据变化后重建并清理旧版本瓦片
+        :return: 无共享地图数据时返回None
+        """
+        version = self.share_map_version()
+        if version is None:
+            return None
+
+        def build():
+            tiler = MapTiler(
+                self.share_map_arrays(),
+                version,
+                self.current_cache_path / "tiles",
+                max_zoom=cfg.get("map.tile_max_zoom") or None,
+                min_resolution=cfg.get("map.tile_min_resolution") or 5.0,
+            )
+            tiler.purge_old_versions()
+            logger.info(f"地图瓦片版本 {version[:16]}，最大缩放级别 {tiler.max_zoom}")
+            return tiler
+
+        return self._map_cached("tiler", version, build)
+
+    def fleet_overlay(self, show_paths: bool = True) -> FleetOverlay | None:
+        """
+        机器人实时叠加图，底图为 genmapimage 生成的地图图片（未变化时不重新生成）
+        :param show_paths: 是否绘制机器人路径
+        :return: 无共享地图数据时返回None
+        """
+        version = self.share_map_version()
+        if version is None:
+            return None
+
+        def build():
+            png_path = self.current_cache_path / "map_image.png"
+            self.genmapimage()
+            with Image.open(png_path) as base:
+                return FleetOverlay(
+                    base,
+                    map_bounds(self.share_map_arrays()),
+                    version,
+                    icon_size=cfg.get("map.live_icon_size") or 30,
+                    show_paths=show_paths,
+                )
+
+        return self._map_cached(f"overlay:{show_paths}", version, build)
+
+    def fleet_heatmap(self) -> FleetHeatmap | None:
+        """
+        车队占用/拥堵热力图，网格与共享地图范围对齐，按共享地图内容哈希缓存；
+        创建时从缓存目录的 heatmap.npz 恢复（地图未变化时）
+        :return: 无共享地图数据时返回None
+        """
+        version = self.share_map_version()
+        if version is None:
+            return None
+
+        def build():
+            index = CellIndex(self.mapdata)
+            heatmap = FleetHeatmap(
+                map_bounds(self.share_map_arrays()),
+                cell_size=cfg.get("map.heatmap_cell_size") or 1000,
+                half_life=cfg.get("map.heatmap_half_life") or 1800,
+                resolve=index.resolve,
+            )
+            heatmap.load(self.current_cache_path / "heatmap.npz")
+            logger.info(f"热力图网格 {heatmap.nx}x{heatmap.ny}，格子 {heatmap.cell_size:.0f}mm")
+            return heatmap
+
+        return self._map_cached("heatmap", version, build)
 
 
 if __name__ == "__main__":
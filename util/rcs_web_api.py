@@ -1,14 +1,18 @@
-import functools
+import asyncio
 import json
 import logging
+import math
 import os
 import pathlib
+import time
 from datetime import datetime, timedelta
 from hashlib import md5, sha256
 
 import httpx
 
+from util.cache_manifest import get_manifest
 from util.config import cfg
+from util.port_directory import PortDirectory
 
 logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger()
@@ -17,8 +21,97 @@ if not cache_path.exists():
     cache_path.mkdir()
 
 
+# 查询类接口的默认缓存时间(秒)，可用 [rcms.web_cache_ttl] 按接口覆盖，0为不缓存
+CACHE_TTL = {
+    "/transTask/findListWithPages.action": 2.0,
+    "/transTask/findSubTasksDetail.action": 2.0,
+    "/agvQuery/getAgvStatus.action": 1.0,
+    "/agvQuery/findAllAgv.action": 10.0,
+    "/wcsTaskState/findTaskState.action": 2.0,
+}
+_TASK_QUERIES = (
+    "/transTask/findListWithPages.action",
+    "/transTask/findSubTasksDetail.action",
+)
+_AGV_QUERIES = ("/agvQuery/getAgvStatus.action", "/agvQuery/findAllAgv.action")
+# 控制类接口执行后需要失效的查询缓存
+CACHE_INVALIDATES = {
+    "/transTask/cancelTransTasks.action": _TASK_QUERIES + _AGV_QUERIES,
+    "/taskDispatch/cancelTask.action": _TASK_QUERIES + _AGV_QUERIES,
+    "/taskDispatch/resumeAction.action": _TASK_QUERIES + _AGV_QUERIES,
+    "/agvControl/freeRobot.action": _TASK_QUERIES + _AGV_QUERIES,
+    "/agvControl/stopResumeOffline.action": _AGV_QUERIES,
+}
+# 批量操作：操作名 -> (方法名, 单个编号对应的参数名)
+BULK_OPS = {
+    "cancel_trans_tasks": ("cancel_trans_tasks", "trans_task_nums"),
+    "forceCancelTask": ("forceCancelTask", "trans_task_nums"),
+    "resumeAction": ("resumeAction", "agvcode"),
+    "freeagv": ("freeagv", "agvcode"),
+}
+
+
+def op_succeeded(d) -> bool:
+    """RCS控制类接口是否执行成功（各接口返回格式不同：success/code/_error）"""
+    if not isinstance(d, dict) or d.get("_error") or d.get("success") is False:
+        return False
+    code = d.get("code")
+    return code is None or str(code) in ("0", "200")
+
+
+class CmsIndexMapBuilder:
+    """按端口数据增量生成 cmsindexmap：{设备类型: {设备名: cmsIndex前4位+"00"}}
+
+    同一设备名以最先出现的端口为准，行按原顺序加入时结果与一次性生成相同。
+    """
+
+    # bufferPort: 分组 -> type
+    BUFFER_TYPES = {"BUFFER": "1", "CV": "2", "NO_POWER_BUFFER": "3", "S_CV": "8", "VS": "9"}
+    # machinePort: 分组 -> (type, 设备名提取函数)
+    MACHINE_TYPES = {
+        "EQ": (
+            "1",
+            lambda o: (o.get("eqName", "")[:8] + (o.get("carrierLoc", "")[-1:] or "")),
+        ),
+        "PODEQ": ("4", lambda o: o.get("port", "")),
+        "STK": ("3", lambda o: o.get("eqName", "")),
+    }
+
+    def __init__(self):
+        self.groups = {key: {} for key in [*self.BUFFER_TYPES, *self.MACHINE_TYPES]}
+        self._buffer_keys = {v: k for k, v in self.BUFFER_TYPES.items()}
+        self._machine_keys = {v[0]: (k, v[1]) for k, v in self.MACHINE_TYPES.items()}
+
+    def add_buffer_rows(self, rows: list[dict]):
+        for one in rows:
+            type_val = one.get("type")
+            key = self._buffer_keys.get(type_val)
+            if key is None:
+                continue
+            name = one.get("port")[:4] if type_val == "1" else one.get("port")
+            self.groups[key].setdefault(name, one.get("cmsIndex", "")[:4] + "00")
+
+    def add_machine_rows(self, rows: list[dict]):
+        for one in rows:
+            entry = self._machine_keys.get(one.get("type"))
+            if entry is None:
+                continue
+            key, name_fn = entry
+            self.groups[key].setdefault(name_fn(one), one.get("cmsIndex", "")[:4] + "00")
+
+    def result(self) -> dict:
+        return self.groups
+
+
 class RcsWebApi:
-    """RCS Web API客户端类，用于与RCS系统进行交互"""
+    """RCS Web API客户端类，用于与RCS系统进行交互
+
+    每个RCS一个长连接客户端（连接池大小 rcms.web_pool_size），登录会话在实例内复用：
+    记录会话过期时间，过期前主动重新登录；并发请求遇到会话失效时只由一个请求重新登录，
+    其他请求等待后使用新会话重试。
+    """
+
+    USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36"
 
     def __init__(self, base_url=None, username=None, password=None):
         self.base_url = base_url or cfg.get_with_reload("rcms.host") + "/rcms/web"
@@ -26,29 +119,125 @@ class RcsWebApi:
         self.password = password or cfg.get_with_reload("rcms.password")
         self.client = None
         self.cookies = None
+        self._loop = None
+        self._login_lock = None
+        # 会话代数：每次登录加1，请求据此判断失效的会话是否已被其他请求刷新
+        self._session_gen = 0
+        self.session_expires_at = 0.0
+        self.session_ttl = cfg.get("rcms.web_session_ttl") or 1800
+        self.stats = {
+            "requests": 0,
+            "logins": 0,
+            "relogins": 0,
+            "login_waits": 0,
+            "cache_hits": 0,
+            "coalesced": 0,
+        }
+        # 查询缓存 {键: (过期时间, 结果)}，进行中的相同请求 {键: Task}
+        self._cache: dict[tuple, tuple[float, dict]] = {}
+        self._inflight: dict[tuple, asyncio.Task] = {}
+        # 每个接口的失效代数，请求期间被失效的结果不写入缓存
+        self._cache_gen: dict[str, int] = {}
+        self.cache_ttl = {**CACHE_TTL, **(cfg.get("rcms.web_cache_ttl") or {})}
+        self.cache_max_entries = cfg.get("rcms.web_cache_max_entries") or 512
         self.current_cache_path = cache_path / (
-            cfg.get("rcms.host").split("://")[1].replace(".", "_").replace(":", "-")
+            self.base_url.split("://")[1].split("/")[0].replace(".", "_").replace(":", "-")
         )
+        self.current_cache_path.mkdir(parents=True, exist_ok=True)
+        self.manifest = get_manifest(self.current_cache_path)
+        self.ports = PortDirectory(self.current_cache_path, self.manifest)
+        # (端口目录构建时间, 设备类型选项)
+        self._device_type_options: tuple[float, dict] | None = None
 
     async def __aenter__(self):
-        self._init_client()
+        self._ensure_client()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.client:
+        # 命令行等一次性使用时随 async with 关闭；Web服务中各现场的长连接实例不使用 async with
+        await self.aclose()
+
+    async def aclose(self):
+        """关闭客户端与连接池，会话失效"""
+        if self.client is not None and not self.client.is_closed:
             await self.client.aclose()
-            self.client = None
+        self.client = None
+        self.session_expires_at = 0.0
 
     def _init_client(self):
-        """创建httpx客户端（含默认headers）"""
+        """创建httpx客户端（含默认headers与连接池）"""
+        pool_size = cfg.get("rcms.web_pool_size") or 10
         self.client = httpx.AsyncClient(
             headers={
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36",
+                "User-Agent": self.USER_AGENT,
                 "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
             },
             cookies={"same": "agvmon"},
             verify=False,
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=cfg.get("rcms.web_keepalive_expiry") or 30,
+            ),
         )
+        self._login_lock = asyncio.Lock()
+        self.session_expires_at = 0.0
+        # 进行中的请求属于旧事件循环
+        self._inflight = {}
+
+    def _ensure_client(self) -> httpx.AsyncClient:
+        """获取客户端，未创建、已关闭或事件循环变化时重建（会话随之失效）"""
+        loop = asyncio.get_running_loop()
+        if self.client is None or self.client.is_closed or self._loop is not loop:
+            self._init_client()
+            self._loop = loop
+        return self.client
+
+    def _session_valid(self) -> bool:
+        return self.cookies is not None and time.monotonic() < self.session_expires_at
+
+    def _touch_session(self):
+        """会话按空闲超时计算，每次成功请求后顺延；Cookie自带过期时间时取较早者"""
+        expires = time.monotonic() + self.session_ttl
+        cookie_expires = [c.expires for c in self.client.cookies.jar if c.expires]
+        if cookie_expires:
+            expires = min(expires, time.monotonic() + min(cookie_expires) - time.time())
+        self.session_expires_at = expires
+
+    async def _relogin(self, stale_gen: int):
+        """
+        单飞重新登录：等待登录锁后，若会话代数已变化说明其他请求已完成登录，直接返回
+        """
+        if self._login_lock.locked():
+            self.stats["login_waits"] += 1
+        async with self._login_lock:
+            if self._session_gen != stale_gen:
+                return
+            if stale_gen:
+                self.stats["relogins"] += 1
+            await self.login(self.username, self.password)
+
+    def invalidate(self, *endpoints: str):
+        """失效指定接口的查询缓存，不传参数时清空全部"""
+        if endpoints:
+            targets = set(endpoints)
+        else:
+            targets = {key[0] for key in self._cache} | {key[0] for key in self._inflight}
+        for endpoint in targets:
+            self._cache_gen[endpoint] = self._cache_gen.get(endpoint, 0) + 1
+        self._cache = {k: v for k, v in self._cache.items() if k[0] not in targets}
+        # 进行中的旧请求继续完成，但新的调用方不再复用它
+        self._inflight = {k: v for k, v in self._inflight.items() if k[0] not in targets}
+
+    def _store(self, key: tuple, ttl: float, result: dict):
+        if len(self._cache) >= self.cache_max_entries:
+            now = time.monotonic()
+            self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+            # 仍然超出时按插入顺序淘汰最早的一半
+            if len(self._cache) >= self.cache_max_entries:
+                keep = list(self._cache.items())[len(self._cache) // 2 :]
+                self._cache = dict(keep)
+        self._cache[key] = (time.monotonic() + ttl, result)
 
     async def _request(
         self,
@@ -59,25 +248,88 @@ class RcsWebApi:
         timeout: int = 10,
         retry_on_empty: bool = True,
         extra_headers: dict = None,
+        use_cache: bool = True,
     ) -> dict:
         """
         统一POST请求，自动处理headers、cookies、登录过期重试、JSON解析。
 
+        查询类接口(CACHE_TTL)按 接口+规范化参数 缓存，相同参数的并发请求合并为一次；
+        缓存结果由多个调用方共享，调用方不应修改返回的dict。
+        控制类接口(CACHE_INVALIDATES)执行后失效相关查询缓存。
+
         返回dict，HTTP/解析错误时包含 _error=True 标记，调用方可据此判断。
         """
+        ttl = self.cache_ttl.get(endpoint, 0) if use_cache else 0
+        if not ttl:
+            try:
+                return await self._send(
+                    endpoint, data, json_data, content_type, timeout, retry_on_empty, extra_headers
+                )
+            finally:
+                if endpoint in CACHE_INVALIDATES:
+                    self.invalidate(*CACHE_INVALIDATES[endpoint])
+
+        key = (
+            endpoint,
+            json.dumps(data, sort_keys=True, default=str),
+            json.dumps(json_data, sort_keys=True, default=str),
+        )
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            self.stats["cache_hits"] += 1
+            return cached[1]
+
+        task = self._inflight.get(key)
+        if task is None:
+            gen = self._cache_gen.get(endpoint, 0)
+
+            async def fetch():
+                try:
+                    result = await self._send(
+                        endpoint, data, json_data, content_type, timeout, retry_on_empty, extra_headers
+                    )
+                    if not result.get("_error") and self._cache_gen.get(endpoint, 0) == gen:
+                        self._store(key, ttl, result)
+                    return result
+                finally:
+                    if self._inflight.get(key) is task:
+                        del self._inflight[key]
+
+            task = asyncio.ensure_future(fetch())
+            self._inflight[key] = task
+        else:
+            self.stats["coalesced"] += 1
+        # shield: 某个调用方被取消时不影响共享同一请求的其他调用方
+        return await asyncio.shield(task)
+
+    async def _send(
+        self,
+        endpoint: str,
+        data: dict = None,
+        json_data: dict = None,
+        content_type: str = "application/x-www-form-urlencoded; charset=UTF-8",
+        timeout: int = 10,
+        retry_on_empty: bool = True,
+        extra_headers: dict = None,
+    ) -> dict:
+        """实际发送请求，会话失效时单飞重新登录后重试一次"""
+        client = self._ensure_client()
         url = self.base_url + endpoint
+        # 请求头按请求传入，不修改共享客户端的默认头，避免并发请求互相影响
         headers = {"Content-Type": content_type}
         if extra_headers:
             headers.update(extra_headers)
-        self.client.headers.update(headers)
-        self.client.cookies = self.cookies
-        resp = await self.client.post(url, data=data, json=json_data, timeout=timeout)
+        if not self._session_valid():
+            await self._relogin(self._session_gen)
+        gen = self._session_gen
+        self.stats["requests"] += 1
+        resp = await client.post(url, data=data, json=json_data, headers=headers, timeout=timeout)
 
+        # 会话失效时RCS返回空响应
         if not resp.text and retry_on_empty:
-            await self.login(self.username, self.password)
-            self.client.cookies = self.cookies
-            resp = await self.client.post(
-                url, data=data, json=json_data, timeout=timeout
+            await self._relogin(gen)
+            resp = await client.post(
+                url, data=data, json=json_data, headers=headers, timeout=timeout
             )
 
         if resp.status_code != 200:
@@ -88,17 +340,19 @@ class RcsWebApi:
             }
 
         try:
-            return resp.json()
+            result = resp.json()
         except Exception:
             return {
                 "success": False,
                 "_error": True,
                 "msg": f"解析响应失败，状态码：{resp.status_code}，响应内容：{resp.text}",
             }
+        self._touch_session()
+        return result
 
     async def login(self, username, password, pwd_safe_level="3"):
-        """登录RCS系统"""
-        self._init_client()
+        """登录RCS系统，登录成功后的会话由后续请求复用"""
+        client = self._ensure_client()
         if not username or not password:
             raise Exception("用户名和密码不能为空")
 
@@ -114,7 +368,12 @@ class RcsWebApi:
             "ecsPassword": pwd,
             "pwdSafeLevelLogin": pwd_safe_level,
         }
-        response = await self.client.post(
+        # 丢弃旧会话的Cookie
+        client.cookies.clear()
+        client.cookies.set("same", "agvmon")
+        self.cookies = None
+        self.stats["logins"] += 1
+        response = await client.post(
             self.base_url + "/login/login.action",
             data=data,
             cookies={
@@ -124,15 +383,31 @@ class RcsWebApi:
             timeout=10,
         )
         logger.info(f"登录rcs2000 web:{response.text}")
-        self.cookies = self.client.cookies
         if response.status_code != 200:
             raise Exception(
                 f"登录失败，状态码：{response.status_code}，响应内容：{response.text}"
             )
         if not response.json().get("success"):
             raise Exception(f"登录失败，响应内容：{response.json()}")
+        self.cookies = client.cookies
+        self._session_gen += 1
+        self._touch_session()
         return response.json()
 
+    def session_info(self) -> dict:
+        """会话与连接池状态"""
+        return {
+            "base_url": self.base_url,
+            "connected": self.client is not None and not self.client.is_closed,
+            "logged_in": self._session_valid(),
+            "expires_in": round(max(self.session_expires_at - time.monotonic(), 0), 1),
+            "session_gen": self._session_gen,
+            "pool_size": cfg.get("rcms.web_pool_size") or 10,
+            "cache_entries": len(self._cache),
+            "inflight": len(self._inflight),
+            **self.stats,
+        }
+
     async def find_tasks_detail(
         self,
         robotCode="",
@@ -181,10 +456,11 @@ class RcsWebApi:
             "limit": limit,
             "showHisData": False,
         }
-        self.client.headers.update(
-            {"accept": "application/json, text/javascript, */*; q=0.01"}
+        d = await self._request(
+            "/transTask/findListWithPages.action",
+            data=data,
+            extra_headers={"accept": "application/json, text/javascript, */*; q=0.01"},
         )
-        d = await self._request("/transTask/findListWithPages.action", data=data)
         if not d.get("success"):
             raise Exception(f"查询任务详情失败，响应内容：{d}")
         return d
@@ -266,7 +542,7 @@ class RcsWebApi:
             },
         )
         if not d.get("_error"):
-            print(d)
+            logger.info(f"取消任务 {trans_task_nums}: {d}")
         return d
 
     async def forceCancelTask(self, trans_task_nums: str):
@@ -280,8 +556,6 @@ class RcsWebApi:
                 "Referer": self.base_url + "/taskDispatch/cms_index.action",
             },
         )
-        self.client.headers.update({"X-Requested-With": ""})
-        print(self.client.cookies)
         return d
 
     async def resumeAction(self, agvcode: str):
@@ -293,7 +567,7 @@ class RcsWebApi:
             extra_headers={"X-Requested-With": "XMLHttpRequest"},
         )
         if not d.get("_error"):
-            print(d)
+            logger.info(f"恢复AGV {agvcode}: {d}")
         return d
 
     async def freeagv(self, agvcode: str):
@@ -308,6 +582,55 @@ class RcsWebApi:
             },
         )
 
+    async def bulk(self, op: str, items: list[str], concurrency: int | None = None, **kwargs):
+        """
+        批量执行控制操作，最多 concurrency 个同时请求，按完成顺序逐个产出结果
+
+        迭代中途停止（如客户端断开）时，尚未开始的操作不再执行。
+
+        Args:
+            op: BULK_OPS 中的操作名
+            items: 任务号或AGV编号列表，去重并去掉空值
+            concurrency: 并发数，默认 rcms.bulk_concurrency
+            kwargs: 传给操作方法的其他参数（如 cancel_type）
+
+        Yields:
+            dict: index, item, success, message, elapsed, data
+        """
+        if op not in BULK_OPS:
+            raise ValueError(f"不支持的批量操作: {op}，可选 {', '.join(BULK_OPS)}")
+        method, arg = BULK_OPS[op]
+        func = getattr(self, method)
+        items = list(dict.fromkeys(str(x).strip() for x in items if str(x).strip()))
+        concurrency = max(int(concurrency or cfg.get("rcms.bulk_concurrency") or 8), 1)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(index: int, item: str) -> dict:
+            async with semaphore:
+                started = time.monotonic()
+                try:
+                    d = await func(**{arg: item}, **kwargs)
+                    ok = op_succeeded(d)
+                    message = (d.get("msg") or d.get("message") or "") if isinstance(d, dict) else ""
+                except Exception as e:
+                    d, ok, message = None, False, str(e) or repr(e)
+            return {
+                "index": index,
+                "item": item,
+                "success": ok,
+                "message": message,
+                "elapsed": round(time.monotonic() - started, 3),
+                "data": d,
+            }
+
+        tasks = [asyncio.ensure_future(run(i, item)) for i, item in enumerate(items)]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                yield await fut
+        finally:
+            for t in tasks:
+                t.cancel()
+
     async def findAllAgv(self):
         """查询所有AGV"""
         return await self._request(
@@ -349,7 +672,6 @@ class RcsWebApi:
     async def saveagvinfo(self):
         """缓存AGV信息到本地文件"""
         file_path = self.current_cache_path / "agvinfo.json"
-        await self.login(username=self.username, password=self.password)
         logger.info("开始缓存AGV信息")
         d = await self.findAllAgv()
         with open(file_path, "w", encoding="utf-8") as f:
@@ -370,14 +692,12 @@ class RcsWebApi:
         buforeq="bufferPort",
         cache=False,
     ):
-        """查询端口（bufferPort/machinePort），支持缓存到本地"""
+        """查询端口（bufferPort/machinePort），cache=True 时分页取全部端口并缓存到本地"""
         if buforeq not in ("bufferPort", "machinePort"):
             return {"success": False, "msg": "未知类型bufferPort / machinePort"}
 
         if cache:
-            start, limit = 1, 1000
-            port = mapDataCode = cmsIndex = carrierId = carrierLoc = ""
-            type = upDown = -1
+            return await self.fetch_all_ports(buforeq)
 
         data = {
             "start": start,
@@ -392,95 +712,198 @@ class RcsWebApi:
         if buforeq == "bufferPort":
             data["upDown"] = upDown
 
-        d = await self._request(f"/{buforeq}/findListWithPages.action", data=data)
+        return await self._request(f"/{buforeq}/findListWithPages.action", data=data)
 
-        if not d.get("_error") and cache:
-            file_path = self.current_cache_path / f"{buforeq}.json"
-            file_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(file_path, "w") as f:
-                json.dump(d, f, ensure_ascii=False, indent=2)
-            logger.info(f"{buforeq}缓存成功，路径：{file_path}")
+    async def fetch_all_ports(
+        self,
+        buforeq: str,
+        page_size: int | None = None,
+        concurrency: int | None = None,
+        on_rows=None,
+    ) -> dict:
+        """
+        分页读取全部端口并流式写入缓存文件 {buforeq}.json
 
-        return d
+        先取第一页得到 total，其余页并发读取（最多 concurrency 个同时进行）。
+        各页按页号顺序写入临时文件并计算哈希，内容与缓存一致时不替换文件。
+        任一页失败时不写缓存，返回错误。
 
-    async def saveallport(self):
-        """缓存所有端口（bufferPort + machinePort）"""
-        import traceback
+        Args:
+            page_size: 每页条数，默认 rcms.port_page_size
+            concurrency: 并发页数，默认 rcms.port_fetch_concurrency
+            on_rows: 每页数据按页号顺序写入后调用 on_rows(rows)，用于增量生成 cmsindexmap
 
-        for buforeq in ("bufferPort", "machinePort"):
-            try:
-                logger.info(f"开始缓存{buforeq}")
-                data = await self.getPort(limit=1000, buforeq=buforeq, cache=True)
-                if data.get("success"):
-                    logger.info(f"{data.get('success')}|{data.get('total')}")
-                else:
-                    print(data)
-            except Exception as e:
-                traceback.print_exc()
-                logger.error(f"缓存{buforeq}失败: {e}")
-
-    def transport(self):
-        """从缓存的bufferPort/machinePort生成cmsindexmap.json"""
-        with open(self.current_cache_path / "bufferPort.json") as f:
-            buffer_data = json.load(f)
-
-        result = {}
-        # bufferPort: type → 分组
-        for key, type_val in {
-            "BUFFER": "1",
-            "CV": "2",
-            "NO_POWER_BUFFER": "3",
-            "S_CV": "8",
-            "VS": "9",
-        }.items():
-            d = {}
-            for one in buffer_data.get("data", []):
-                if one.get("type") != type_val:
-                    continue
-                name = one.get("port")[:4] if type_val == "1" else one.get("port")
-                if name not in d:
-                    d[name] = one.get("cmsIndex", "")[:4] + "00"
-            result[key] = d
-
-        with open(self.current_cache_path / "machinePort.json") as f:
-            machine_data = json.load(f)
-
-        # machinePort: (type, name提取函数) → 分组
-        for key, (type_val, name_fn) in {
-            "EQ": (
-                "1",
-                lambda o: (
-                    o.get("eqName", "")[:8] + (o.get("carrierLoc", "")[-1:] or "")
-                ),
-            ),
-            "PODEQ": ("4", lambda o: o.get("port", "")),
-            "STK": ("3", lambda o: o.get("eqName", "")),
-        }.items():
-            d = {}
-            for one in machine_data.get("data", []):
-                if one.get("type") != type_val:
-                    continue
-                name = name_fn(one)
-                if name not in d:
-                    d[name] = one.get("cmsIndex", "")[:4] + "00"
-            result[key] = d
-
-        file_path = self.current_cache_path / "cmsindexmap.json"
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
-        logger.info(f"cmsindexmap.json缓存成功，路径：{file_path}")
+        Returns:
+            dict: success, total, fetched, pages, changed
+        """
+        page_size = page_size or cfg.get("rcms.port_page_size") or 500
+        concurrency = concurrency or cfg.get("rcms.port_fetch_concurrency") or 4
+        endpoint = f"/{buforeq}/findListWithPages.action"
+
+        async def page(no: int) -> dict:
+            # start 为页号(从1开始)
+            data = {
+                "start": no,
+                "limit": page_size,
+                "port": "",
+                "mapDataCode": "",
+                "cmsIndex": "",
+                "carrierId": "",
+                "carrierLoc": "",
+                "type": -1,
+            }
+            if buforeq == "bufferPort":
+                data["upDown"] = -1
+            # 全量读取不走查询缓存，避免大页占满缓存
+            d = await self._request(endpoint, data=data, timeout=30, use_cache=False)
+            if d.get("_error") or d.get("success") is False:
+                raise Exception(f"读取{buforeq}第{no}页失败: {d.get('msg', d)}")
+            return d
+
+        started = time.monotonic()
+        try:
+            first = await page(1)
+        except Exception as e:
+            return {"success": False, "msg": str(e)}
+        total = int(first.get("total") or 0)
+        pages = max(math.ceil(total / page_size), 1)
+
+        file_name = f"{buforeq}.json"
+        tmp_path = self.current_cache_path / (file_name + ".tmp")
+        digest = sha256()
+        state = {"size": 0, "fetched": 0, "next": 1}
+        done: dict[int, list] = {}
+
+        def emit(f, chunk: str):
+            raw = chunk.encode("utf-8")
+            f.write(raw)
+            digest.update(raw)
+            state["size"] += len(raw)
+
+        def flush(f):
+            """按页号顺序写出已完成的连续页"""
+            while state["next"] in done:
+                rows = done.pop(state["next"])
+                for row in rows:
+                    emit(f, (",\n" if state["fetched"] else "\n") + json.dumps(row, ensure_ascii=False))
+                    state["fetched"] += 1
+                if on_rows is not None:
+                    on_rows(rows)
+                state["next"] += 1
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch_page(no: int, f):
+            async with semaphore:
+                d = await page(no)
+            done[no] = d.get("data") or []
+            flush(f)
+
+        try:
+            with open(tmp_path, "wb") as f:
+                emit(f, '{"success": true, "total": %d, "data": [' % total)
+                done[1] = first.get("data") or []
+                flush(f)
+                tasks = [asyncio.ensure_future(fetch_page(no, f)) for no in range(2, pages + 1)]
+                try:
+                    await asyncio.gather(*tasks)
+                except Exception:
+                    for t in tasks:
+                        t.cancel()
+                    raise
+                emit(f, "\n]}\n")
+        except Exception as e:
+            tmp_path.unlink(missing_ok=True)
+            logger.error(f"缓存{buforeq}失败: {e}")
+            return {"success": False, "msg": str(e)}
+
+        if state["fetched"] != total:
+            logger.warning(f"{buforeq} 读取 {state['fetched']} 条，与 total={total} 不一致（读取期间数据有变化）")
+        self.manifest.reload()
+        changed = self.manifest.write_file(buforeq, file_name, tmp_path, digest.hexdigest(), state["size"])
+        self.manifest.commit([buforeq] if changed else [])
+        logger.info(
+            f"{buforeq}缓存成功{'' if changed else '（内容未变化）'}，{state['fetched']} 条 {pages} 页，"
+            f"耗时 {time.monotonic() - started:.2f}s，路径：{self.current_cache_path / file_name}"
+        )
+        return {
+            "success": True,
+            "total": total,
+            "fetched": state["fetched"],
+            "pages": pages,
+            "changed": changed,
+        }
+
+    async def saveallport(self):
+        """缓存所有端口：bufferPort 与 machinePort 并发分页读取，读取过程中增量生成cmsindexmap"""
+        builder = CmsIndexMapBuilder()
+        results = await asyncio.gather(
+            self.fetch_all_ports("bufferPort", on_rows=builder.add_buffer_rows),
+            self.fetch_all_ports("machinePort", on_rows=builder.add_machine_rows),
+        )
+        for buforeq, data in zip(("bufferPort", "machinePort"), results):
+            if data.get("success"):
+                logger.info(f"{buforeq}: {data.get('fetched')}/{data.get('total')}")
+            else:
+                logger.error(f"缓存{buforeq}失败: {data.get('msg')}")
+        try:
+            if all(d.get("success") for d in results):
+                # 两类端口都已完整读取，直接使用增量结果，不再重新读取缓存文件
+                self._write_cmsindexmap(builder.result(), force=False)
+            else:
+                # 部分失败时按已有的缓存文件生成（端口缓存有变化时才会重新生成）
+                self.transport()
+        except Exception as e:
+            logger.error(f"生成cmsindexmap失败: {e}")
+
+    def _write_cmsindexmap(self, result: dict, force: bool = False) -> bool:
+        inputs = ["bufferPort", "machinePort"]
+        if not force and not self.manifest.needs_rebuild(
+            "cmsindexmap", inputs, [self.current_cache_path / "cmsindexmap.json"]
+        ):
+            logger.info("端口缓存未变化，跳过生成cmsindexmap.json")
+            return False
+        data = json.dumps(result, ensure_ascii=False, indent=2).encode("utf-8")
+        changed = self.manifest.write("cmsindexmap", "cmsindexmap.json", data)
+        self.manifest.commit(["cmsindexmap"] if changed else [])
+        self.manifest.mark_built("cmsindexmap", inputs)
+        logger.info(
+            f"cmsindexmap.json缓存成功，路径：{self.current_cache_path / 'cmsindexmap.json'}"
+        )
+        return changed
+
+    def transport(self, force: bool = False):
+        """从缓存的bufferPort/machinePort生成cmsindexmap.json，端口缓存未变化时跳过"""
+        inputs = ["bufferPort", "machinePort"]
+        if not force and not self.manifest.needs_rebuild(
+            "cmsindexmap", inputs, [self.current_cache_path / "cmsindexmap.json"]
+        ):
+            logger.info("端口缓存未变化，跳过生成cmsindexmap.json")
+            return False
+        builder = CmsIndexMapBuilder()
+        with open(self.current_cache_path / "bufferPort.json", encoding="utf-8") as f:
+            builder.add_buffer_rows(json.load(f).get("data", []))
+        with open(self.current_cache_path / "machinePort.json", encoding="utf-8") as f:
+            builder.add_machine_rows(json.load(f).get("data", []))
+        return self._write_cmsindexmap(builder.result(), force=True)
 
     def get_cmsindexmap(self):
-        """从缓存文件读取CMS索引映射表"""
-        file_path = self.current_cache_path / "cmsindexmap.json"
-        with open(file_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        """CMS索引映射表，由端口目录加载一次，缓存变化后重新读取"""
+        cmsindexmap = self.ports.ensure().cmsindexmap
+        if not cmsindexmap:
+            raise FileNotFoundError(f"{self.current_cache_path / 'cmsindexmap.json'} 不存在，请先缓存端口")
+        return cmsindexmap
 
-    @functools.lru_cache(maxsize=1)
     def get_device_type_options(self):
-        """获取设备类型选项（缓存结果）"""
-        cmsindexmap = self.get_cmsindexmap()
-        return {
+        """获取设备类型选项，按端口目录的构建时间缓存，端口缓存变化(包括其他进程写入)后重新生成"""
+        index = self.ports.ensure()
+        cached = self._device_type_options
+        if cached is not None and cached[0] == index.built_at:
+            return cached[1]
+        cmsindexmap = index.cmsindexmap
+        if not cmsindexmap:
+            raise FileNotFoundError(f"{self.current_cache_path / 'cmsindexmap.json'} 不存在，请先缓存端口")
+        options = {
             "options": {
                 device_type: [
                     {"value": cms_index, "label": device_name}
@@ -489,6 +912,8 @@ class RcsWebApi:
                 for device_type, devices in cmsindexmap.items()
             }
         }
+        self._device_type_options = (index.built_at, options)
+        return options
 
 
 if __name__ == "__main__":
@@ -0,0 +1,306 @@
+import heapq
+import logging
+import math
+
+import numpy as np
+
+from util.spatial_index import CellIndex
+
+logger = logging.getLogger(__name__)
+
+# findByElcMapCode 返回的线路行字段：起点/终点点位编码(与 getMapDataInfo 的 mapDataCode 对应)、
+# 线路长度(mm，可为空)、方向(1 为单向)
+START_KEY = "startMapDataCode"
+END_KEY = "endMapDataCode"
+LENGTH_KEY = "length"
+DIRECTION_KEY = "direction"
+
+
+def iter_line_rows(linedata):
+    """findByElcMapCode 的线路行：返回 {"data": [...]} 或直接返回行列表，缺少起点/终点的行跳过"""
+    rows = linedata.get("data") if isinstance(linedata, dict) else linedata
+    if not isinstance(rows, list):
+        return
+    for row in rows:
+        if isinstance(row, dict) and row.get(START_KEY) not in (None, "") and row.get(END_KEY) not in (None, ""):
+            yield row
+
+
+class RoadGraph:
+    """地图路网（CSR邻接数组）
+
+    点位编码映射为整数编号；indptr[i]:indptr[i+1] 为点位 i 的出边，
+    indices 为目标点位编号，weights 为边长(mm)。
+    """
+
+    def __init__(self, edges: list[tuple[str, str, float]]):
+        self.codes: list[str] = []
+        self.code_to_id: dict[str, int] = {}
+        src, dst, weight = [], [], []
+        for a, b, w in edges:
+            src.append(self.intern(a))
+            dst.append(self.intern(b))
+            weight.append(w)
+        n = len(self.codes)
+        src = np.asarray(src, dtype=np.int32)
+        order = np.argsort(src, kind="stable")
+        self.indices = np.asarray(dst, dtype=np.int32)[order]
+        self.weights = np.asarray(weight, dtype=np.float64)[order]
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=self.indptr[1:])
+        # Dijkstra 中逐个访问邻接表，转为 list 避免 numpy 标量开销
+        self._indptr = self.indptr.tolist()
+        self._indices = self.indices.tolist()
+        self._weights = self.weights.tolist()
+        logger.info(f"路网构建完成: {n} 个点位, {len(self._indices)} 条有向边")
+
+    def intern(self, code: str) -> int:
+        idx = self.code_to_id.get(code)
+        if idx is None:
+            idx = len(self.codes)
+            self.code_to_id[code] = idx
+            self.codes.append(code)
+        return idx
+
+    @property
+    def node_count(self) -> int:
+        return len(self.codes)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self._indices)
+
+    @classmethod
+    def from_line_data(cls, linedata, cells: CellIndex | None = None) -> "RoadGraph":
+        """
+        由 RcmsApi.get_line_info 的结果构建路网
+        未提供长度时用点位坐标计算直线距离；方向为单向(1)时只加正向边
+        """
+        edges = []
+        for row in iter_line_rows(linedata):
+            a, b = str(row[START_KEY]), str(row[END_KEY])
+            length = row.get(LENGTH_KEY)
+            try:
+                length = float(length)
+            except (TypeError, ValueError):
+                length = None
+            if length is None and cells is not None:
+                pa, pb = cells.resolve(a), cells.resolve(b)
+                if pa and pb:
+                    length = math.hypot(pa["x"] - pb["x"], pa["y"] - pb["y"])
+            if length is None:
+                continue
+            edges.append((a, b, length))
+            if str(row.get(DIRECTION_KEY) or "") != "1":
+                edges.append((b, a, length))
+        return cls(edges)
+
+    def _dijkstra(self, source: int, target: int | None = None):
+        dist = {source: 0.0}
+        prev = {}
+        heap = [(0.0, source)]
+        indptr, indices, weights = self._indptr, self._indices, self._weights
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u == target:
+                break
+            if d > dist[u]:
+                continue
+            for k in range(indptr[u], indptr[u + 1]):
+                v = indices[k]
+                nd = d + weights[k]
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    prev[v] = u
+                    heapq.heappush(heap, (nd, v))
+        return dist, prev
+
+    def shortest_path(self, source: str, target: str) -> tuple[float, list[str]] | None:
+        """最短路径，返回 (长度, 点位编码列表)，不可达时返回None"""
+        s, t = self.code_to_id.get(source), self.code_to_id.get(target)
+        if s is None or t is None:
+            return None
+        dist, prev = self._dijkstra(s, t)
+        if t not in dist:
+            return None
+        path = [t]
+        while path[-1] != s:
+            path.append(prev[path[-1]])
+        return dist[t], [self.codes[i] for i in reversed(path)]
+
+    def distance(self, source: str, target: str) -> float | None:
+        result = self.shortest_path(source, target)
+        return result[0] if result else None
+
+
+def path_points(paths) -> np.ndarray:
+    """ROBOT_PATH 消息中的路径点 -> (n, 2) 坐标数组"""
+    if not paths:
+        return np.zeros((0, 2))
+    paths_obj = paths.get("Paths") or paths
+    points = paths_obj.get("Path") if isinstance(paths_obj, dict) else None
+    if isinstance(points, dict):
+        points = [points]
+    coords = []
+    for p in points or []:
+        try:
+            coords.append((float(p.get("@x", p.get("x"))), float(p.get("@y", p.get("y")))))
+        except (TypeError, ValueError):
+            continue
+    return np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+
+
+def remaining_distance(x: float, y: float, points: np.ndarray) -> float:
+    """机器人沿路径剩余距离：投影到最近的路径段，加上该段之后所有段的长度"""
+    if len(points) == 0:
+        return 0.0
+    if len(points) == 1:
+        return float(math.hypot(points[0, 0] - x, points[0, 1] - y))
+    a, b = points[:-1], points[1:]
+    seg = b - a
+    seg_len = np.hypot(seg[:, 0], seg[:, 1])
+    # 投影参数 t 限制在 [0, 1]，零长度段按起点处理
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = ((x - a[:, 0]) * seg[:, 0] + (y - a[:, 1]) * seg[:, 1]) / (seg_len**2)
+    t = np.clip(np.nan_to_num(t), 0.0, 1.0)
+    proj = a + seg * t[:, None]
+    off = np.hypot(proj[:, 0] - x, proj[:, 1] - y)
+    k = int(np.argmin(off))
+    # 剩余 = 当前段未走完部分 + 后续段长度
+    tail = np.cumsum(seg_len[::-1])[::-1]
+    after = float(tail[k + 1]) if k + 1 < len(tail) else 0.0
+    return float(seg_len[k] * (1 - t[k])) + after
+
+
+def _robot_speed(status: dict, default_speed: float, min_speed: float) -> float:
+    try:
+        speed = float(status.get("speed") or 0)
+    except (TypeError, ValueError):
+        speed = 0.0
+    return default_speed if speed < min_speed else speed
+
+
+class FleetEta:
+    """全车队ETA计算
+
+    剩余距离沿机器人上报的 ROBOT_PATH 坐标计算（路径已是实际行驶的点位序列，不需要路网）。
+    每台机器人的路径段与“该段之后的长度”只在 paths 变化时重新计算；
+    每帧把全车队的路径段拼接为一个数组，一次向量运算求出各机器人的投影位置，
+    再用 reduceat 按机器人分组取最近的路径段。
+    """
+
+    def __init__(self):
+        # RobotId -> {"paths", "a", "seg", "seg_len", "after", "target"}
+        self._paths: dict[str, dict] = {}
+        # 拼接后的全车队路径段，参与计算的机器人及其路径不变时复用
+        self._fleet_key: tuple | None = None
+        self._fleet: dict | None = None
+
+    def _robot_path(self, rid: str, paths) -> dict | None:
+        cached = self._paths.get(rid)
+        if cached is not None and cached["paths"] == paths:
+            return cached
+        points = path_points(paths)
+        if not len(points):
+            self._paths.pop(rid, None)
+            return None
+        if len(points) == 1:
+            # 单点路径按零长度段处理，剩余距离为到该点的直线距离
+            points = np.vstack([points, points])
+        a = points[:-1]
+        seg = points[1:] - a
+        seg_len = np.hypot(seg[:, 0], seg[:, 1])
+        # 每段之后所有段的长度
+        after = np.concatenate([np.cumsum(seg_len[::-1])[::-1][1:], [0.0]])
+        cached = self._paths[rid] = {
+            "paths": paths,
+            "a": a,
+            "seg": seg,
+            "seg_len": seg_len,
+            "after": after,
+            "target": {"x": float(points[-1, 0]), "y": float(points[-1, 1])},
+        }
+        return cached
+
+    def _concat(self, rids: list[str], entries: list[dict]) -> dict:
+        key = tuple(rids) + tuple(id(e) for e in entries)
+        if key != self._fleet_key:
+            counts = np.array([len(e["seg_len"]) for e in entries])
+            seg = np.concatenate([e["seg"] for e in entries])
+            seg_len = np.concatenate([e["seg_len"] for e in entries])
+            with np.errstate(invalid="ignore", divide="ignore"):
+                inv_len2 = np.nan_to_num(1.0 / seg_len**2, posinf=0.0)
+            self._fleet = {
+                "counts": counts,
+                "starts": np.concatenate([[0], np.cumsum(counts)[:-1]]),
+                "a": np.concatenate([e["a"] for e in entries]),
+                "seg": seg,
+                "seg_len": seg_len,
+                "inv_len2": inv_len2,
+                "after": np.concatenate([e["after"] for e in entries]),
+            }
+            self._fleet_key = key
+        return self._fleet
+
+    def update(self, robots: dict, default_speed: float, min_speed: float = 100.0) -> dict:
+        """
+        计算全部机器人沿当前 ROBOT_PATH 的剩余距离和预计到达时间
+
+        Args:
+            robots: read_robot_status 的结果（含 position、speed、paths）
+            default_speed: 机器人静止或速度未知时使用的速度(mm/s)
+            min_speed: 低于该速度视为静止
+
+        Returns:
+            dict: {RobotId: {"remaining": mm, "eta": 秒, "target": {"x", "y"}}}，无路径的机器人不包含
+        """
+        rids, entries, xs, ys = [], [], [], []
+        for rid, status in robots.items():
+            entry = self._robot_path(rid, status.get("paths"))
+            if entry is None:
+                continue
+            pos = status.get("position") or {}
+            try:
+                x, y = float(pos.get("x")), float(pos.get("y"))
+            except (TypeError, ValueError):
+                continue
+            rids.append(rid)
+            entries.append(entry)
+            xs.append(x)
+            ys.append(y)
+        for rid in set(self._paths) - set(robots):
+            del self._paths[rid]
+        if not rids:
+            return {}
+
+        fleet = self._concat(rids, entries)
+        counts, starts = fleet["counts"], fleet["starts"]
+        a, seg = fleet["a"], fleet["seg"]
+        dx = np.repeat(np.asarray(xs), counts) - a[:, 0]
+        dy = np.repeat(np.asarray(ys), counts) - a[:, 1]
+        # 投影参数 t 限制在 [0, 1]，零长度段按起点处理
+        t = np.clip((dx * seg[:, 0] + dy * seg[:, 1]) * fleet["inv_len2"], 0.0, 1.0)
+        off = np.hypot(dx - seg[:, 0] * t, dy - seg[:, 1] * t)
+        # 每台机器人离得最近的路径段（并列时取靠前的段）
+        nearest = np.minimum.reduceat(off, starts)
+        index = np.arange(len(off))
+        k = np.minimum.reduceat(np.where(off == np.repeat(nearest, counts), index, len(off)), starts)
+        remaining = fleet["seg_len"][k] * (1 - t[k]) + fleet["after"][k]
+        # 单点路径(零长度段)的剩余距离为直线距离
+        remaining = np.where(fleet["seg_len"][k] == 0, remaining + off[k] * (counts == 1), remaining)
+
+        result = {}
+        for i, rid in enumerate(rids):
+            speed = _robot_speed(robots[rid], default_speed, min_speed)
+            dist = float(remaining[i])
+            result[rid] = {
+                "remaining": round(dist, 1),
+                "eta": round(dist / speed, 1) if speed else None,
+                "target": entries[i]["target"],
+            }
+        return result
+
+
+def fleet_eta(robots: dict, default_speed: float, min_speed: float = 100.0) -> dict:
+    """单次计算全部机器人的剩余距离和ETA，见 FleetEta.update"""
+    return FleetEta().update(robots, default_speed, min_speed)
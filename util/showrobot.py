@@ -35,7 +35,7 @@ def align_text(text, width):
     return text
 
 
-def show_robot_status(interval=0.1):
+def show_robot_status(interval=0.1, site_rdstag=None):
     # 初始化进度条变量
     position = 0
     direction = 1
@@ -63,7 +63,7 @@ def show_robot_status(interval=0.1):
                 f"{1 / interval:.2f} Hz\n"
             )
             # 获取机器人状态输出
-            robot_output = print_robot_status()
+            robot_output = print_robot_status(site_rdstag or rdstag)
             buffer.write(robot_output)
             # 一次性显示所有内容
             print(buffer.getvalue(), end="", flush=True)
@@ -85,9 +85,9 @@ def show_robot_status(interval=0.1):
         print("\n已取消")
 
 
-def print_robot_status():
+def print_robot_status(site_rdstag=None):
     """显示机器人的状态"""
-    robot_status = r.hgetall(f"{rdstag}:ROBOT_STATUS")
+    robot_status = r.hgetall(f"{site_rdstag or rdstag}:ROBOT_STATUS")
 
     # 创建输出缓冲区
     output = io.StringIO()
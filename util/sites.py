@@ -0,0 +1,189 @@
+import logging
+import threading
+
+from util.config import cfg
+
+logger = logging.getLogger(__name__)
+
+
+def make_rdstag(host: str) -> str:
+    """Redis键前缀：http://1.2.3.4:8182 -> 1.2.3.4-8182"""
+    return host.split("://")[1].replace(":", "-")
+
+
+class Site:
+    """一个RCS现场：独立的 RcmsApi、ZeroMQ接入服务和Redis命名空间(rdstag)
+
+    RcmsApi 与接入服务在首次使用时创建，未访问的现场不占用资源。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        host: str,
+        rcms_rest_api: str | None = None,
+        map_code: str = "",
+        username: str = "",
+        password: str = "",
+    ):
+        self.name = name
+        self.host = host
+        self.rcms_rest_api = rcms_rest_api or host
+        self.map_code = map_code
+        self.username = username
+        self.password = password
+        self.rdstag = make_rdstag(host)
+        self._api = None
+        self._ingest = None
+        self._web = None
+        self._fleet = None
+        self._lock = threading.Lock()
+
+    @property
+    def api(self):
+        if self._api is None:
+            with self._lock:
+                if self._api is None:
+                    from util.rcms_api import RcmsApi
+
+                    api = RcmsApi(host=self.rcms_rest_api, map_code=self.map_code)
+                    api.build_from_cache(lazy=True)
+                    self._api = api
+        return self._api
+
+    @property
+    def ingest(self):
+        if self._ingest is None:
+            with self._lock:
+                if self._ingest is None:
+                    from util.zeromq import ZeroMQIngestService
+
+                    self._ingest = ZeroMQIngestService(self.api, rdstag=self.rdstag)
+        return self._ingest
+
+    @property
+    def web(self):
+        """RCS Web API客户端，每个现场一个长连接会话"""
+        if self._web is None:
+            with self._lock:
+                if self._web is None:
+                    from util.rcs_web_api import RcsWebApi
+
+                    self._web = RcsWebApi(
+                        base_url=self.host + "/rcms/web",
+                        username=self.username or None,
+                        password=self.password or None,
+                    )
+        return self._web
+
+    @property
+    def fleet(self):
+        """车队目录：机器人编号 -> IP/车型/固件版本"""
+        if self._fleet is None:
+            with self._lock:
+                if self._fleet is None:
+                    from util.fleet_directory import FleetDirectory
+
+                    self._fleet = FleetDirectory(self.web, self.rdstag)
+        return self._fleet
+
+    async def aclose(self):
+        """停止车队目录刷新，关闭RCS Web API长连接与RcmsApi异步客户端"""
+        if self._fleet is not None:
+            self._fleet.stop()
+        if self._web is not None:
+            await self._web.aclose()
+        if self._api is not None:
+            await self._api.aclose()
+
+    def release_idle_datasets(self, idle_seconds: float, rss_limit_mb: float = 0) -> list[str]:
+        """释放空闲的RCMS数据集，未使用过的现场不做处理"""
+        if self._api is None:
+            return []
+        return self._api.release_idle(idle_seconds, rss_limit_mb)
+
+    def stop(self):
+        """停止已创建的接入服务，未使用过的现场不做处理"""
+        if self._ingest is not None:
+            self._ingest.stop()
+
+    def info(self) -> dict:
+        return {
+            "name": self.name,
+            "host": self.host,
+            "rcms_rest_api": self.rcms_rest_api,
+            "map_code": self.map_code,
+            "rdstag": self.rdstag,
+            "loaded": self._api is not None,
+            "ingest": self._ingest.health()["status"] if self._ingest else "stopped",
+        }
+
+
+class SiteRegistry:
+    """现场注册表
+
+    配置文件中 [[sites]] 定义多个现场；未配置时由 [rcms] 生成名为 default 的单个现场，
+    与原有单现场部署保持一致。第一个现场为默认现场。
+    """
+
+    def __init__(self):
+        self._sites: dict[str, Site] = {}
+        self.reload()
+
+    def reload(self):
+        sites = {}
+        for item in cfg.get("sites") or []:
+            name = item.get("name")
+            if not name or not item.get("host"):
+                logger.warning(f"现场配置缺少 name/host，已忽略: {item}")
+                continue
+            # 已创建的现场保留其 RcmsApi 与接入服务
+            site = self._sites.get(name)
+            if site is None or site.host != item["host"]:
+                site = Site(
+                    name,
+                    item["host"],
+                    item.get("rcms_rest_api"),
+                    item.get("map_code", ""),
+                    item.get("username", ""),
+                    item.get("password", ""),
+                )
+            sites[name] = site
+        if not sites:
+            site = self._sites.get("default")
+            if site is None or site.host != cfg.get("rcms.host"):
+                site = Site(
+                    "default",
+                    cfg.get("rcms.host"),
+                    cfg.get("rcms.rcms_rest_api"),
+                    cfg.get("rcms.map_code") or "",
+                    cfg.get("rcms.username") or "",
+                    cfg.get("rcms.password") or "",
+                )
+            sites["default"] = site
+        self._sites = sites
+
+    @property
+    def default(self) -> Site:
+        return next(iter(self._sites.values()))
+
+    def get(self, name: str | None = None) -> Site:
+        """按名称取现场，name 为空时返回默认现场，不存在时抛出 KeyError"""
+        if not name:
+            return self.default
+        site = self._sites.get(name)
+        if site is None:
+            raise KeyError(f"现场不存在: {name}")
+        return site
+
+    def names(self) -> list[str]:
+        return list(self._sites)
+
+    def __iter__(self):
+        return iter(list(self._sites.values()))
+
+    def __len__(self):
+        return len(self._sites)
+
+
+sites = SiteRegistry()
@@ -0,0 +1,183 @@
+import logging
+import math
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def check_finite(*values):
+    """查询坐标/距离必须为有限数值（None 表示未提供），NaN/inf 无法计算网格桶号"""
+    for value in values:
+        if value is not None and not math.isfinite(value):
+            raise ValueError(f"坐标/距离必须为有限数值: {value}")
+
+
+class CellIndex:
+    """地图点位空间索引（均匀网格）
+
+    由 RcmsApi.mapdata 构建一次：点位坐标存为 float64 数组，
+    按网格桶号排序后用 searchsorted 定位每个桶的区间，
+    最近点位、半径、矩形查询只检查相关的桶。
+    """
+
+    def __init__(self, mapdata: list[dict], bucket_size: float | None = None):
+        rows = mapdata if isinstance(mapdata, list) else [mapdata] if mapdata else []
+        xs, ys, codes = [], [], []
+        for row in rows:
+            try:
+                x, y = float(row["cooX"]), float(row["cooY"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            xs.append(x)
+            ys.append(y)
+            codes.append(row.get("mapDataCode") or row.get("dataName") or "")
+        self.xs = np.asarray(xs, dtype=np.float64)
+        self.ys = np.asarray(ys, dtype=np.float64)
+        self.codes = codes
+        self.code_to_idx = {code: i for i, code in enumerate(codes)}
+        self.size = len(codes)
+        if not self.size:
+            self.min_x = self.min_y = 0.0
+            self.bucket_size = bucket_size or 1.0
+            self.nx = self.ny = 1
+            self.order = np.zeros(0, dtype=np.int64)
+            self.starts = np.zeros(2, dtype=np.int64)
+            return
+
+        self.min_x, self.min_y = float(self.xs.min()), float(self.ys.min())
+        width = float(self.xs.max()) - self.min_x
+        height = float(self.ys.max()) - self.min_y
+        # 默认桶大小使平均每桶约4个点位
+        self.bucket_size = bucket_size or max(
+            math.sqrt(max(width * height, 1.0) / self.size * 4), 1.0
+        )
+        self.nx = int(width // self.bucket_size) + 1
+        self.ny = int(height // self.bucket_size) + 1
+        keys = self._bucket_keys(self.xs, self.ys)
+        self.order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[self.order]
+        self.starts = np.searchsorted(
+            sorted_keys, np.arange(self.nx * self.ny + 1), side="left"
+        )
+        logger.info(
+            f"空间索引构建完成: {self.size} 个点位, 网格 {self.nx}x{self.ny}, 桶大小 {self.bucket_size:.0f}"
+        )
+
+    def _bucket_keys(self, xs, ys):
+        gx = ((xs - self.min_x) // self.bucket_size).astype(np.int64)
+        gy = ((ys - self.min_y) // self.bucket_size).astype(np.int64)
+        return gx * self.ny + gy
+
+    def _candidates(self, x1: float, y1: float, x2: float, y2: float) -> np.ndarray:
+        """矩形范围覆盖到的所有桶内的点位下标"""
+        if not self.size:
+            return self.order
+        gx1 = max(int((x1 - self.min_x) // self.bucket_size), 0)
+        gy1 = max(int((y1 - self.min_y) // self.bucket_size), 0)
+        gx2 = min(int((x2 - self.min_x) // self.bucket_size), self.nx - 1)
+        gy2 = min(int((y2 - self.min_y) // self.bucket_size), self.ny - 1)
+        if gx1 > gx2 or gy1 > gy2:
+            return self.order[:0]
+        # 同一列(gx)的桶在排序后连续，每列取一个区间
+        parts = [
+            self.order[self.starts[gx * self.ny + gy1] : self.starts[gx * self.ny + gy2 + 1]]
+            for gx in range(gx1, gx2 + 1)
+        ]
+        return np.concatenate(parts) if parts else self.order[:0]
+
+    def cell(self, idx: int) -> dict:
+        return {"code": self.codes[idx], "x": float(self.xs[idx]), "y": float(self.ys[idx])}
+
+    def resolve(self, code: str) -> dict | None:
+        """点位编码 -> 坐标"""
+        idx = self.code_to_idx.get(code)
+        return None if idx is None else self.cell(idx)
+
+    def nearest(self, x: float, y: float, max_distance: float | None = None) -> dict | None:
+        """最近点位，超出 max_distance 时返回None"""
+        check_finite(x, y, max_distance)
+        if not self.size:
+            return None
+        radius = self.bucket_size
+        limit = max_distance if max_distance is not None else math.inf
+        while True:
+            cand = self._candidates(x - radius, y - radius, x + radius, y + radius)
+            if len(cand):
+                d2 = (self.xs[cand] - x) ** 2 + (self.ys[cand] - y) ** 2
+                best = int(np.argmin(d2))
+                dist = math.sqrt(float(d2[best]))
+                # 搜索范围内接圆半径不小于当前最近距离时结果确定
+                if dist <= radius:
+                    if dist > limit:
+                        return None
+                    return {**self.cell(int(cand[best])), "distance": dist}
+                radius = dist
+                continue
+            if radius > limit:
+                return None
+            radius *= 2
+
+    def within_radius(self, x: float, y: float, radius: float) -> list[dict]:
+        """半径范围内的点位，按距离排序"""
+        check_finite(x, y, radius)
+        cand = self._candidates(x - radius, y - radius, x + radius, y + radius)
+        if not len(cand):
+            return []
+        d2 = (self.xs[cand] - x) ** 2 + (self.ys[cand] - y) ** 2
+        mask = d2 <= radius * radius
+        hits, d2 = cand[mask], d2[mask]
+        order = np.argsort(d2)
+        return [
+            {**self.cell(int(hits[i])), "distance": math.sqrt(float(d2[i]))} for i in order
+        ]
+
+    def within_box(self, x1: float, y1: float, x2: float, y2: float) -> list[dict]:
+        """矩形范围内的点位"""
+        check_finite(x1, y1, x2, y2)
+        x1, x2 = min(x1, x2), max(x1, x2)
+        y1, y2 = min(y1, y2), max(y1, y2)
+        cand = self._candidates(x1, y1, x2, y2)
+        xs, ys = self.xs[cand], self.ys[cand]
+        hits = cand[(xs >= x1) & (xs <= x2) & (ys >= y1) & (ys <= y2)]
+        return [self.cell(int(i)) for i in hits]
+
+
+def robot_positions(robots: dict) -> tuple[list[str], np.ndarray, np.ndarray]:
+    """从机器人状态字典取出有效坐标，返回 (编号列表, x数组, y数组)"""
+    ids, xs, ys = [], [], []
+    for rid, status in robots.items():
+        pos = status.get("position") or {}
+        try:
+            x, y = float(pos.get("x")), float(pos.get("y"))
+        except (TypeError, ValueError):
+            continue
+        if not (math.isfinite(x) and math.isfinite(y)):
+            continue
+        ids.append(rid)
+        xs.append(x)
+        ys.append(y)
+    return ids, np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64)
+
+
+def robots_within(robots: dict, x: float, y: float, radius: float | None = None, box=None) -> list[dict]:
+    """半径或矩形范围内的机器人，机器人数量少，直接向量化过滤"""
+    check_finite(x, y, radius, *(box or ()))
+    ids, xs, ys = robot_positions(robots)
+    if not ids:
+        return []
+    if box is not None:
+        x1, y1, x2, y2 = box
+        mask = (
+            (xs >= min(x1, x2)) & (xs <= max(x1, x2)) & (ys >= min(y1, y2)) & (ys <= max(y1, y2))
+        )
+        d = np.hypot(xs - (x1 + x2) / 2, ys - (y1 + y2) / 2)
+    else:
+        d = np.hypot(xs - x, ys - y)
+        mask = d <= radius
+    hits = np.nonzero(mask)[0]
+    hits = hits[np.argsort(d[hits])]
+    return [
+        {"RobotId": ids[i], "x": float(xs[i]), "y": float(ys[i]), "distance": float(d[i])}
+        for i in hits
+    ]
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util.cache_manifest import CacheManifest, content_hash  # noqa: E402
+
+
+def test_write_skips_unchanged(tmp_path):
+    manifest = CacheManifest(tmp_path)
+    assert manifest.write("mapdata", "mapdata.json", b"[1]")
+    assert not manifest.write("mapdata", "mapdata.json", b"[1]")
+    assert manifest.get_hash("mapdata") == content_hash(b"[1]")
+    # 文件被删除后即使内容相同也重新写入
+    (tmp_path / "mapdata.json").unlink()
+    assert manifest.write("mapdata", "mapdata.json", b"[1]")
+    assert (tmp_path / "mapdata.json").read_bytes() == b"[1]"
+
+
+def test_commit_notifies_and_records_feed(tmp_path):
+    manifest = CacheManifest(tmp_path)
+    seen = []
+    manifest.subscribe(seen.append)
+    manifest.write("a", "a.json", b"1")
+    manifest.commit(["a"])
+    manifest.commit([])
+    assert seen == [{"a"}]
+    assert [entry["datasets"] for entry in CacheManifest(tmp_path).data["feed"]] == [["a"]]
+
+
+def test_commit_keeps_other_process_entries(tmp_path):
+    ours, theirs = CacheManifest(tmp_path), CacheManifest(tmp_path)
+    theirs.write("b", "b.json", b"2")
+    theirs.commit(["b"])
+    # ours 加载时还没有 b，保存时不能覆盖掉
+    ours.write("a", "a.json", b"1")
+    ours.commit(["a"])
+    on_disk = CacheManifest(tmp_path)
+    assert on_disk.get_hash("a") == content_hash(b"1")
+    assert on_disk.get_hash("b") == content_hash(b"2")
+
+
+def test_needs_rebuild_with_names(tmp_path):
+    manifest = CacheManifest(tmp_path)
+    output = tmp_path / "cmsindexmap.json"
+    manifest.write("bufferPort", "bufferPort.json", b"1")
+    manifest.commit(["bufferPort"])
+    assert manifest.needs_rebuild("cmsindexmap", ["bufferPort"], [output])
+
+    output.write_bytes(b"{}")
+    manifest.mark_built("cmsindexmap", ["bufferPort"])
+    assert not manifest.needs_rebuild("cmsindexmap", ["bufferPort"], [output])
+
+    # 其他进程更新了输入
+    other = CacheManifest(tmp_path)
+    other.write("bufferPort", "bufferPort.json", b"2")
+    other.commit(["bufferPort"])
+    assert manifest.needs_rebuild("cmsindexmap", ["bufferPort"], [output])
+
+    # 产物文件缺失
+    manifest.mark_built("cmsindexmap", ["bufferPort"])
+    output.unlink()
+    assert manifest.needs_rebuild("cmsindexmap", ["bufferPort"], [output])
+
+
+def test_needs_rebuild_with_explicit_hashes(tmp_path):
+    manifest = CacheManifest(tmp_path)
+    manifest.mark_built("map_image", {"sharemapdata": "h1"})
+    assert not manifest.needs_rebuild("map_image", {"sharemapdata": "h1"})
+    assert manifest.needs_rebuild("map_image", {"sharemapdata": "h2"})
+    # 构建记录已保存到磁盘
+    assert CacheManifest(tmp_path).data["artifacts"]["map_image"]["inputs"] == {"sharemapdata": "h1"}
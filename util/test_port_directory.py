@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+import orjson
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util import port_directory, rcs_web_api  # noqa: E402
+from util.cache_manifest import CacheManifest  # noqa: E402
+from util.port_directory import PortDirectory, device_index  # noqa: E402
+
+BUFFER_ROWS = [
+    {"port": "A101-1", "cmsIndex": "010101", "type": "1", "eqName": "", "carrierId": "C1"},
+    {"port": "A101-2", "cmsIndex": "010102", "type": "1", "eqName": "", "carrierId": ""},
+]
+MACHINE_ROWS = [{"port": "EQ01-1", "cmsIndex": "020201", "type": "2", "eqName": "EQ01", "carrierId": "C2"}]
+CMSINDEXMAP = {"BUFFER": {"A101": "010100"}, "EQ": {"EQ01": "020200"}}
+
+
+def write_cache(manifest: CacheManifest, cmsindexmap=CMSINDEXMAP):
+    manifest.write("bufferPort", "bufferPort.json", orjson.dumps({"data": BUFFER_ROWS}))
+    manifest.write("machinePort", "machinePort.json", orjson.dumps({"data": MACHINE_ROWS}))
+    manifest.write("cmsindexmap", "cmsindexmap.json", orjson.dumps(cmsindexmap))
+    manifest.commit(["bufferPort", "machinePort", "cmsindexmap"])
+
+
+def test_device_index():
+    assert device_index("010102") == "010100"
+    assert device_index("") == ""
+
+
+def test_lookups(tmp_path):
+    manifest = CacheManifest(tmp_path)
+    write_cache(manifest)
+    ports = PortDirectory(tmp_path, manifest)
+    assert ports.port("A101-1")["device"] == "010100"
+    # 设备 cmsIndex 返回该设备的全部端口
+    assert [p["port"] for p in ports.ports_of("010100")] == ["A101-1", "A101-2"]
+    assert [p["port"] for p in ports.ports_of("010102")] == ["A101-2"]
+    assert ports.carrier("C2")["port"] == "EQ01-1"
+    assert ports.carrier("missing") is None
+    assert [d["name"] for d in ports.search("eq")] == ["EQ01"]
+    assert ports.search("EQ01")[0]["ports"] == 1
+
+
+def test_rebuilds_after_other_process_update(tmp_path, monkeypatch):
+    monkeypatch.setattr(port_directory, "CHECK_INTERVAL", 0)
+    manifest = CacheManifest(tmp_path)
+    write_cache(manifest)
+    ports = PortDirectory(tmp_path, manifest)
+    first = ports.ensure()
+    assert ports.ensure() is first
+
+    # 其他进程(独立的清单实例，没有订阅通知)更新了 cmsindexmap
+    write_cache(CacheManifest(tmp_path), {"BUFFER": {"B202": "030300"}})
+    second = ports.ensure()
+    assert second is not first
+    assert second.built_at > first.built_at
+    assert "B202" in second.devices
+
+
+def test_device_type_options_follow_port_index(tmp_path, monkeypatch):
+    """设备类型选项按端口目录构建时间缓存，其他进程更新缓存后不会返回旧选项"""
+    monkeypatch.setattr(rcs_web_api, "cache_path", tmp_path)
+    monkeypatch.setattr(port_directory, "CHECK_INTERVAL", 0)
+    api = rcs_web_api.RcsWebApi(base_url="http://127.0.0.1:1/rcms/web", username="u", password="p")
+    write_cache(api.manifest)
+
+    options = api.get_device_type_options()
+    assert options["options"]["EQ"] == [{"value": "020200", "label": "EQ01"}]
+    assert api.get_device_type_options() is options
+
+    write_cache(CacheManifest(api.current_cache_path), {"EQ": {"EQ02": "040400"}})
+    options = api.get_device_type_options()
+    assert options["options"] == {"EQ": [{"value": "040400", "label": "EQ02"}]}
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util.road_graph import RoadGraph, fleet_eta, iter_line_rows  # noqa: E402
+from util.spatial_index import CellIndex  # noqa: E402
+
+# findByElcMapCode 返回的线路行
+LINE_DATA = {
+    "data": [
+        {"startMapDataCode": "A", "endMapDataCode": "B", "length": 1000, "direction": 0},
+        {"startMapDataCode": "B", "endMapDataCode": "C", "length": "1500", "direction": 0},
+        {"startMapDataCode": "A", "endMapDataCode": "C", "length": 5000, "direction": 0},
+        # 单向
+        {"startMapDataCode": "C", "endMapDataCode": "D", "length": 700, "direction": 1},
+        # 无长度，用点位坐标计算
+        {"startMapDataCode": "D", "endMapDataCode": "E", "length": None, "direction": 0},
+        # 缺少终点，跳过
+        {"startMapDataCode": "E", "endMapDataCode": "", "length": 1},
+    ]
+}
+
+CELLS = CellIndex(
+    [
+        {"mapDataCode": "D", "cooX": "0", "cooY": "0"},
+        {"mapDataCode": "E", "cooX": "300", "cooY": "400"},
+    ]
+)
+
+
+def test_iter_line_rows():
+    assert len(list(iter_line_rows(LINE_DATA))) == 5
+    assert len(list(iter_line_rows(LINE_DATA["data"]))) == 5
+    assert list(iter_line_rows(None)) == []
+    assert list(iter_line_rows({"code": 1, "message": "error"})) == []
+
+
+def test_csr_build():
+    graph = RoadGraph.from_line_data(LINE_DATA, CELLS)
+    assert graph.node_count == 5
+    # 4条双向 + 1条单向
+    assert graph.edge_count == 9
+    assert graph.indptr[-1] == graph.edge_count
+    a = graph.code_to_id["A"]
+    out = {graph.codes[v]: w for v, w in zip(
+        graph.indices[graph.indptr[a]:graph.indptr[a + 1]],
+        graph.weights[graph.indptr[a]:graph.indptr[a + 1]],
+    )}
+    assert out == {"B": 1000.0, "C": 5000.0}
+
+
+def test_shortest_path():
+    graph = RoadGraph.from_line_data(LINE_DATA, CELLS)
+    assert graph.shortest_path("A", "C") == (2500.0, ["A", "B", "C"])
+    assert graph.shortest_path("A", "E") == (3700.0, ["A", "B", "C", "D", "E"])
+    # 单向边不能反向走
+    assert graph.distance("D", "C") is None
+    assert graph.distance("A", "X") is None
+    assert graph.distance("B", "B") == 0.0
+
+
+def test_without_cells_skips_rows_without_length():
+    graph = RoadGraph.from_line_data(LINE_DATA)
+    assert graph.distance("D", "E") is None
+
+
+def test_fleet_eta():
+    robots = {
+        "1": {
+            "position": {"x": 500, "y": 0},
+            "speed": 1000,
+            "paths": {"Paths": {"Path": [{"@x": "0", "@y": "0"}, {"@x": "1000", "@y": "0"}, {"@x": "1000", "@y": "2000"}]}},
+        },
+        "2": {"position": {"x": 0, "y": 0}, "speed": 0, "paths": None},
+    }
+    result = fleet_eta(robots, default_speed=500)
+    assert set(result) == {"1"}
+    assert result["1"]["remaining"] == pytest.approx(2500.0)
+    assert result["1"]["eta"] == pytest.approx(2.5)
+    assert result["1"]["target"] == {"x": 1000.0, "y": 2000.0}
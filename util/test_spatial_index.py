@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+import math
+import os
+import random
+import sys
+
+import orjson
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util import rcms_api  # noqa: E402
+from util.spatial_index import CellIndex, robots_within  # noqa: E402
+
+
+def make_mapdata(n=500, seed=1):
+    rng = random.Random(seed)
+    return [
+        {"mapDataCode": f"C{i}", "cooX": str(rng.uniform(0, 100000)), "cooY": str(rng.uniform(0, 50000))}
+        for i in range(n)
+    ]
+
+
+def brute_nearest(mapdata, x, y):
+    best = min(mapdata, key=lambda c: math.hypot(float(c["cooX"]) - x, float(c["cooY"]) - y))
+    return best["mapDataCode"], math.hypot(float(best["cooX"]) - x, float(best["cooY"]) - y)
+
+
+def test_nearest_matches_brute_force():
+    mapdata = make_mapdata()
+    index = CellIndex(mapdata)
+    rng = random.Random(2)
+    for _ in range(200):
+        # 包含地图范围外的查询点
+        x, y = rng.uniform(-20000, 120000), rng.uniform(-20000, 70000)
+        code, dist = brute_nearest(mapdata, x, y)
+        cell = index.nearest(x, y)
+        assert cell["code"] == code
+        assert cell["distance"] == pytest.approx(dist)
+
+
+def test_nearest_max_distance():
+    index = CellIndex([{"mapDataCode": "A", "cooX": "0", "cooY": "0"}])
+    assert index.nearest(300, 400, max_distance=499) is None
+    assert index.nearest(300, 400, max_distance=500)["distance"] == pytest.approx(500)
+    assert CellIndex([]).nearest(0, 0) is None
+
+
+def test_within_radius_and_box():
+    mapdata = make_mapdata()
+    index = CellIndex(mapdata)
+    x, y, radius = 50000, 25000, 8000
+    expected = {
+        c["mapDataCode"]
+        for c in mapdata
+        if math.hypot(float(c["cooX"]) - x, float(c["cooY"]) - y) <= radius
+    }
+    hits = index.within_radius(x, y, radius)
+    assert {c["code"] for c in hits} == expected
+    assert [c["distance"] for c in hits] == sorted(c["distance"] for c in hits)
+
+    # 角点顺序颠倒也按同一矩形处理
+    box = {c["code"] for c in index.within_box(60000, 30000, 40000, 10000)}
+    assert box == {
+        c["mapDataCode"]
+        for c in mapdata
+        if 40000 <= float(c["cooX"]) <= 60000 and 10000 <= float(c["cooY"]) <= 30000
+    }
+
+
+def test_resolve():
+    index = CellIndex([{"mapDataCode": "A", "cooX": "1.5", "cooY": "2"}, {"cooX": "x", "cooY": "0"}])
+    assert index.size == 1
+    assert index.resolve("A") == {"code": "A", "x": 1.5, "y": 2.0}
+    assert index.resolve("B") is None
+
+
+@pytest.mark.parametrize("value", [math.nan, math.inf, -math.inf])
+def test_rejects_non_finite(value):
+    index = CellIndex(make_mapdata(20))
+    with pytest.raises(ValueError):
+        index.nearest(value, 0)
+    with pytest.raises(ValueError):
+        index.nearest(0, 0, max_distance=math.nan)
+    with pytest.raises(ValueError):
+        index.within_radius(0, value, 100)
+    with pytest.raises(ValueError):
+        index.within_box(0, 0, value, 100)
+    with pytest.raises(ValueError):
+        robots_within({}, value, 0, radius=100)
+
+
+def test_robots_within_skips_bad_positions():
+    robots = {
+        "1": {"position": {"x": "0", "y": "0"}},
+        "2": {"position": {"x": "nan", "y": "0"}},
+        "3": {"position": {}},
+        "4": {"position": {"x": "300", "y": "400"}},
+    }
+    assert [r["RobotId"] for r in robots_within(robots, 0, 0, radius=500)] == ["1", "4"]
+
+
+def test_dataset_version_round_trip(tmp_path, monkeypatch):
+    """缓存文件更新并重新加载后版本号变化，按版本号缓存的索引不会沿用旧数据"""
+    monkeypatch.setattr(rcms_api, "cache_path", tmp_path)
+    api = rcms_api.RcmsApi(host="http://127.0.0.1:1", fake=True, map_code="")
+    api._lazy = True
+    path = api.current_cache_path / "mapdata.json"
+    path.write_bytes(orjson.dumps([{"mapDataCode": "A", "cooX": "0", "cooY": "0"}]))
+
+    cache = {}
+
+    def cell_index():
+        key = api.dataset_version("mapdata")
+        if cache.get("key") != key:
+            cache.update(key=key, index=CellIndex(api.mapdata))
+        return cache["index"]
+
+    first = cell_index()
+    assert first.resolve("A") is not None
+    # 未变化时复用同一个索引
+    assert cell_index() is first
+
+    # 其他进程更新了缓存文件，释放后重新加载
+    path.write_bytes(orjson.dumps([{"mapDataCode": "B", "cooX": "5", "cooY": "5"}]))
+    assert api.release(["mapdata"]) == ["mapdata"]
+    second = cell_index()
+    assert second is not first
+    assert second.resolve("A") is None and second.resolve("B") is not None
+
+    # 直接赋值同样使版本号变化
+    api.mapdata = [{"mapDataCode": "C", "cooX": "1", "cooY": "1"}]
+    assert cell_index().resolve("C") is not None
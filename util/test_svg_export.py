@@ -1,9 +1,14 @@
 #!/usr/bin/env python3
 
 import json
+import os
+import sys
 
-from dataparse import generate_map_image, parse_ShareMapInfo
-from helper import sharemap2json
+# dataparse 使用包内相对导入，从 util 目录运行时将项目根目录加入搜索路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util.dataparse import generate_map_image, parse_ShareMapInfo  # noqa: E402
+from util.helper import sharemap2json  # noqa: E402
 
 
 def test_svg_export():
@@ -1,3 +1,6 @@
+import asyncio
+import time
+
 import httpx
 
 from util.config import cfg
@@ -8,14 +11,24 @@ class Wcs:
         self, base_url=cfg.get("rcms.wcs_rest_api") + "/wcs/services/rest/cms"
     ):
         self.base_url = base_url
+        self.pool_size = cfg.get("rcms.wcs_pool_size") or 16
+        # 所有请求共用一个连接池，批量查询与后台轮询复用长连接
         self.client = httpx.AsyncClient(
             headers={
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36",
             },
             verify=False,
+            limits=httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size,
+                keepalive_expiry=30,
+            ),
         )
+        # 全部调用(批量查询、后台轮询、单项查询)共用的并发名额，与连接池大小一致，
+        # 取得名额后一定有空闲连接，httpx 内部不会再排队
+        self.slots = asyncio.Semaphore(self.pool_size)
 
-    async def search_device_status_info(self, cms_index: str, device_type: str):
+    async def search_device_status_info(self, cms_index: str, device_type: str, timeout: float = 5):
         # BUFFER  EQ  STK CV
         url = self.base_url + "/searchDeviceStatusInfo"
         data = {
@@ -29,16 +42,80 @@ class Wcs:
         if cfg.get("test"):
             return test.get(device_type, {})
         try:
-            resp = await self.client.post(url, json=data, timeout=5)
+            resp = await self.client.post(url, json=data, timeout=timeout)
             data = resp.json()
             if not data or data.get("code") != 0:
                 return {"code": -1, "message": data.get("message", "data is empty")}
             return data
-        except httpx.ReadTimeout:
+        except httpx.TimeoutException:
             return {"code": -1, "message": "访问超时"}
         except Exception as e:
             return {"code": -1, "message": str(e)}
 
+    async def query(
+        self, cms_index: str, device_type: str, timeout: float = 5, queue_timeout: float | None = None
+    ) -> dict:
+        """
+        取得并发名额后查询设备状态
+
+        Args:
+            timeout: 调用WCS的超时(秒)，从取得名额后开始计时，不含排队时间
+            queue_timeout: 等待名额的最长时间(秒)，默认不限
+        """
+        try:
+            async with asyncio.timeout(queue_timeout):
+                await self.slots.acquire()
+        except TimeoutError:
+            return {"code": -1, "message": "等待查询超时"}
+        try:
+            async with asyncio.timeout(timeout):
+                return await self.search_device_status_info(cms_index, device_type, timeout)
+        except TimeoutError:
+            return {"code": -1, "message": "访问超时"}
+        finally:
+            self.slots.release()
+
+    async def batch(
+        self,
+        items: list[tuple[str, str]],
+        timeout: float = 5,
+        cached=None,
+        queue_timeout: float | None = None,
+    ) -> list[dict]:
+        """
+        并发查询多个 (cmsIndex, deviceType)，与其他查询共用连接池大小的并发名额
+
+        Args:
+            items: [(cmsIndex, deviceType), ...]，重复项只查询一次
+            timeout: 每次调用WCS的超时(秒)，从取得并发名额后开始计时，不含排队时间
+            cached: 可选的缓存查询函数 cached(cms_index, device_type)，有结果时不访问WCS
+            queue_timeout: 等待并发名额的最长时间(秒)，默认不限
+
+        Returns:
+            list[dict]: 每项的 cms_index、device_type、code、message、status、cached、elapsed，顺序与去重后的输入相同
+        """
+        async def one(cms_index: str, device_type: str) -> dict:
+            started = time.monotonic()
+            data = cached(cms_index, device_type) if cached else None
+            hit = data is not None
+            if not hit:
+                data = await self.query(cms_index, device_type, timeout, queue_timeout)
+            return {
+                "cms_index": cms_index,
+                "device_type": device_type,
+                "code": data.get("code", -1),
+                "message": data.get("message", ""),
+                "status": (data.get("params") or {}).get("status") or [],
+                "cached": hit,
+                "elapsed": round(time.monotonic() - started, 3),
+            }
+
+        pairs = list(dict.fromkeys(items))
+        return await asyncio.gather(*(one(c, t) for c, t in pairs))
+
+    async def aclose(self):
+        await self.client.aclose()
+
 
 test = {
     "STK": {
@@ -0,0 +1,309 @@
+import asyncio
+import logging
+import time
+
+import orjson
+import redis.asyncio as aioredis
+
+from util.config import cfg, r
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TYPES = ("BUFFER", "EQ", "STK", "CV")
+# 每个订阅者的待发送消息上限，超过时清空积压并改发完整快照
+SUBSCRIBER_QUEUE_SIZE = 64
+
+
+def row_key(device_type: str, row: dict) -> str:
+    """状态行的唯一键：设备类型:端口cmsIndex:上下层"""
+    return f"{device_type}:{row.get('cmsIndex', '')}:{row.get('portPos', '')}"
+
+
+class PollState:
+    """一份完整的轮询状态；跟随的worker从Redis读取后整体替换，读取方不会拿到新旧混合的数据"""
+
+    def __init__(self, rows=None, device_rows=None, device_polled=None, errors=None, seq=0, polled_at=0.0):
+        self.rows: dict[str, dict] = rows or {}
+        self.device_rows: dict[tuple[str, str], list[str]] = device_rows or {}
+        self.device_polled: dict[tuple[str, str], float] = device_polled or {}
+        self.errors: dict[tuple[str, str], str] = errors or {}
+        self.seq = seq
+        self.polled_at = polled_at
+
+
+class WcsStatusPoller:
+    """WCS设备状态后台轮询
+
+    按计划并发查询 cmsindexmap 中全部 BUFFER/EQ/STK/CV 设备，最新状态保存在内存中；
+    与上一轮比较，只把变化的状态行推送给订阅者（WebSocket）。
+    查询失败的设备保留上一次的状态并记录错误，不视为状态行被删除。
+
+    uvicorn workers > 1 时只有持有领导锁的worker轮询WCS：每轮把完整状态写入Redis，
+    再通过Redis pub/sub 发布变化；每个worker都订阅该频道，从Redis同步状态后
+    推送给本worker的订阅者。
+    """
+
+    def __init__(
+        self,
+        wcs,
+        devices,
+        rdstag: str,
+        is_leader=None,
+        interval: float | None = None,
+        concurrency: int | None = None,
+    ):
+        """
+        Args:
+            wcs: Wcs 客户端
+            devices: 返回 [(cmsIndex, deviceType), ...] 的函数，每轮在线程中调用一次
+            rdstag: Redis键前缀
+            is_leader: 抢占/续期领导锁并返回本worker是否负责轮询的函数(在线程中调用)，默认总是轮询
+            interval: 轮询间隔(秒)，默认 rcms.wcs_poll_interval
+            concurrency: 并发查询数，默认 rcms.wcs_poll_concurrency
+        """
+        self.wcs = wcs
+        self.devices = devices
+        self.is_leader = is_leader or (lambda: True)
+        self.leader = False
+        self.state_key = f"{rdstag}:wcs_status:state"
+        self.channel = f"{rdstag}:wcs_status:diff"
+        self.interval = interval or cfg.get("rcms.wcs_poll_interval") or 5
+        self.concurrency = concurrency or cfg.get("rcms.wcs_poll_concurrency") or 8
+        self.state = PollState()
+        self._subscribers: set[asyncio.Queue] = set()
+        self._task: asyncio.Task | None = None
+        self._listener: asyncio.Task | None = None
+        self.stats = {"polls": 0, "requests": 0, "errors": 0, "changes": 0, "last_duration": 0.0}
+
+    async def _query(self, semaphore, cms_index: str, device_type: str):
+        # 本轮并发不超过 concurrency，且与批量查询共用 Wcs 的并发名额
+        async with semaphore:
+            return await self.wcs.query(cms_index, device_type)
+
+    async def poll_once(self) -> dict:
+        """查询全部设备一轮，返回变化 {"updated": [...], "removed": [...]}"""
+        started = time.monotonic()
+        # 设备列表来自端口目录，可能需要读取缓存文件
+        devices = list(dict.fromkeys(await asyncio.to_thread(self.devices)))
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(
+            *(self._query(semaphore, cms_index, device_type) for cms_index, device_type in devices),
+            return_exceptions=True,
+        )
+        now = time.time()
+        # 领导worker在事件循环中就地更新自己的状态
+        state = self.state
+        updated, removed = [], []
+        for (cms_index, device_type), data in zip(devices, results):
+            device = (device_type, cms_index)
+            if isinstance(data, Exception) or not isinstance(data, dict) or data.get("code") != 0:
+                message = str(data) if isinstance(data, Exception) else (data or {}).get("message", "")
+                state.errors[device] = message or "查询失败"
+                self.stats["errors"] += 1
+                continue
+            state.errors.pop(device, None)
+            state.device_polled[device] = now
+            keys = []
+            for row in (data.get("params") or {}).get("status") or []:
+                key = row_key(device_type, row)
+                keys.append(key)
+                row = {**row, "deviceType": device_type, "device": cms_index}
+                if state.rows.get(key) != row:
+                    state.rows[key] = row
+                    updated.append({"key": key, **row})
+            for key in set(state.device_rows.get(device, ())) - set(keys):
+                if state.rows.pop(key, None) is not None:
+                    removed.append(key)
+            state.device_rows[device] = keys
+
+        # 已不在设备列表中的设备
+        current = set(devices)
+        for device in [d for d in state.device_rows if (d[1], d[0]) not in current]:
+            for key in state.device_rows.pop(device):
+                if state.rows.pop(key, None) is not None:
+                    removed.append(key)
+            state.device_polled.pop(device, None)
+            state.errors.pop(device, None)
+
+        state.polled_at = now
+        self.stats["polls"] += 1
+        self.stats["requests"] += len(devices)
+        self.stats["last_duration"] = round(time.monotonic() - started, 3)
+        changes = {"updated": updated, "removed": removed}
+        if updated or removed:
+            state.seq += 1
+            self.stats["changes"] += len(updated) + len(removed)
+            message = {"type": "wcs_status_diff", "seq": state.seq, "time": now, **changes}
+        else:
+            # 没有变化时也通知其他worker同步轮询时间(cached 按轮询时间判断是否过期)
+            message = {"type": "wcs_status_tick", "seq": state.seq, "time": now}
+        await asyncio.to_thread(self._share, message)
+        return changes
+
+    def _dump_state(self) -> bytes:
+        state = self.state
+        return orjson.dumps(
+            {
+                "seq": state.seq,
+                "polled_at": state.polled_at,
+                "rows": state.rows,
+                "devices": [
+                    [t, c, keys, state.device_polled.get((t, c))] for (t, c), keys in state.device_rows.items()
+                ],
+                "errors": [[t, c, e] for (t, c), e in state.errors.items()],
+            }
+        )
+
+    def _share(self, message: dict):
+        """领导worker：先写入完整状态再发布消息，收到消息的worker读取的状态不会比消息旧"""
+        pipe = r.pipeline()
+        pipe.set(self.state_key, self._dump_state(), ex=max(int(self.interval * 3), 30))
+        pipe.publish(self.channel, orjson.dumps(message))
+        pipe.execute()
+
+    def _load_state(self) -> bool:
+        """从Redis同步领导worker的最新状态"""
+        raw = r.get(self.state_key)
+        if not raw:
+            return False
+        data = orjson.loads(raw)
+        # 先构建完整的新状态再一次替换
+        self.state = PollState(
+            rows=data["rows"],
+            device_rows={(t, c): keys for t, c, keys, _ in data["devices"]},
+            device_polled={(t, c): polled for t, c, _, polled in data["devices"] if polled},
+            errors={(t, c): e for t, c, e in data["errors"]},
+            seq=data["seq"],
+            polled_at=data["polled_at"],
+        )
+        return True
+
+    def snapshot(self, device_type: str | None = None, cms_index: str | None = None) -> dict:
+        state = self.state
+        rows = [
+            {"key": key, **row}
+            for key, row in state.rows.items()
+            if (not device_type or row["deviceType"] == device_type)
+            and (not cms_index or cms_index in (row["device"], row.get("cmsIndex")))
+        ]
+        return {
+            "type": "wcs_status_snapshot",
+            "seq": state.seq,
+            "time": state.polled_at,
+            "rows": rows,
+            "errors": {f"{t}:{c}": e for (t, c), e in state.errors.items()},
+        }
+
+    def cached(self, cms_index: str, device_type: str, max_age: float | None = None) -> dict | None:
+        """与 searchDeviceStatusInfo 返回格式相同的缓存结果，未轮询到或已过期时返回None"""
+        state = self.state
+        device = (device_type, cms_index)
+        polled = state.device_polled.get(device)
+        max_age = self.interval * 2 if max_age is None else max_age
+        if polled is None or time.time() - polled > max_age:
+            return None
+        status = []
+        for key in state.device_rows.get(device, ()):
+            row = dict(state.rows[key])
+            row.pop("deviceType")
+            row.pop("device")
+            status.append(row)
+        return {"code": 0, "message": "", "params": {"deviceType": device_type, "status": status}}
+
+    def subscribe(self) -> asyncio.Queue:
+        """订阅状态变化，队列中第一条为完整快照"""
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        queue.put_nowait(self.snapshot())
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def _publish(self, message: dict):
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # 客户端跟不上时丢弃积压的变化，改发完整快照
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self.snapshot())
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                self.leader = await asyncio.to_thread(self.is_leader)
+                if self.leader:
+                    await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"WCS设备状态轮询出错: {e}")
+            await asyncio.sleep(max(self.interval - (time.monotonic() - started), 0.5))
+
+    async def _listen(self):
+        """订阅领导worker发布的变化，同步状态并推送给本worker的订阅者"""
+        while True:
+            client = aioredis.Redis(**cfg.get("redis"))
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                if not self.leader:
+                    await asyncio.to_thread(self._load_state)
+                async for item in pubsub.listen():
+                    if item.get("type") != "message":
+                        continue
+                    message = orjson.loads(item["data"])
+                    # 领导worker的内存状态即为最新状态
+                    if not self.leader:
+                        await asyncio.to_thread(self._load_state)
+                    if message.get("type") == "wcs_status_diff":
+                        self._publish(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"订阅WCS设备状态变化时出错: {e}, 1秒后重连")
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.aclose()
+                    await client.aclose()
+                except Exception:
+                    pass
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            self._task.set_name("wcs-status-poller")
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+            self._listener.set_name("wcs-status-listener")
+
+    def stop(self):
+        for task in (self._task, self._listener):
+            if task is not None:
+                task.cancel()
+        self._task = None
+        self._listener = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def info(self) -> dict:
+        state = self.state
+        return {
+            "running": self.running,
+            "leader": self.leader,
+            "interval": self.interval,
+            "concurrency": self.concurrency,
+            "devices": len(state.device_rows),
+            "rows": len(state.rows),
+            "errors": len(state.errors),
+            "subscribers": len(self._subscribers),
+            "seq": state.seq,
+            "polled_at": state.polled_at,
+            "stats": dict(self.stats),
+        }
@@ -1,8 +1,10 @@
 import logging
 import os
+import socket
 import sys
 import threading
 import time
+import uuid
 from datetime import datetime
 
 import orjson
@@ -16,6 +18,8 @@ from util.rcms_api import RcmsApi
 from util.xml2json import safe_lxml_parse
 
 logger = logging.getLogger(__name__)
+# 接入服务所在进程的标识，记录在 program_info 中，控制命令按它投递
+OWNER_ID = f"{socket.gethostname()}:{os.getpid()}"
 msg_dict = {
     "ROBOT_STATUS": 0,
     "ROBOT_PATH": 0,
@@ -38,6 +42,7 @@ class ZeroMQSubscriber:
             self.message_port = message_port
             self.use_ssl = use_ssl
             self.ssl_verify = ssl_verify
+            self.last_error = ""
 
             # 创建ZeroMQ上下文
             self.context = zmq.Context()
@@ -113,22 +118,24 @@ class ZeroMQSubscriber:
             logger.error(f"消息处理错误: {e}")
             raise
 
-    def run(self, callback=None, interval=0.01, stop_event=None):
+    def run(self, callback=None, interval=0.01, stop_event=None, pause_event=None):
         """运行订阅者主循环
 
         Args:
             topic: 订阅主题
             callback: 消息处理回调函数，接收(topic, content)作为参数
             stop_event: 停止事件对象，用于控制线程退出
+            pause_event: 暂停事件对象，置位时不再接收消息（CONFLATE只保留最新一条）
         """
         self.subscribe()
         logger.info("ZeroMQ订阅者已启动，等待消息...")
 
         try:
-            print(" | ".join(msg_dict.keys()))
             while not (stop_event and stop_event.is_set()):
+                if pause_event and pause_event.is_set():
+                    time.sleep(0.2)
+                    continue
                 content = self.receive_message()
-                print(content)
                 if content is not None:
                     content = safe_lxml_parse(xml_string=content)
                     if callback:
@@ -140,6 +147,7 @@ class ZeroMQSubscriber:
         except KeyboardInterrupt:
             logger.info("订阅者已停止")
         except Exception as e:
+            self.last_error = str(e)
             logger.error(f"订阅者运行错误: {e}")
         finally:
             self.close()
@@ -159,145 +167,528 @@ class ZeroMQSubscriber:
 rdstag = cfg.get("rcms.host").split("://")[1].replace(":", "-")
 
 
-def Map_info_update(
-    api: RcmsApi, interval: float = 0.001, show_count: bool = True
-):
-    """更新地图信息"""
-    # Check if another instance is already running
-    rdstag = cfg.get("rcms.host").split("://")[1].replace(":", "-")
-    program_info_key = f"{rdstag}:program_info"
-
-    # 创建停止事件
-    stop_event = threading.Event()
+class ZeroMQIngestService:
+    """进程内ZeroMQ数据接入服务
 
-    try:
-        existing_info = r.get(program_info_key)
-        if existing_info:
-            existing_info = orjson.loads(existing_info)
-            existing_pid = existing_info.get("pid")
-            logger.info(f"已存在运行中的实例，PID: {existing_pid}")
-            sys.exit(0)
+    每个ZeroMQ端点一个订阅线程，由监督线程统一管理：
+    支持启动/停止/暂停/恢复，订阅线程异常退出后按指数退避重启，
+    重启时复用已解析的RcmsApi缓存，并通过Redis program_info 防止重复实例。
+    """
 
-        # Record program start time
-        start_time = datetime.now()
-        pid = os.getpid()
+    BACKOFF_MIN = 1.0
+    BACKOFF_MAX = 60.0
+    # 订阅线程持续运行超过该时间(秒)后退避时间复位
+    HEALTHY_AFTER = 60.0
+    # 超过该时间(秒)未收到消息，健康检查标记为stale
+    STALE_AFTER = 10.0
+    # 快照中保留的全局消息类型，机器人状态单独保存
+    SNAPSHOT_KEYS = ("BLOCK_CELL", "CHARGE_INFO", "VALID_ROBOT_NUM")
+    # 可通过Redis发给接入服务所在进程的控制命令
+    COMMANDS = ("stop", "restart", "pause", "resume", "heatmap_reset")
+    # 等待接入服务所在进程执行命令的时间(秒)
+    COMMAND_TIMEOUT = 5.0
+
+    def __init__(
+        self,
+        api: RcmsApi,
+        interval: float = 0.001,
+        show_count: bool = False,
+        rdstag: str | None = None,
+    ):
+        self.api = api
+        self.interval = interval
+        self.show_count = show_count
+        # 多现场时由 Site 传入各自的Redis命名空间
+        self.rdstag = rdstag or cfg.get("rcms.host").split("://")[1].replace(":", "-")
+        self.program_info_key = f"{self.rdstag}:program_info"
+        self.start_time = None
+        self.message_count = 0
+        # 每个现场各自计数
+        self.msg_counts = dict.fromkeys(msg_dict, 0)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._pause_event = threading.Event()
+        self._workers: dict[tuple, dict] = {}
+        self._supervisor = None
+        self.snapshot_path = api.current_cache_path / "fleet_snapshot.json"
+        self.snapshot_interval = cfg.get("zmq_snapshot_interval") or 30
+        # 占用/拥堵热力图，随快照周期保存，接入服务在其他进程时Web进程从文件读取
+        self.heatmap = None
+        self.heatmap_path = api.current_cache_path / "heatmap.npz"
+        # Web进程中启动的实例空闲时可被自动停止，命令行前台运行的实例不自动停止
+        self.auto_stop = True
+        self.owner_id = OWNER_ID
+
+    @property
+    def running(self) -> bool:
+        return self._supervisor is not None and self._supervisor.is_alive()
+
+    @property
+    def paused(self) -> bool:
+        return self._pause_event.is_set()
+
+    def _program_info(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "owner": self.owner_id,
+            "auto_stop": self.auto_stop,
+            "start_time": self.start_time.strftime("%Y-%m-%d %H:%M:%S")
+            if self.start_time
+            else "",
+            "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "msg_dict": self.msg_counts.copy(),
+            "paused": self.paused,
+            "health": self.health()["status"],
+        }
+
+    def owner_info(self) -> dict | None:
+        """Redis中记录的运行实例信息(program_info)，没有运行实例时返回None"""
+        existing = r.get(self.program_info_key)
+        if not existing:
+            return None
+        try:
+            return orjson.loads(existing)
+        except orjson.JSONDecodeError:
+            return None
+
+    def _owner_pid(self):
+        info = self.owner_info()
+        return info.get("pid") if info else None
+
+    def _command_key(self, owner: str) -> str:
+        return f"{self.rdstag}:ingest_cmd:{owner}"
+
+    def _execute(self, action: str) -> dict:
+        if action == "stop":
+            result = self.stop()
+        elif action == "restart":
+            result = self.restart()
+        elif action == "pause":
+            result = self.pause()
+        elif action == "resume":
+            result = self.resume()
+        elif action == "heatmap_reset":
+            result = self.reset_heatmap()
+        else:
+            return {"message": f"未知命令: {action}", "success": False}
+        return {"success": True, "owner": self.owner_id, **result}
+
+    def command(self, action: str, timeout: float | None = None) -> dict:
+        """
+        执行控制命令：接入服务在本进程时直接执行，在其他进程(worker/命令行)时
+        通过Redis投递给 program_info 中记录的进程并等待其执行结果
 
-        if not api.rcsdata:
-            logger.warning("rcs数据为空 重新构建缓存")
-            api = RcmsApi()
-            api.build_from_cache()
+        Returns:
+            dict: message、success，所在进程未响应或没有运行实例时 success=False
+        """
+        if action not in self.COMMANDS:
+            return {"message": f"未知命令: {action}", "success": False}
+        if self.running:
+            return self._execute(action)
+        info = self.owner_info()
+        owner = (info or {}).get("owner")
+        if not owner:
+            return {"message": "ZeroMQ接入服务未运行", "success": False, "pid": None}
+        if owner == self.owner_id:
+            # 标记属于本进程但服务已不在运行(刚停止)，等标记过期
+            return {"message": "ZeroMQ接入服务未运行", "success": False, "pid": os.getpid()}
+
+        timeout = self.COMMAND_TIMEOUT if timeout is None else timeout
+        reply_key = f"{self.rdstag}:ingest_reply:{uuid.uuid4().hex}"
+        key = self._command_key(owner)
+        pipe = r.pipeline()
+        pipe.rpush(key, orjson.dumps({"action": action, "reply": reply_key}))
+        pipe.expire(key, int(timeout) + 5)
+        pipe.execute()
+        reply = r.blpop([reply_key], timeout=max(int(timeout), 1))
+        if not reply:
+            return {
+                "message": f"接入服务所在进程 {owner} 未在 {timeout:.0f} 秒内响应",
+                "success": False,
+                "pid": info.get("pid"),
+            }
+        return orjson.loads(reply[1])
+
+    def _poll_commands(self):
+        """监督线程中取出发给本进程的控制命令"""
+        items = []
+        try:
+            key = self._command_key(self.owner_id)
+            while len(items) < 10 and (raw := r.lpop(key)) is not None:
+                items.append(raw)
+        except Exception as e:
+            logger.debug(f"读取控制命令出错: {e}")
+        for raw in items:
+            try:
+                cmd = orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                continue
+            # stop/restart 需要等待监督线程退出，不能在监督线程中执行
+            threading.Thread(
+                target=self._run_command, args=(cmd,), daemon=True, name="zeromq-command"
+            ).start()
 
-        rdstag = cfg.get("rcms.host").split("://")[1].replace(":", "-")
-        message_count = 0
+    def _run_command(self, cmd: dict):
+        logger.info(f"收到控制命令: {cmd.get('action')}")
+        try:
+            result = self._execute(cmd.get("action", ""))
+        except Exception as e:
+            result = {"message": f"执行命令出错: {e}", "success": False}
+        reply = cmd.get("reply")
+        if reply:
+            pipe = r.pipeline()
+            pipe.rpush(reply, orjson.dumps(result))
+            pipe.expire(reply, 30)
+            pipe.execute()
+
+    def _endpoints(self) -> list[tuple]:
+        rcsdata = self.api.rcsdata
+        if isinstance(rcsdata, dict):
+            rcsdata = [rcsdata]
+        endpoints = []
+        for rd in rcsdata or []:
+            key = (rd.get("ip"), rd.get("zeroMqCtrlPort"), rd.get("zeroMqMessagePort"))
+            if key in endpoints:
+                logger.warning(f"重复zeromq: {key}")
+                continue
+            endpoints.append(key)
+        return endpoints
+
+    def start(self) -> dict:
+        """启动接入服务，已在本进程或其他进程运行时直接返回"""
+        with self._lock:
+            if self.running:
+                return {"message": "ZeroMQ接入服务已在运行", "pid": os.getpid()}
+            if not self.api.rcsdata:
+                logger.warning("rcs数据为空 重新构建缓存")
+                self.api.build_from_cache()
+
+            self.start_time = datetime.now()
+            # SET NX 抢占实例标记，避免多个进程/worker重复接入
+            if not r.set(
+                self.program_info_key, orjson.dumps(self._program_info()), nx=True, ex=3
+            ):
+                owner = self._owner_pid()
+                if owner != os.getpid():
+                    logger.info(f"已存在运行中的实例，PID: {owner}")
+                    return {
+                        "message": "ZeroMQ接入服务已在其他进程运行",
+                        "pid": owner,
+                    }
 
-        # 创建一个线程定期将程序信息写入Redis
+            self.restore_snapshot()
+            self._bind_heatmap()
+            self._stop_event.clear()
+            self._pause_event.clear()
+            self._workers = {
+                key: {
+                    "thread": None,
+                    "subscriber": None,
+                    "started_at": 0.0,
+                    "next_start": 0.0,
+                    "backoff": self.BACKOFF_MIN,
+                    "restarts": 0,
+                    "last_error": "",
+                    "last_message": 0.0,
+                    "messages": 0,
+                }
+                for key in self._endpoints()
+            }
+            logger.info(f"zeromq 数量: {len(self._workers)}")
+            self._supervisor = threading.Thread(
+                target=self._supervise, daemon=True, name="zeromq-supervisor"
+            )
+            self._supervisor.start()
+            return {"message": "ZeroMQ接入服务已启动", "pid": os.getpid()}
+
+    def stop(self, timeout: float = 3.0) -> dict:
+        """停止接入服务并清理Redis中的实例标记"""
+        with self._lock:
+            was_running = self.running
+            self._stop_event.set()
+            if self._supervisor:
+                self._supervisor.join(timeout=timeout)
+            for state in self._workers.values():
+                if state["thread"]:
+                    state["thread"].join(timeout=1.0)
+            self._supervisor = None
+            if was_running:
+                try:
+                    self.save_snapshot()
+                except Exception as e:
+                    logger.error(f"保存车队快照时出错: {e}")
+                self.save_heatmap()
+            if self._owner_pid() == os.getpid():
+                r.delete(self.program_info_key)
+            if not was_running:
+                return {"message": "ZeroMQ接入服务未运行", "pid": None}
+            logger.info("ZeroMQ接入服务已停止")
+            return {"message": "ZeroMQ接入服务已停止", "pid": os.getpid()}
+
+    def restart(self) -> dict:
+        """热重启：保留RcmsApi已解析的缓存，只重建订阅线程"""
+        self.stop()
+        return self.start()
+
+    def pause(self) -> dict:
+        self._pause_event.set()
+        return {"message": "ZeroMQ接入服务已暂停", "paused": True}
+
+    def resume(self) -> dict:
+        self._pause_event.clear()
+        return {"message": "ZeroMQ接入服务已恢复", "paused": False}
+
+    def health(self) -> dict:
+        """健康检查：各端点线程存活、最近消息时间、重启次数"""
+        now = time.monotonic()
+        endpoints = []
+        for (ip, ctrl_port, msg_port), state in self._workers.items():
+            alive = bool(state["thread"] and state["thread"].is_alive())
+            idle = now - state["last_message"] if state["last_message"] else None
+            endpoints.append(
+                {
+                    "endpoint": f"{ip}:{msg_port}",
+                    "alive": alive,
+                    "stale": alive and (idle is None or idle > self.STALE_AFTER),
+                    "idle_seconds": round(idle, 1) if idle is not None else None,
+                    "messages": state["messages"],
+                    "restarts": state["restarts"],
+                    "last_error": state["last_error"],
+                }
+            )
+        if not self.running:
+            status = "stopped"
+        elif self.paused:
+            status = "paused"
+        elif endpoints and all(e["alive"] and not e["stale"] for e in endpoints):
+            status = "healthy"
+        else:
+            status = "degraded"
+        return {
+            "status": status,
+            "message_count": self.message_count,
+            "endpoints": endpoints,
+        }
+
+    def save_snapshot(self) -> int:
+        """将当前车队状态写入快照文件（先写临时文件再替换），返回机器人数量"""
+        robots = {}
+        for robot_id, status_json in r.hgetall(f"{self.rdstag}:ROBOT_STATUS").items():
+            try:
+                status = orjson.loads(status_json)
+            except orjson.JSONDecodeError:
+                continue
+            robots[robot_id.decode("utf-8")] = status
+        if not robots:
+            return 0
+        snapshot = {"saved_at": time.time(), "robots": robots}
+        for msg_type in self.SNAPSHOT_KEYS:
+            value = r.get(f"{self.rdstag}:{msg_type}")
+            if value:
+                snapshot[msg_type] = orjson.loads(value)
+        tmp_path = self.snapshot_path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(orjson.dumps(snapshot))
+        os.replace(tmp_path, self.snapshot_path)
+        return len(robots)
+
+    def load_snapshot(self) -> dict:
+        """读取快照文件，所有机器人状态带上 stale 标记"""
+        if not self.snapshot_path.exists():
+            return {}
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                snapshot = orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError) as e:
+            logger.warning(f"读取车队快照失败: {e}")
+            return {}
+        for status in snapshot.get("robots", {}).values():
+            status["stale"] = True
+            status.setdefault("stale_since", snapshot.get("saved_at"))
+        return snapshot
+
+    def restore_snapshot(self) -> int:
+        """Redis中没有机器人状态时用快照填充，实时消息到达后自然覆盖"""
+        if r.exists(f"{self.rdstag}:ROBOT_STATUS"):
+            return 0
+        snapshot = self.load_snapshot()
+        robots = snapshot.get("robots")
+        if not robots:
+            return 0
+        r.hset(
+            f"{self.rdstag}:ROBOT_STATUS",
+            mapping={rid: orjson.dumps(status) for rid, status in robots.items()},
+        )
+        for msg_type in self.SNAPSHOT_KEYS:
+            if snapshot.get(msg_type) is not None and not r.exists(
+                f"{self.rdstag}:{msg_type}"
+            ):
+                r.set(f"{self.rdstag}:{msg_type}", orjson.dumps(snapshot[msg_type]))
+        logger.info(f"已从快照恢复 {len(robots)} 台机器人状态(stale)")
+        return len(robots)
 
-        def update_program_info():
-            while not stop_event.is_set():
+    def _bind_heatmap(self):
+        """取当前共享地图对应的热力图，地图变化后切换到新网格"""
+        try:
+            self.heatmap = self.api.fleet_heatmap()
+        except Exception as e:
+            logger.error(f"创建热力图时出错: {e}")
+            self.heatmap = None
+
+    def reset_heatmap(self) -> dict:
+        """清空热力图累计数据并立即保存，其他进程通过热力图文件同步"""
+        if self.heatmap is None:
+            self._bind_heatmap()
+        if self.heatmap is None:
+            return {"message": "共享地图数据不存在", "success": False}
+        self.heatmap.reset()
+        self.save_heatmap()
+        return {"message": "热力图已清空"}
+
+    def save_heatmap(self):
+        if self.heatmap is None:
+            return
+        try:
+            self.heatmap.save(self.heatmap_path)
+        except Exception as e:
+            logger.error(f"保存热力图时出错: {e}")
+
+    def _spawn(self, key, state):
+        ip, ctrl_port, msg_port = key
+        # 检查是否需要使用SSL连接（这里可以根据实际情况调整判断逻辑）
+        # use_ssl = rd.get('useSsl', False) or ZERO_MQ_MESSAGE_PORT in [8883, 8443]
+        subscriber = ZeroMQSubscriber(
+            ip, ctrl_port, msg_port, use_ssl=False, ssl_verify=False
+        )
+
+        def callback(msg_type, content):
+            state["last_message"] = time.monotonic()
+            state["messages"] += 1
+            self._handle_message(msg_type, content)
+
+        t = threading.Thread(
+            target=subscriber.run,
+            args=(callback, self.interval, self._stop_event, self._pause_event),
+            daemon=True,
+            name=f"zeromq-{ip}:{msg_port}",
+        )
+        t.start()
+        state["thread"] = t
+        state["subscriber"] = subscriber
+        state["started_at"] = time.monotonic()
+
+    def _supervise(self):
+        last_info = 0.0
+        last_snapshot = time.monotonic()
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            for key, state in self._workers.items():
+                t = state["thread"]
+                if t is not None and t.is_alive():
+                    if now - state["started_at"] > self.HEALTHY_AFTER:
+                        state["backoff"] = self.BACKOFF_MIN
+                    continue
+                if t is not None:
+                    # 订阅线程意外退出，按退避时间安排重启
+                    state["thread"] = None
+                    state["last_error"] = state["subscriber"].last_error
+                    state["restarts"] += 1
+                    state["next_start"] = now + state["backoff"]
+                    logger.warning(
+                        f"ZeroMQ订阅线程退出 {key}，{state['backoff']:.0f}秒后重启"
+                    )
+                    state["backoff"] = min(state["backoff"] * 2, self.BACKOFF_MAX)
+                    continue
+                if now >= state["next_start"]:
+                    try:
+                        self._spawn(key, state)
+                    except Exception as e:
+                        state["last_error"] = str(e)
+                        state["restarts"] += 1
+                        state["next_start"] = now + state["backoff"]
+                        state["backoff"] = min(state["backoff"] * 2, self.BACKOFF_MAX)
+
+            if now - last_info >= 2:
                 try:
-                    program_info = {
-                        "pid": pid,
-                        "start_time": start_time.strftime("%Y-%m-%d %H:%M:%S"),
-                        "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "msg_dict": msg_dict.copy(),  # 复制当前的msg_dict
-                    }
-                    # 将程序信息写入Redis
                     r.set(
-                        program_info_key,
-                        orjson.dumps(program_info),
+                        self.program_info_key,
+                        orjson.dumps(self._program_info()),
                         ex=3,
                     )
-                    time.sleep(2)  # 每2秒更新一次
                 except Exception as e:
                     logger.error(f"更新程序信息到Redis时出错: {e}")
-                    time.sleep(2)  # 出错时也等待2秒再重试
-
-        # 启动定期更新程序信息的线程
-        info_thread = threading.Thread(target=update_program_info, daemon=True)
-        info_thread.start()
-
-        def message_callback(msg_type, content):
-            nonlocal message_count
-            message_count += 1
-            if show_count:
-                print(
-                    f"{msg_dict.values()}{message_count} \r",
-                    end="",
-                    flush=True,
-                )
-            count = msg_dict.get(msg_type, 0)
-            msg_dict.update({msg_type: count + 1})
-            if msg_type == "ROBOT_STATUS":
-                # key=content.get("Robot", {}).get("Id", -1),
-                r.hset(
-                    f"{rdstag}:{msg_type}",
-                    key=content.get("RobotId", "-1"),
-                    value=orjson.dumps(content),
-                )
-            elif msg_type == "ROBOT_PATH" or msg_type == "TRP_BLOCK_CELL":
-                rid = content.get("RobotId", "-1")
-                r.set(
-                    f"{rdstag}:{msg_type}:{rid}", value=orjson.dumps(content), ex=5
-                )  # , ex=5
-            elif msg_type == "TASK_INFO_REQ":
-                rid = content.get("RobotId", "-1")
-                r.set(
-                    f"{rdstag}:{msg_type}:{rid}", value=orjson.dumps(content), ex=2
-                )  # , ex=5
-            elif (
-                msg_type == "BLOCK_CELL"
-                or msg_type == "CHARGE_INFO"
-                or msg_type == "VALID_ROBOT_NUM"
-            ):
-                r.set(f"{rdstag}:{msg_type}", value=orjson.dumps(content))
-            # elif msg_type == "TASK_INFO_REQ":
-            #     r.hset(f"{rdstag}:{msg_type}", key=content.get("@ReqCode"), value=json.dumps(content), ex=60*5)
-        logger.info(f"zeromq 数量: {len(api.rcsdata)}")
-        threads = []
-        seen = set()
-        for rd in api.rcsdata:
-            ZERO_MQ_IP =rd.get("ip")
-            ZERO_MQ_CTRL_PORT = rd.get("zeroMqCtrlPort")
-            ZERO_MQ_MESSAGE_PORT = rd.get("zeroMqMessagePort")
-
-            key = (ZERO_MQ_IP, ZERO_MQ_CTRL_PORT, ZERO_MQ_MESSAGE_PORT)
-            if key in seen:
-                logger.warning(f"重复zeromq: {key}")
-                continue
-            seen.add(key)
-
-            # 检查是否需要使用SSL连接（这里可以根据实际情况调整判断逻辑）
-            # 例如，根据端口号或其他配置信息来判断
-            use_ssl = False
-            # 这里可以添加逻辑来判断是否需要使用SSL，例如：
-            # use_ssl = rd.get('useSsl', False) or ZERO_MQ_MESSAGE_PORT in [8883, 8443]
-            
-            subscriber = ZeroMQSubscriber(
-                ZERO_MQ_IP, ZERO_MQ_CTRL_PORT, ZERO_MQ_MESSAGE_PORT,
-                use_ssl=use_ssl, ssl_verify=False  # 不安全的SSL连接
+                last_info = now
+            if now - last_snapshot >= self.snapshot_interval:
+                try:
+                    self.save_snapshot()
+                except Exception as e:
+                    logger.error(f"保存车队快照时出错: {e}")
+                self._bind_heatmap()
+                self.save_heatmap()
+                last_snapshot = now
+            self._poll_commands()
+            self._stop_event.wait(0.5)
+
+    def _handle_message(self, msg_type, content):
+        self.message_count += 1
+        if self.show_count:
+            print(
+                f"{self.msg_counts.values()}{self.message_count} \r",
+                end="",
+                flush=True,
             )
-            t = threading.Thread(target=subscriber.run, args=(message_callback, interval, stop_event))
-            t.daemon = True
-            t.start()
-            threads.append(t)
+        self.msg_counts[msg_type] = self.msg_counts.get(msg_type, 0) + 1
+        rdstag = self.rdstag
+        if msg_type == "ROBOT_STATUS":
+            # key=content.get("Robot", {}).get("Id", -1),
+            r.hset(
+                f"{rdstag}:{msg_type}",
+                key=content.get("RobotId", "-1"),
+                value=orjson.dumps(content),
+            )
+        elif msg_type == "ROBOT_PATH" or msg_type == "TRP_BLOCK_CELL":
+            rid = content.get("RobotId", "-1")
+            r.set(
+                f"{rdstag}:{msg_type}:{rid}", value=orjson.dumps(content), ex=5
+            )  # , ex=5
+        elif msg_type == "TASK_INFO_REQ":
+            rid = content.get("RobotId", "-1")
+            r.set(
+                f"{rdstag}:{msg_type}:{rid}", value=orjson.dumps(content), ex=2
+            )  # , ex=5
+        elif (
+            msg_type == "BLOCK_CELL"
+            or msg_type == "CHARGE_INFO"
+            or msg_type == "VALID_ROBOT_NUM"
+        ):
+            r.set(f"{rdstag}:{msg_type}", value=orjson.dumps(content))
+        heatmap = self.heatmap
+        if heatmap is not None and msg_type in ("ROBOT_STATUS", "BLOCK_CELL", "TRP_BLOCK_CELL"):
+            try:
+                heatmap.handle(msg_type, content)
+            except Exception as e:
+                logger.debug(f"热力图累加出错: {e}")
 
-        # 等待用户输入中断
-        try:
-            while not stop_event.is_set():
-                time.sleep(0.1)
-        except KeyboardInterrupt:
-            logger.info("收到中断信号，正在停止所有线程...")
-            stop_event.set()
-
-        # 等待所有线程结束
-        for t in threads:
-            t.join(timeout=1.0)  # 1秒超时，防止线程卡住
-    except Exception as e:
-        import traceback
-
-        traceback.print_exc()
-        logger.error(f"主程序错误: {e}")
-        sys.exit(1)
+
+def Map_info_update(
+    api: RcmsApi, interval: float = 0.001, show_count: bool = True, rdstag: str | None = None
+):
+    """更新地图信息（命令行前台运行接入服务，Ctrl+C 停止）"""
+    service = ZeroMQIngestService(api, interval=interval, show_count=show_count, rdstag=rdstag)
+    service.auto_stop = False
+    result = service.start()
+    if not service.running:
+        logger.info(result["message"])
+        sys.exit(0)
+    if show_count:
+        print(" | ".join(msg_dict.keys()))
+    try:
+        while service.running:
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        logger.info("收到中断信号，正在停止所有线程...")
+    finally:
+        service.stop()
 
 
 def removekey():